@@ -3,19 +3,20 @@ Teacher Assistant System - Main Streamlit Application
 Integrates all 4 features with an interactive UI
 """
 
+import time
+_script_start = time.perf_counter()
+
 import streamlit as st
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import json
-from PIL import Image
 import io
 
-# Import all feature modules
-from assessment_grading import AssessmentGradingAssistant
-from content_recommender import ContentRecommender, SAMPLE_RESOURCES
-from wellbeing_monitor import WellbeingMonitor
-from scheduling_rewards import SchedulingRewardSystem
+# Feature modules (and their heavy dependencies: groq, sentence_transformers,
+# torch, google.generativeai, PIL) are imported when a page first needs them
+from response_cache import ResponseCache
+import model_registry
 
 # Load environment variables
 load_dotenv()
@@ -85,6 +86,92 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource(show_spinner=False)
+def start_model_warm_up():
+    """Load the embedding model in the background once per server process"""
+    return model_registry.warm_up(model_registry.DEFAULT_EMBEDDING_MODEL)
+
+start_model_warm_up()
+
+# Heavy, stateless pieces are built once per process and shared by every
+# session; each is created (and its module imported) on first use.
+@st.cache_resource(show_spinner=False)
+def get_llm_client(api_key: str):
+    """Shared, pooled LLM gateway used by all four engines"""
+    from llm_gateway import get_gateway
+    return get_gateway(api_key)
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache() -> ResponseCache:
+    """Shared LLM response cache for grading, hints and worksheets"""
+    return ResponseCache(data_dir="data")
+
+@st.cache_resource(show_spinner=False)
+def get_ocr_cache():
+    """Shared OCR results keyed on a digest of each pre-processed photo"""
+    from ocr_cache import OCRCache
+    return OCRCache(data_dir="data")
+
+@st.cache_resource(show_spinner="Loading grading assistant...")
+def get_grading_assistant(api_key: str, gemini_api_key: str, model: str):
+    """Shared grading assistant (stateless, safe across sessions)"""
+    from assessment_grading import AssessmentGradingAssistant
+    return AssessmentGradingAssistant(
+        api_key, model, gemini_api_key,
+        cache=get_response_cache(),
+        client=get_llm_client(api_key),
+        ocr_cache=get_ocr_cache()
+    )
+
+@st.cache_resource(show_spinner="Loading content recommender...")
+def get_content_recommender(api_key: str, model: str):
+    """Shared content recommender and its embeddings (thread-safe)"""
+    from content_recommender import ContentRecommender, SAMPLE_RESOURCES
+    content_recommender = ContentRecommender(
+        api_key, model,
+        cache=get_response_cache(),
+        index_dir=os.path.join("data", "embeddings"),
+        client=get_llm_client(api_key)
+    )
+    # Reuse the saved embedding index, or build it from the sample resources
+    if not content_recommender.load_index():
+        content_recommender.add_learning_resources(SAMPLE_RESOURCES)
+    return content_recommender
+
+ENGINE_NAMES = ("grading_assistant", "content_recommender", "wellbeing_monitor", "scheduling_system")
+
+def ensure_engine(name: str):
+    """Return the engine a page needs, building it on first use
+    
+    Shared engines are referenced from the process-wide cache; engines with
+    per-user state (wellbeing history, schedule) are created per session.
+    """
+    if name in st.session_state:
+        return st.session_state[name]
+    
+    api_key = st.session_state.api_key
+    model = st.session_state.model
+    try:
+        if name == "grading_assistant":
+            engine = get_grading_assistant(api_key, st.session_state.gemini_api_key, model)
+        elif name == "content_recommender":
+            engine = get_content_recommender(api_key, model)
+        elif name == "wellbeing_monitor":
+            from wellbeing_monitor import WellbeingMonitor
+            engine = WellbeingMonitor(api_key, model, client=get_llm_client(api_key))
+        elif name == "scheduling_system":
+            from scheduling_rewards import SchedulingRewardSystem
+            engine = SchedulingRewardSystem(api_key, model=model, client=get_llm_client(api_key))
+        else:
+            raise ValueError(f"Unknown engine: {name}")
+    except Exception as e:
+        st.error(f"❌ Error initializing {name.replace('_', ' ')}: {str(e)}")
+        st.info("Please check your .env file and ensure GROQ_API_KEY is set correctly.")
+        st.stop()
+    
+    st.session_state[name] = engine
+    return engine
+
 # Initialize session state
 if 'initialized' not in st.session_state:
     st.session_state.initialized = False
@@ -95,39 +182,14 @@ if 'initialized' not in st.session_state:
     st.session_state.current_student = "student_demo"
 
 def initialize_systems():
-    """Initialize all AI systems"""
+    """Check configuration; feature engines are built lazily by ensure_engine"""
     if not st.session_state.initialized:
-        with st.spinner("Initializing AI systems..."):
-            try:
-                # Initialize all systems
-                st.session_state.grading_assistant = AssessmentGradingAssistant(
-                    st.session_state.api_key,
-                    st.session_state.model,
-                    st.session_state.gemini_api_key
-                )
-                
-                st.session_state.content_recommender = ContentRecommender(
-                    st.session_state.api_key,
-                    st.session_state.model
-                )
-                # Load sample resources
-                st.session_state.content_recommender.add_learning_resources(SAMPLE_RESOURCES)
-                
-                st.session_state.wellbeing_monitor = WellbeingMonitor(
-                    st.session_state.api_key,
-                    st.session_state.model
-                )
-                
-                st.session_state.scheduling_system = SchedulingRewardSystem(
-                    st.session_state.api_key,
-                    model=st.session_state.model
-                )
-                
-                st.session_state.initialized = True
-                st.success("✅ All systems initialized successfully!")
-            except Exception as e:
-                st.error(f"❌ Error initializing systems: {str(e)}")
-                st.info("Please check your .env file and ensure GROQ_API_KEY is set correctly.")
+        if st.session_state.api_key:
+            st.session_state.response_cache = get_response_cache()
+            st.session_state.initialized = True
+        else:
+            st.error("❌ GROQ_API_KEY is not set")
+            st.info("Please check your .env file and ensure GROQ_API_KEY is set correctly.")
 
 # Main App
 def main():
@@ -158,6 +220,55 @@ def main():
     st.sidebar.info(f"**User:** {st.session_state.current_user}")
     st.sidebar.info(f"**Model:** {st.session_state.model}")
     
+    load_time = model_registry.get_load_time()
+    if load_time is not None:
+        st.sidebar.caption(f"Embedding model loaded in {load_time:.2f}s (shared by all sessions)")
+    else:
+        st.sidebar.caption("Embedding model loading in background...")
+    
+    with st.sidebar.expander("⚡ Response Cache"):
+        cache_stats = st.session_state.response_cache.get_stats()
+        st.write(f"Hits: {cache_stats['hits']} (memory {cache_stats['memory_hits']}, disk {cache_stats['disk_hits']})")
+        st.write(f"Misses: {cache_stats['misses']}")
+        st.write(f"Hit rate: {cache_stats['hit_rate']:.0%}")
+        st.write(f"Saved: {cache_stats['saved_seconds']}s, {cache_stats['saved_tokens']} tokens")
+        if "content_recommender" in st.session_state:
+            query_stats = st.session_state.content_recommender.get_query_cache_stats()
+            st.write(f"Query embeddings: {query_stats['hits']} hits, {query_stats['misses']} misses ({query_stats['hit_rate']:.0%})")
+        if "grading_assistant" in st.session_state:
+            ocr_stats = st.session_state.grading_assistant.ocr_cache.get_stats()
+            st.write(f"OCR: {ocr_stats['hits']} hits ({ocr_stats['near_hits']} near-duplicate), "
+                     f"{ocr_stats['misses']} misses, saved {ocr_stats['saved_seconds']}s")
+            backend_stats = st.session_state.grading_assistant.ocr_backend.get_stats()
+            st.write(f"OCR backend {backend_stats['backend']}: {backend_stats['images']} images "
+                     f"({backend_stats['images_per_second']}/s, {backend_stats['errors']} errors)")
+            objective_grader = st.session_state.grading_assistant.objective_grader
+            if objective_grader is not None:
+                tier_stats = objective_grader.get_stats()
+                st.write(f"Graded without LLM: {tier_stats['local']} ({tier_stats['mcq']} MCQ, {tier_stats['numeric']} numeric, "
+                         f"{tier_stats['exact']} text; {tier_stats['avg_local_us']} µs avg), "
+                         f"{tier_stats['escalated']} sent to LLM")
+    
+    # Rate limiter stats, once any engine has created the shared gateway
+    engine = next((st.session_state[name] for name in ENGINE_NAMES if name in st.session_state), None)
+    if engine is not None and hasattr(engine.client, "get_stats"):
+        gateway_stats = engine.client.get_stats()
+        limiter_stats = gateway_stats.get("rate_limiter")
+        with st.sidebar.expander("🚦 LLM Rate Limits"):
+            st.write(f"LLM calls: {gateway_stats['calls']} (avg {gateway_stats['avg_seconds']}s, {gateway_stats['errors']} errors)")
+            if limiter_stats:
+                st.write(f"Queued: {limiter_stats['queued']}, in flight: {sum(limiter_stats['in_flight'].values())}")
+                st.write(f"Waited: {limiter_stats['waited']} of {limiter_stats['admitted']} calls ({limiter_stats['wait_seconds']}s)")
+            retry_stats = gateway_stats.get("retry")
+            if retry_stats:
+                st.write(f"Retries: {retry_stats['retries']} ({retry_stats['rate_limited']} rate limited), "
+                         f"hedged: {retry_stats['hedges']} ({retry_stats['hedge_wins']} won)")
+            from structured_output import get_parse_stats
+            for schema, parse_stats in get_parse_stats().items():
+                st.write(f"Parsed {schema}: {parse_stats['success_rate']:.0%} of {parse_stats['responses']} replies "
+                         f"({parse_stats['repaired']} repaired, {parse_stats['recovered']} recovered by re-ask, "
+                         f"{parse_stats['avg_parse_ms']} ms)")
+    
     # Route to features
     if feature == "🏠 Dashboard":
         show_dashboard()
@@ -169,6 +280,9 @@ def main():
         show_wellbeing_monitor()
     elif feature == "📅 Scheduling & Rewards":
         show_scheduling_rewards()
+    
+    # Time from the start of this script run (including imports on a cold start) to a rendered page
+    st.sidebar.caption(f"⏱️ Page rendered in {(time.perf_counter() - _script_start) * 1000:.0f} ms")
 
 def show_dashboard():
     """Display system dashboard with project overview"""
@@ -444,9 +558,10 @@ def show_dashboard():
 
 def show_assessment_grading():
     """Feature 1: AI Assessment & Grading Assistant"""
+    ensure_engine("grading_assistant")
     st.header("📝 AI Assessment & Grading Assistant")
     
-    tab1, tab2, tab3 = st.tabs(["📄 Text Grading", "🖼️ Image Grading (OCR)", "🔍 Self-Evaluation"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📄 Text Grading", "🖼️ Image Grading (OCR)", "🔍 Self-Evaluation", "👥 Batch Grading"])
     
     with tab1:
         st.subheader("Grade Text-based Homework")
@@ -481,6 +596,8 @@ def show_assessment_grading():
                     
                     st.markdown("### 📋 Detailed Feedback")
                     st.info(result.get('feedback', 'No feedback available'))
+                    if result.get('grading_tier', 'llm') != 'llm':
+                        st.caption(f"Graded instantly by the {result['grading_tier']} rule, without an LLM call")
                     
                     if result.get('strengths'):
                         st.markdown("### ✅ Strengths")
@@ -516,36 +633,16 @@ def show_assessment_grading():
                                         type=['png', 'jpg', 'jpeg'], key="upload_hw")
         
         if uploaded_file:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Uploaded Homework", use_column_width=True)
+            # The upload's bytes go straight to the OCR model; nothing is written to disk
+            st.image(uploaded_file.getvalue(), caption="Uploaded Homework", use_column_width=True)
             
             if st.button("🔍 Extract Text & Grade", key="grade_ocr"):
                 if correct_answer_ocr:
                     with st.spinner("Extracting text using OCR..."):
-                        import tempfile
-                        import uuid
-                        
-                        # Create a unique temporary file
-                        temp_filename = f"temp_homework_{uuid.uuid4().hex[:8]}.png"
-                        temp_path = os.path.join(tempfile.gettempdir(), temp_filename)
-                        
-                        try:
-                            # Save uploaded file temporarily
-                            image.save(temp_path)
-                            
-                            grading_assistant = st.session_state.grading_assistant
-                            result = grading_assistant.grade_from_image(
-                                temp_path, correct_answer_ocr, subject_ocr, max_score_ocr
-                            )
-                        finally:
-                            # Clean up - ensure file is closed before deletion
-                            try:
-                                if os.path.exists(temp_path):
-                                    import time
-                                    time.sleep(0.1)  # Brief delay to ensure file is released
-                                    os.remove(temp_path)
-                            except (PermissionError, FileNotFoundError):
-                                pass  # File will be cleaned up by OS temp cleanup
+                        grading_assistant = st.session_state.grading_assistant
+                        result = grading_assistant.grade_from_image(
+                            uploaded_file, correct_answer_ocr, subject_ocr, max_score_ocr
+                        )
                         
                         # Display extracted text
                         st.markdown("### 📄 Extracted Text")
@@ -560,6 +657,12 @@ def show_assessment_grading():
                         
                         st.markdown("### 📋 Feedback")
                         st.info(result.get('feedback', 'No feedback available'))
+                        
+                        timings = result.get('timings')
+                        if timings:
+                            st.caption(f"OCR {timings['ocr_seconds']:.2f}s · grading {timings['grading_seconds']:.2f}s · "
+                                       f"total {timings['total_seconds']:.2f}s"
+                                       + (" · OCR reused from cache" if result.get('ocr_cached') else ""))
                 else:
                     st.warning("Please provide the correct answer")
     
@@ -600,8 +703,89 @@ def show_assessment_grading():
             else:
                 st.warning("Please enter your answer")
 
+    with tab4:
+        st.subheader("Grade a Whole Class")
+        st.info("Paste each student's answer separated by a line containing only ---")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            subject_batch = st.selectbox("Subject", ["Mathematics", "Science", "Biology", "Physics", "Chemistry", "English", "History"], key="subject_batch")
+            max_score_batch = st.number_input("Maximum Score", min_value=1, max_value=100, value=10, key="max_batch")
+        
+        with col2:
+            correct_answer_batch = st.text_area("Correct Answer / Solution", height=150, key="correct_batch",
+                placeholder="Enter the model answer or solution...")
+        
+        batch_text = st.text_area("Student Answers", height=250, key="batch_answers",
+            placeholder="Answer of student 1\n---\nAnswer of student 2\n---\n...")
+        pack_answers = st.checkbox("Grade several answers per request (fewer LLM calls and tokens)", value=True,
+                                   key="batch_pack")
+        
+        if st.button("🎯 Grade Class", key="grade_batch"):
+            submissions = [a.strip() for a in batch_text.split("\n---\n") if a.strip()]
+            if submissions and correct_answer_batch:
+                progress = st.progress(0.0, text=f"Graded 0/{len(submissions)}")
+                
+                def update_progress(idx, result, completed, total):
+                    progress.progress(completed / total, text=f"Graded {completed}/{total}")
+                
+                grading_assistant = st.session_state.grading_assistant
+                grade = grading_assistant.grade_batch_packed if pack_answers else grading_assistant.grade_batch
+                llm_before = grading_assistant.client.get_stats()
+                results = grade(
+                    submissions, correct_answer_batch, subject_batch, max_score_batch,
+                    on_result=update_progress
+                )
+                llm_after = grading_assistant.client.get_stats()
+                tokens = sum(llm_after[key] - llm_before[key] for key in ("prompt_tokens", "completion_tokens"))
+                st.caption(f"{llm_after['calls'] - llm_before['calls']} LLM calls, {tokens} tokens "
+                           f"({tokens / len(submissions):.0f} per student)")
+                
+                for i, (answer, result) in enumerate(zip(submissions, results), 1):
+                    with st.expander(f"Student {i}: {result['score']}/{max_score_batch} ({result.get('percentage', 0):.1f}%)"):
+                        st.markdown(f"**Answer:** {answer}")
+                        st.info(result.get('feedback', 'No feedback available'))
+            else:
+                st.warning("Please provide the student answers and the correct answer")
+
+        st.markdown("---")
+        st.markdown("### 📚 Scanned Worksheets")
+        st.info("Upload a multi-page PDF or a ZIP of the class's scans; pages are read, graded and listed as they finish")
+        scans_file = st.file_uploader("Scanned worksheets", type=['pdf', 'zip', 'png', 'jpg', 'jpeg'], key="batch_scans")
+        output_format = st.radio("Results file", ["csv", "jsonl"], horizontal=True, key="batch_scans_format")
+
+        if scans_file is not None and st.button("📥 Grade Scans", key="grade_scans"):
+            if correct_answer_batch:
+                from ingest_pipeline import IngestPipeline, ResultWriter
+
+                pipeline = IngestPipeline(st.session_state.grading_assistant, correct_answer_batch,
+                                          subject_batch, max_score_batch)
+                output = io.StringIO()
+                writer = ResultWriter(output, output_format)
+                status = st.empty()
+                table = st.empty()
+                rows = []
+                for result in pipeline.run(scans_file, name=scans_file.name):
+                    writer.write(result)
+                    rows.append({"page": result["page"] + 1, "source": result["source"],
+                                 "score": result["score"], "feedback": result["feedback"]})
+                    status.caption(f"Graded {len(rows)} pages")
+                    table.dataframe(sorted(rows, key=lambda row: row["page"]), hide_index=True, use_container_width=True)
+
+                stats = pipeline.get_stats()
+                status.caption(f"Graded {stats['pages']} pages in {stats.get('seconds', 0)}s "
+                               f"({stats.get('pages_per_second', 0)} pages/s, {stats['errors']} errors, "
+                               f"{stats['ocr_cached']} OCR reused)")
+                st.download_button(f"⬇️ Download results ({output_format.upper()})", output.getvalue(),
+                                   file_name=f"grades.{output_format}",
+                                   mime="text/csv" if output_format == "csv" else "application/jsonl")
+            else:
+                st.warning("Please provide the correct answer")
+
 def show_content_recommender():
     """Feature 2: Personalized Content Recommender & Q/A"""
+    ensure_engine("content_recommender")
     st.header("📚 Personalized Content Recommender & Q/A Agent")
     
     tab1, tab2, tab3 = st.tabs(["🎯 Content Recommendations", "❓ Q&A Agent", "📄 Generate Worksheet"])
@@ -662,19 +846,19 @@ def show_content_recommender():
             if question:
                 with st.spinner("Thinking..."):
                     recommender = st.session_state.content_recommender
-                    answer_result = recommender.answer_question(question, context_topic)
-                    
-                    st.markdown("### 📝 Answer")
-                    st.markdown(f'<div class="success-box">{answer_result["answer"]}</div>', 
-                               unsafe_allow_html=True)
-                    
-                    if answer_result['sources']:
-                        st.markdown("### 📚 Sources Referenced")
-                        for source in answer_result['sources']:
-                            st.markdown(f"- {source}")
-                    
-                    confidence_color = {"high": "green", "medium": "orange", "low": "red", "none": "gray"}
-                    st.markdown(f"**Confidence:** :{confidence_color.get(answer_result['confidence'], 'gray')}[{answer_result['confidence'].upper()}]")
+                    answer_result = recommender.answer_question_stream(question, context_topic)
+                
+                # Render the answer as it is generated
+                st.markdown("### 📝 Answer")
+                st.write_stream(answer_result["answer_stream"])
+                
+                if answer_result['sources']:
+                    st.markdown("### 📚 Sources Referenced")
+                    for source in answer_result['sources']:
+                        st.markdown(f"- {source}")
+                
+                confidence_color = {"high": "green", "medium": "orange", "low": "red", "none": "gray"}
+                st.markdown(f"**Confidence:** :{confidence_color.get(answer_result['confidence'], 'gray')}[{answer_result['confidence'].upper()}]")
             else:
                 st.warning("Please enter a question")
     
@@ -694,30 +878,39 @@ def show_content_recommender():
         
         if st.button("📄 Generate Worksheet", key="gen_worksheet"):
             if worksheet_topic:
-                with st.spinner("Creating worksheet..."):
-                    recommender = st.session_state.content_recommender
-                    worksheet = recommender.generate_practice_worksheet(
-                        worksheet_topic, worksheet_difficulty, num_questions
-                    )
-                    
-                    st.markdown(f"## {worksheet['title']}")
-                    st.markdown("---")
-                    
-                    for i, q in enumerate(worksheet['questions'], 1):
-                        st.markdown(f"### Question {i} ({q['type'].upper()})")
-                        st.markdown(f"**{q['question']}**")
+                recommender = st.session_state.content_recommender
+                title_placeholder = st.empty()
+                title_placeholder.markdown(f"## {worksheet_topic} Practice Worksheet")
+                st.markdown("---")
+                status = st.empty()
+                status.info("✍️ Writing questions...")
+                
+                # Each question is shown as soon as it has been generated
+                shown = 0
+                for event, payload in recommender.generate_practice_worksheet_stream(
+                    worksheet_topic, worksheet_difficulty, num_questions
+                ):
+                    if event == "question":
+                        shown += 1
+                        q = payload
+                        st.markdown(f"### Question {shown} ({str(q.get('type', 'general')).upper()})")
+                        st.markdown(f"**{q.get('question', '')}**")
                         
                         with st.expander("Show Answer"):
-                            st.success(f"**Answer:** {q['answer']}")
+                            st.success(f"**Answer:** {q.get('answer', '')}")
                             if q.get('explanation'):
                                 st.info(f"**Explanation:** {q['explanation']}")
                         
                         st.markdown("---")
+                    else:
+                        title_placeholder.markdown(f"## {payload.get('title', worksheet_topic)}")
+                status.empty()
             else:
                 st.warning("Please enter a topic")
 
 def show_wellbeing_monitor():
     """Feature 3: Teacher Well-being Monitor"""
+    ensure_engine("wellbeing_monitor")
     st.header("💚 Teacher Well-being Monitor & Peer Support")
     
     tab1, tab2, tab3 = st.tabs(["📝 Daily Reflection", "📊 Wellbeing Report", "🤝 Peer Support"])
@@ -853,6 +1046,7 @@ def show_wellbeing_monitor():
 
 def show_scheduling_rewards():
     """Feature 4: AI-Powered Scheduling & Intelligent Rewards"""
+    ensure_engine("scheduling_system")
     st.header("🤖 AI-Powered Scheduling & Intelligent Rewards")
     
     tab1, tab2, tab3, tab4, tab5 = st.tabs(["📅 Schedule", "🤖 AI Schedule Assistant", "➕ Add Events", "🏆 Rewards", "📊 Leaderboard"])
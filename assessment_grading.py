@@ -1,57 +1,193 @@
 """
 Feature 1: AI Assessment & Grading Assistant
-Uses Gemini Vision API for handwriting recognition + Groq LLM for grading
+Uses Gemini Vision API (or local OCR) for handwriting recognition + Groq LLM for grading
 """
 
+import asyncio
 import os
-from groq import Groq
-from PIL import Image
-import google.generativeai as genai
+import time
+from llm_gateway import LLMGateway, get_gateway
 import base64
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 import io
+import re
+import threading
+from response_cache import ResponseCache
+from structured_output import StructuredOutputError, astructured_chat_completion, structured_chat_completion, validate
+from rate_limiter import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from image_preprocessing import ImagePreprocessor
+from ocr_cache import OCRCache, image_dhash, image_digest
+from ocr_backends import OCRBackend, ocr_backend_from_env, read_image_bytes
+from objective_grader import ObjectiveGrader
+
+# Completion budget of a packed grading request
+PACKED_TOKENS_PER_STUDENT = 400
+PACKED_MAX_TOKENS = 8000
+# Anything in a student's answer that looks like a pack delimiter ([S3], [/ s12])
+PACK_TAG = re.compile(r"\[(\s*/?\s*S\s*\d+\s*)\]", re.IGNORECASE)
+
+def preprocess_image(image, preprocessor: Optional[ImagePreprocessor]):
+    """Return (image to send, pre-processed pixels or None)
+    
+    The image to send is the pre-processed JPEG bytes, or image unchanged
+    when there is no preprocessor or pre-processing fails.
+    """
+    if preprocessor is None:
+        return image, None
+    data = read_image_bytes(image)
+    if data is None:
+        payload, pixels = preprocessor.prepare_pil(image)
+        return payload or image, pixels
+    return preprocessor.prepare(data)
+
+
+def ocr_image_key(image, pixels, perceptual: bool = False) -> Optional[Tuple[str, Optional[int]]]:
+    """(exact digest, perceptual hash or None) of the pre-processed pixels,
+    else of image itself; the perceptual hash is only taken if asked for"""
+    try:
+        if pixels is None:
+            data = read_image_bytes(image)
+            pixels = data if data is not None else image
+        return image_digest(pixels), image_dhash(pixels) if perceptual else None
+    except Exception:
+        return None
+
 
 class AssessmentGradingAssistant:
-    def __init__(self, api_key: str, model: str, gemini_api_key: str = None):
-        """Initialize the grading assistant with Groq API and Gemini Vision"""
-        self.client = Groq(api_key=api_key)
+    def __init__(self, api_key: str, model: str, gemini_api_key: str = None,
+                 cache: Optional[ResponseCache] = None, client: Optional[LLMGateway] = None,
+                 preprocess_images: bool = True, preprocessor: Optional[ImagePreprocessor] = None,
+                 ocr_cache: Optional[OCRCache] = None, ocr_backend: Optional[OCRBackend] = None,
+                 objective_grading: bool = True, objective_grader: Optional[ObjectiveGrader] = None):
+        """Initialize the grading assistant with Groq API and an OCR backend
+        
+        cache is used for grading and hint responses; pass a shared
+        ResponseCache to reuse results across engines. LLM calls go through
+        client, which defaults to the process-wide pooled LLMGateway.
+        Images are pre-processed before OCR by preprocessor (default:
+        ImagePreprocessor.from_env()) unless preprocess_images is False.
+        With ocr_cache, OCR text is reused for images identical to an
+        earlier one after pre-processing, so re-grading a photo (e.g. with a changed
+        rubric) only repeats the grading call. Text is read by ocr_backend,
+        by default the one named by OCR_BACKEND (Gemini Vision unless set to
+        a local engine; see ocr_backends). Unless objective_grading is
+        False, multiple-choice, numeric and short exact answers are graded
+        by objective_grader (default: ObjectiveGrader.from_env()) without
+        an LLM call.
+        """
+        self.client = client or get_gateway(api_key)
         self.model = model
+        self.cache = cache
+        self.preprocessor = (preprocessor or ImagePreprocessor.from_env()) if preprocess_images else None
+        self.ocr_cache = ocr_cache
         self.gemini_api_key = gemini_api_key or os.getenv("GEMINI_API_KEY")
+        self.ocr_backend = ocr_backend or ocr_backend_from_env(self.gemini_api_key)
+        self.objective_grader = (objective_grader or ObjectiveGrader.from_env()) if objective_grading else None
+        self._batch_stats = {"packs": 0, "packed_answers": 0, "retried_individually": 0,
+                             "failed_packs": 0, "rejected_packs": 0, "last_pack_error": ""}
+        self._batch_stats_lock = threading.Lock()
+    
+    def extract_text_from_image(self, image) -> str:
+        """Extract text from handwritten/printed image with the OCR backend
         
-        # Initialize Gemini if API key is available
-        if self.gemini_api_key:
-            genai.configure(api_key=self.gemini_api_key)
-            self.vision_model = genai.GenerativeModel('gemini-2.5-flash')
-        else:
-            self.vision_model = None
+        image may be a file path, bytes, a file-like object (e.g. a
+        Streamlit upload) or a PIL image; see ocr_backends. It is
+        pre-processed first when the assistant has a preprocessor.
+        """
+        return self._extract_text(image)[0]
+    
+    async def aextract_text_from_image(self, image) -> str:
+        """Async counterpart of extract_text_from_image"""
+        return (await self._aextract_text(image))[0]
+    
+    def extract_text_batch(self, images: List, max_workers: int = 8) -> List[str]:
+        """Extract text from many images, in order, in one backend batch
+        
+        Images are pre-processed on a thread pool and looked up in the OCR
+        cache; only the misses go to the backend, whose extract_batch runs
+        them concurrently (Gemini) or across worker processes (local OCR).
+        """
+        if not images:
+            return []
+        workers = max(1, min(max_workers, len(images)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            prepared = list(executor.map(self.prepare_for_ocr, images))
+        
+        texts = [cached for _, _, cached in prepared]
+        misses = [idx for idx, text in enumerate(texts) if text is None]
+        if misses:
+            start = time.perf_counter()
+            extracted = self.ocr_backend.extract_batch([prepared[idx][0] for idx in misses])
+            latency = (time.perf_counter() - start) / len(misses)
+            for idx, text in zip(misses, extracted):
+                texts[idx] = text
+                self._ocr_cache_store(prepared[idx][1], text, latency)
+        return texts
+    
+    def prepare_for_ocr(self, image) -> Tuple[object, Optional[Tuple], Optional[str]]:
+        """Pre-process image and look it up in the OCR cache
+        
+        Returns (image to send to the backend, OCR cache key or None,
+        cached text or None). With ocr_prepared this splits
+        extract_text_from_image into a CPU step and an OCR step, e.g. for
+        the stages of ingest_pipeline.
+        """
+        image, pixels = preprocess_image(image, self.preprocessor)
+        key, cached = self._ocr_cache_lookup(image, pixels)
+        return image, key, cached
+    
+    def ocr_prepared(self, image, key: Optional[Tuple] = None) -> str:
+        """OCR an image returned by prepare_for_ocr and cache the text"""
+        start = time.perf_counter()
+        extracted_text = self.ocr_backend.extract_text(image)
+        self._ocr_cache_store(key, extracted_text, time.perf_counter() - start)
+        return extracted_text
+    
+    def _ocr_cache_lookup(self, image, pixels) -> Tuple[Optional[Tuple], Optional[str]]:
+        """Return (OCR cache key, cached OCR text or None)"""
+        if self.ocr_cache is None:
+            return None, None
+        key = ocr_image_key(image, pixels, self.ocr_cache.near_duplicates)
+        if key is None:
+            return None, None
+        entry = self.ocr_cache.get(key[0], self.ocr_backend.cache_namespace, phash=key[1])
+        return key, entry["text"] if entry is not None else None
     
-    def extract_text_from_image(self, image_path: str) -> str:
-        """Extract text from handwritten/printed image using Gemini Vision API"""
+    def _ocr_cache_store(self, key: Optional[Tuple], text: str, latency: float):
+        if key is not None and not text.startswith("Error"):
+            self.ocr_cache.set(key[0], text, latency, self.ocr_backend.cache_namespace, phash=key[1])
+    
+    def _extract_text(self, image) -> Tuple[str, bool]:
+        """Return (extracted text, whether it came from the OCR cache)"""
+        try:
+            image, key, cached = self.prepare_for_ocr(image)
+            if cached is not None:
+                return cached, True
+            return self.ocr_prepared(image, key), False
+            
+        except Exception as e:
+            return f"Error extracting text: {str(e)}", False
+    
+    async def _aextract_text(self, image) -> Tuple[str, bool]:
         try:
-            if not self.vision_model:
-                return "Error: Gemini API key not configured"
+            # OpenCV work would otherwise block the event loop
+            image, key, cached = await asyncio.to_thread(self.prepare_for_ocr, image)
+            if cached is not None:
+                return cached, True
             
-            # Load image with proper context management
-            with Image.open(image_path) as img:
-                # Create prompt for text extraction
-                prompt = """Please extract all the text from this image. 
-                This appears to be student homework or an assignment.
-                Return ONLY the text content you see, preserving the structure and formatting as much as possible.
-                Do not add any commentary or explanation."""
-                
-                # Generate content with vision model
-                response = self.vision_model.generate_content([prompt, img])
-                
-                extracted_text = response.text.strip()
-                return extracted_text
+            start = time.perf_counter()
+            extracted_text = await self.ocr_backend.aextract_text(image)
+            self._ocr_cache_store(key, extracted_text, time.perf_counter() - start)
+            return extracted_text, False
             
         except Exception as e:
-            return f"Error extracting text with Gemini Vision: {str(e)}"
+            return f"Error extracting text: {str(e)}", False
     
-    def grade_homework(self, student_answer: str, correct_answer: str, 
-                       subject: str, max_score: int = 10) -> Dict:
-        """Grade homework using Groq LLM"""
+    def _grading_request(self, student_answer: str, correct_answer: str, subject: str,
+                         max_score: int, priority: int, feature: str) -> Dict:
+        """Arguments for (a)structured_chat_completion when grading one answer"""
         
         prompt = f"""You are an expert teacher grading student homework.
 
@@ -81,79 +217,416 @@ Return your response in JSON format:
     "mistakes": ["<mistake1>", "<mistake2>"]
 }}
 """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert educational assessment assistant. Provide fair, constructive feedback."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1000
-            )
-            
-            result_text = response.choices[0].message.content
-            
-            # Try to parse JSON from response
-            try:
-                # Find JSON in the response
-                start_idx = result_text.find('{')
-                end_idx = result_text.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = result_text[start_idx:end_idx]
-                    result = json.loads(json_str)
-                else:
-                    raise ValueError("No JSON found in response")
-            except:
-                # Fallback to text response
-                result = {
-                    "score": max_score // 2,
-                    "percentage": 50.0,
-                    "feedback": result_text,
-                    "strengths": [],
-                    "improvements": [],
-                    "mistakes": []
-                }
-            
-            return result
-            
-        except Exception as e:
+        return {
+            "system_prompt": "You are an expert educational assessment assistant. Provide fair, constructive feedback.",
+            "user_prompt": prompt,
+            "schema": "grading",
+            "temperature": 0.3,
+            "max_tokens": 1000,
+            "feature": feature,
+            "priority": priority,
+            "hedge": priority == PRIORITY_INTERACTIVE
+        }
+    
+    def _grade_objective(self, student_answer: str, correct_answer: str, max_score: int) -> Optional[Dict]:
+        if self.objective_grader is None:
+            return None
+        return self.objective_grader.grade(student_answer, correct_answer, max_score)
+    
+    @staticmethod
+    def _finish_grade(result: Dict, max_score: int) -> Dict:
+        result["grading_tier"] = "llm"
+        result["score"] = min(result["score"], max_score)
+        if result["percentage"] is None:
+            result["percentage"] = round(100.0 * result["score"] / max_score, 1) if max_score else 0.0
+        return result
+    
+    @staticmethod
+    def _grading_failure(error: Exception) -> Dict:
+        if isinstance(error, StructuredOutputError):
+            # Keep the model's text for the teacher, but don't invent a score
             return {
                 "score": 0,
                 "percentage": 0.0,
-                "feedback": f"Error grading: {str(e)}",
+                "feedback": error.text or f"Error grading: {str(error)}",
                 "strengths": [],
                 "improvements": [],
-                "mistakes": []
+                "mistakes": [],
+                "error": f"Could not parse grading response: {str(error)}"
+            }
+        return {
+            "score": 0,
+            "percentage": 0.0,
+            "feedback": f"Error grading: {str(error)}",
+            "strengths": [],
+            "improvements": [],
+            "mistakes": [],
+            "error": str(error)
+        }
+    
+    def grade_homework(self, student_answer: str, correct_answer: str, 
+                       subject: str, max_score: int = 10, *,
+                       priority: int = PRIORITY_INTERACTIVE, feature: str = "grading") -> Dict:
+        """Grade homework, using Groq LLM for open-ended answers
+        
+        Objective answers (multiple choice, numbers, short exact phrases)
+        are graded locally by the objective grader when it is certain; the
+        result's "grading_tier" says which tier graded it ("llm" otherwise).
+        priority and feature are passed to the gateway's rate limiter.
+        Interactive calls may be hedged when they run past the p95 latency.
+        If every retry fails, or the reply cannot be parsed even after a
+        re-ask, the result carries an "error" key instead of a real score.
+        """
+        local = self._grade_objective(student_answer, correct_answer, max_score)
+        if local is not None:
+            return local
+        return self._llm_grade(student_answer, correct_answer, subject, max_score, priority, feature)
+    
+    def _llm_grade(self, student_answer: str, correct_answer: str, subject: str,
+                   max_score: int, priority: int, feature: str) -> Dict:
+        request = self._grading_request(student_answer, correct_answer, subject, max_score, priority, feature)
+        try:
+            result = structured_chat_completion(self.client, self.cache, self.model, **request)
+        except Exception as e:
+            return self._grading_failure(e)
+        return self._finish_grade(result, max_score)
+    
+    async def agrade_homework(self, student_answer: str, correct_answer: str,
+                              subject: str, max_score: int = 10, *,
+                              priority: int = PRIORITY_INTERACTIVE, feature: str = "grading") -> Dict:
+        """Async counterpart of grade_homework"""
+        local = self._grade_objective(student_answer, correct_answer, max_score)
+        if local is not None:
+            return local
+        request = self._grading_request(student_answer, correct_answer, subject, max_score, priority, feature)
+        try:
+            result = await astructured_chat_completion(self.client, self.cache, self.model, **request)
+        except Exception as e:
+            return self._grading_failure(e)
+        return self._finish_grade(result, max_score)
+    
+    def grade_batch(self, submissions: List[str], correct_answer: str,
+                    subject: str, max_score: int = 10, max_workers: int = 8,
+                    on_result: Optional[Callable[[int, Dict, int, int], None]] = None) -> List[Dict]:
+        """Grade a whole class concurrently against the same correct answer
+        
+        Each submission is graded with grade_homework on a bounded thread pool,
+        so the total wall time is close to the slowest few LLM calls instead of
+        the sum of all of them. Calls go through the rate limiter's batch lane,
+        so interactive requests from other pages are served first. Results are
+        returned in the same order as submissions. on_result(index, result,
+        completed, total) is called as each result arrives, which is useful
+        for progress bars.
+        """
+        total = len(submissions)
+        results: List[Optional[Dict]] = [None] * total
+        if total == 0:
+            return []
+        
+        workers = max(1, min(max_workers, total))
+        completed = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self.grade_homework, answer, correct_answer, subject, max_score,
+                                priority=PRIORITY_BATCH, feature="batch_grading"): idx
+                for idx, answer in enumerate(submissions)
+            }
+            for future in as_completed(futures):
+                idx = futures[future]
+                results[idx] = future.result()
+                completed += 1
+                if on_result:
+                    on_result(idx, results[idx], completed, total)
+        
+        return results
+    
+    async def agrade_batch(self, submissions: List[str], correct_answer: str,
+                           subject: str, max_score: int = 10, max_concurrency: int = 64,
+                           on_result: Optional[Callable[[int, Dict, int, int], None]] = None) -> List[Dict]:
+        """Async counterpart of grade_batch
+        
+        Runs up to max_concurrency gradings at once as tasks on the running
+        event loop instead of a thread pool (the gateway's rate limiter still
+        applies on top).
+        """
+        total = len(submissions)
+        results: List[Optional[Dict]] = [None] * total
+        semaphore = asyncio.Semaphore(max_concurrency)
+        completed = 0
+        
+        async def grade(idx: int, answer: str):
+            nonlocal completed
+            async with semaphore:
+                results[idx] = await self.agrade_homework(answer, correct_answer, subject, max_score,
+                                                          priority=PRIORITY_BATCH, feature="batch_grading")
+            completed += 1
+            if on_result:
+                on_result(idx, results[idx], completed, total)
+        
+        await asyncio.gather(*(grade(idx, answer) for idx, answer in enumerate(submissions)))
+        return results
+
+    def grade_batch_packed(self, submissions: List[str], correct_answer: str,
+                           subject: str, max_score: int = 10, pack_size: int = 8, max_workers: int = 4,
+                           on_result: Optional[Callable[[int, Dict, int, int], None]] = None) -> List[Dict]:
+        """Grade a class with several answers per LLM request
+        
+        Like grade_batch, but answers the objective grader cannot handle are
+        sent pack_size at a time in one prompt that states the subject,
+        rubric and correct answer once, so a class costs far fewer calls and
+        prompt tokens. A reply without exactly one result per student of the
+        pack is discarded and those students are re-graded individually, as
+        is any student whose result does not validate on its own; see
+        get_batch_stats. Results are in submission order.
+        """
+        if pack_size <= 0:
+            raise ValueError(f"pack_size must be at least 1, got {pack_size}")
+        total = len(submissions)
+        results: List[Optional[Dict]] = [None] * total
+        completed = 0
+        
+        def finish(idx: int, result: Dict):
+            nonlocal completed
+            results[idx] = result
+            completed += 1
+            if on_result:
+                on_result(idx, result, completed, total)
+        
+        pending = []
+        for idx, answer in enumerate(submissions):
+            local = self._grade_objective(answer, correct_answer, max_score)
+            if local is not None:
+                finish(idx, local)
+            else:
+                pending.append(idx)
+        if not pending:
+            return results
+        
+        packs = [pending[i:i + pack_size] for i in range(0, len(pending), pack_size)]
+        missing = []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(packs)))) as executor:
+            futures = {
+                executor.submit(self._grade_pack, [submissions[idx] for idx in pack],
+                                correct_answer, subject, max_score): pack
+                for pack in packs
+            }
+            for future in as_completed(futures):
+                for idx, result in zip(futures[future], future.result()):
+                    if result is None:
+                        missing.append(idx)
+                    else:
+                        finish(idx, result)
+            
+            retries = {
+                executor.submit(self._llm_grade, submissions[idx], correct_answer, subject, max_score,
+                                PRIORITY_BATCH, "batch_grading"): idx
+                for idx in missing
             }
+            for future in as_completed(retries):
+                finish(retries[future], future.result())
+        
+        with self._batch_stats_lock:
+            self._batch_stats["packs"] += len(packs)
+            self._batch_stats["packed_answers"] += len(pending) - len(missing)
+            self._batch_stats["retried_individually"] += len(missing)
+        return results
+    
+    def _grade_pack(self, answers: List[str], correct_answer: str, subject: str,
+                    max_score: int) -> List[Optional[Dict]]:
+        """Grade answers in one request; None for students without a valid result
+        
+        Unless the reply has exactly one entry for each of S1..Sn, the whole
+        pack is rejected (all None), since results may have shifted between
+        students.
+        """
+        if len(answers) == 1:
+            return [self._llm_grade(answers[0], correct_answer, subject, max_score,
+                                    PRIORITY_BATCH, "batch_grading")]
+        
+        request = self._packed_grading_request(answers, correct_answer, subject, max_score)
+        try:
+            data = structured_chat_completion(self.client, self.cache, self.model, **request)
+        except Exception as e:
+            return self._pack_failure("failed_packs", f"Packed grading failed: {str(e)}", len(answers))
+        
+        items = [item for item in data["results"] if isinstance(item, dict)]
+        ids = [re.fullmatch(r"\s*S(\d+)\s*", str(item.get("student", "")), re.IGNORECASE) for item in items]
+        positions = [int(match.group(1)) - 1 if match else -1 for match in ids]
+        if sorted(positions) != list(range(len(answers))):
+            students = [item.get("student") for item in items]
+            return self._pack_failure("rejected_packs",
+                                      f"Packed reply had students {students!r} for S1..S{len(answers)}",
+                                      len(answers))
+        
+        graded: List[Optional[Dict]] = [None] * len(answers)
+        for position, item in zip(positions, items):
+            try:
+                result = validate(item, "grading")
+            except StructuredOutputError:
+                continue
+            result.pop("student", None)
+            graded[position] = self._finish_grade(result, max_score)
+        return graded
+    
+    def _pack_failure(self, counter: str, error: str, size: int) -> List[None]:
+        """Record why a pack produced no results; its students are graded individually"""
+        with self._batch_stats_lock:
+            self._batch_stats[counter] += 1
+            self._batch_stats["last_pack_error"] = error
+        return [None] * size
+    
+    def _packed_grading_request(self, answers: List[str], correct_answer: str,
+                                subject: str, max_score: int) -> Dict:
+        """Arguments for structured_chat_completion when grading a pack of answers"""
+        
+        # An answer must not be able to close its own tags or open another
+        # student's, so delimiter look-alikes in it are turned into (S3)
+        sanitized = [PACK_TAG.sub(r"(\1)", answer) for answer in answers]
+        students = "\n\n".join(f"[S{i}]\n{answer}\n[/S{i}]" for i, answer in enumerate(sanitized, 1))
+        # Everything up to the student answers is the same for every pack of
+        # the class, so providers with prompt caching can reuse the prefix
+        prompt = f"""You are an expert teacher grading student homework.
+
+Subject: {subject}
+Maximum Score: {max_score}
+
+Correct Answer/Solution:
+{correct_answer}
+
+Each student's answer is given between [Sn] and [/Sn] tags below.
+Grade every student independently against the correct answer and provide:
+1. Score (out of {max_score})
+2. Detailed feedback
+3. Strengths in the answer
+4. Areas for improvement
+5. Common mistakes identified
+
+Return your response in JSON format, with exactly one entry per student:
+{{
+    "results": [
+        {{
+            "student": "S1",
+            "score": <number>,
+            "percentage": <percentage>,
+            "feedback": "<detailed feedback>",
+            "strengths": ["<strength1>", "<strength2>"],
+            "improvements": ["<improvement1>", "<improvement2>"],
+            "mistakes": ["<mistake1>", "<mistake2>"]
+        }}
+    ]
+}}
+
+Student answers (S1 to S{len(answers)}):
+
+{students}
+"""
+        return {
+            "system_prompt": "You are an expert educational assessment assistant. Provide fair, constructive feedback.",
+            "user_prompt": prompt,
+            "schema": "grading_batch",
+            "temperature": 0.3,
+            "max_tokens": min(PACKED_MAX_TOKENS, 200 + PACKED_TOKENS_PER_STUDENT * len(answers)),
+            "feature": "batch_grading",
+            "priority": PRIORITY_BATCH,
+            "hedge": False
+        }
+    
+    def get_batch_stats(self) -> Dict:
+        """Packed requests sent, answers graded in them and answers that had
+        to be re-graded individually, plus packs whose request failed or
+        whose reply was rejected and the last such error"""
+        with self._batch_stats_lock:
+            return dict(self._batch_stats)
+    
+    def grade_image_batch(self, images: List, correct_answer: str, subject: str,
+                          max_score: int = 10, max_workers: int = 8,
+                          on_result: Optional[Callable[[int, Dict, int, int], None]] = None) -> List[Dict]:
+        """Grade a stack of scanned worksheets: one OCR batch, then grade_batch
+
+        Results are in the same order as images; images whose OCR failed get
+        a zero score with the error as feedback. on_result is called as in
+        grade_batch, for the images that were graded.
+        """
+        texts = self.extract_text_batch(images, max_workers=max_workers)
+        results = [self._ocr_failure(text) if text.startswith("Error") else None for text in texts]
+        graded = [idx for idx, result in enumerate(results) if result is None]
+
+        def report(position: int, result: Dict, completed: int, total: int):
+            if on_result:
+                on_result(graded[position], result, completed, total)
+
+        batch = self.grade_batch([texts[idx] for idx in graded], correct_answer, subject, max_score,
+                                 max_workers=max_workers, on_result=report)
+        for idx, result in zip(graded, batch):
+            result["extracted_text"] = texts[idx]
+            results[idx] = result
+        return results
+
+    @staticmethod
+    def _ocr_failure(extracted_text: str) -> Dict:
+        return {
+            "score": 0,
+            "percentage": 0.0,
+            "feedback": extracted_text,
+            "extracted_text": "",
+            "strengths": [],
+            "improvements": [],
+            "mistakes": [],
+            "error": extracted_text
+        }
     
-    def grade_from_image(self, image_path: str, correct_answer: str, 
+    def grade_from_image(self, image, correct_answer: str,
                         subject: str, max_score: int = 10) -> Dict:
-        """Complete pipeline: OCR + Grading"""
+        """Complete pipeline: OCR + Grading
+        
+        image is anything extract_text_from_image accepts. The result's
+        "timings" holds ocr_seconds, grading_seconds and total_seconds, and
+        "ocr_cached" says whether the text came from the OCR cache.
+        """
+        start = time.perf_counter()
         
         # Step 1: Extract text from image
-        extracted_text = self.extract_text_from_image(image_path)
+        extracted_text, ocr_cached = self._extract_text(image)
+        ocr_done = time.perf_counter()
         
         if extracted_text.startswith("Error"):
-            return {
-                "score": 0,
-                "percentage": 0.0,
-                "feedback": extracted_text,
-                "extracted_text": "",
-                "strengths": [],
-                "improvements": [],
-                "mistakes": []
-            }
+            return self._with_timings(self._ocr_failure(extracted_text), start, ocr_done)
         
         # Step 2: Grade the extracted text
         grading_result = self.grade_homework(extracted_text, correct_answer, subject, max_score)
         grading_result["extracted_text"] = extracted_text
+        grading_result["ocr_cached"] = ocr_cached
         
-        return grading_result
+        return self._with_timings(grading_result, start, ocr_done)
     
-    def provide_self_evaluation_hints(self, student_answer: str, subject: str) -> Dict:
-        """Provide hints for student self-evaluation without giving away answers"""
+    async def agrade_from_image(self, image, correct_answer: str,
+                                subject: str, max_score: int = 10) -> Dict:
+        """Async counterpart of grade_from_image"""
+        start = time.perf_counter()
+        extracted_text, ocr_cached = await self._aextract_text(image)
+        ocr_done = time.perf_counter()
+        
+        if extracted_text.startswith("Error"):
+            return self._with_timings(self._ocr_failure(extracted_text), start, ocr_done)
+        
+        grading_result = await self.agrade_homework(extracted_text, correct_answer, subject, max_score)
+        grading_result["extracted_text"] = extracted_text
+        grading_result["ocr_cached"] = ocr_cached
+        
+        return self._with_timings(grading_result, start, ocr_done)
+    
+    @staticmethod
+    def _with_timings(result: Dict, start: float, ocr_done: float) -> Dict:
+        end = time.perf_counter()
+        result["timings"] = {
+            "ocr_seconds": round(ocr_done - start, 4),
+            "grading_seconds": round(end - ocr_done, 4),
+            "total_seconds": round(end - start, 4)
+        }
+        return result
+    
+    def _hints_request(self, student_answer: str, subject: str) -> Dict:
+        """Arguments for (a)structured_chat_completion when writing hints"""
         
         prompt = f"""You are helping a student self-evaluate their homework.
 
@@ -175,46 +648,42 @@ Return response in JSON format:
     "reflection_questions": ["<question1>", "<question2>"]
 }}
 """
-        
+        return {
+            "system_prompt": "You are a supportive tutor helping students learn through guided self-evaluation.",
+            "user_prompt": prompt,
+            "schema": "hints",
+            "temperature": 0.5,
+            "max_tokens": 800,
+            "feature": "hints"
+        }
+    
+    @staticmethod
+    def _hints_failure(error: Exception) -> Dict:
+        hint = f"Error: {str(error)}"
+        if isinstance(error, StructuredOutputError) and error.text:
+            hint = error.text
+        return {
+            "estimated_score_range": "N/A",
+            "hints": [hint],
+            "review_topics": [],
+            "reflection_questions": []
+        }
+    
+    def provide_self_evaluation_hints(self, student_answer: str, subject: str) -> Dict:
+        """Provide hints for student self-evaluation without giving away answers"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a supportive tutor helping students learn through guided self-evaluation."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5,
-                max_tokens=800
-            )
-            
-            result_text = response.choices[0].message.content
-            
-            try:
-                start_idx = result_text.find('{')
-                end_idx = result_text.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = result_text[start_idx:end_idx]
-                    result = json.loads(json_str)
-                else:
-                    raise ValueError("No JSON found")
-            except:
-                result = {
-                    "estimated_score_range": "N/A",
-                    "hints": [result_text],
-                    "review_topics": [],
-                    "reflection_questions": []
-                }
-            
-            return result
-            
+            return structured_chat_completion(self.client, self.cache, self.model,
+                                              **self._hints_request(student_answer, subject))
         except Exception as e:
-            return {
-                "estimated_score_range": "N/A",
-                "hints": [f"Error: {str(e)}"],
-                "review_topics": [],
-                "reflection_questions": []
-            }
-
+            return self._hints_failure(e)
+    
+    async def aprovide_self_evaluation_hints(self, student_answer: str, subject: str) -> Dict:
+        """Async counterpart of provide_self_evaluation_hints"""
+        try:
+            return await astructured_chat_completion(self.client, self.cache, self.model,
+                                                     **self._hints_request(student_answer, subject))
+        except Exception as e:
+            return self._hints_failure(e)
 
 if __name__ == "__main__":
     # Test the grading assistant
@@ -0,0 +1,127 @@
+"""
+Benchmark: batch grading throughput with threads vs asyncio
+Grades a class of submissions against the local stub server with
+grade_batch (thread pool) and agrade_batch (tasks on one event loop) at a
+few concurrency levels, and reports wall time, throughput and the peak
+number of threads in the process. The stub runs in a child process so its
+own threads and CPU time are not counted against the client.
+
+Usage: python benchmarks/bench_async_engines.py [submissions] [latency_seconds]
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assessment_grading import AssessmentGradingAssistant
+from llm_gateway import LLMGateway
+from rate_limiter import RateLimiter
+from retry_policy import RetryPolicy
+
+STUB_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_llm_server.py")
+
+
+def start_stub_process(latency: float):
+    """Run stub_llm_server.py in a child process; returns (process, base_url)"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen([sys.executable, STUB_SERVER, str(port), str(latency)],
+                               stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return process, f"http://127.0.0.1:{port}"
+
+
+class ThreadPeak:
+    """Samples threading.active_count() in the background"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def make_grader(base_url: str, concurrency: int):
+    # The limiter's batch lane would otherwise cap both modes at 4 in flight
+    limiter = RateLimiter(feature_concurrency={"batch_grading": concurrency}, default_concurrency=concurrency)
+    gateway = LLMGateway("stub-key", base_url=base_url, max_connections=concurrency,
+                         max_keepalive_connections=concurrency, rate_limiter=limiter,
+                         retry_policy=RetryPolicy(hedge=False), async_max_connections=concurrency)
+    return gateway, AssessmentGradingAssistant("stub-key", "stub", client=gateway)
+
+
+def report(label: str, elapsed: float, results, peak_threads: int):
+    failed = sum(1 for r in results if "error" in r)
+    print(f"{label:26s} {elapsed:7.2f} s  {len(results) / elapsed:8.1f} gradings/s  "
+          f"threads {peak_threads:4d}  errors {failed}")
+
+
+def run_threads(base_url: str, submissions, concurrency: int):
+    gateway, grader = make_grader(base_url, concurrency)
+    with ThreadPeak() as peak:
+        start = time.perf_counter()
+        results = grader.grade_batch(submissions, "Correct answer", "Math", max_workers=concurrency)
+        elapsed = time.perf_counter() - start
+    report(f"grade_batch x{concurrency}", elapsed, results, peak.peak)
+    gateway.close()
+
+
+def run_async(base_url: str, submissions, concurrency: int):
+    gateway, grader = make_grader(base_url, concurrency)
+
+    async def main():
+        try:
+            return await grader.agrade_batch(submissions, "Correct answer", "Math", max_concurrency=concurrency)
+        finally:
+            await gateway.aclose()
+
+    with ThreadPeak() as peak:
+        start = time.perf_counter()
+        results = asyncio.run(main())
+        elapsed = time.perf_counter() - start
+    report(f"agrade_batch x{concurrency}", elapsed, results, peak.peak)
+    gateway.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    server, base_url = start_stub_process(latency)
+    submissions = [f"Student answer {i}" for i in range(count)]
+
+    print("=" * 60)
+    print(f"ASYNC ENGINES BENCHMARK - {count} gradings, {latency * 1000:.0f} ms per LLM call")
+    print("=" * 60)
+    run_threads(base_url, submissions, 8)
+    run_threads(base_url, submissions, 64)
+    run_async(base_url, submissions, 64)
+    run_async(base_url, submissions, 256)
+    server.terminate()
+    server.wait()
+
+
+if __name__ == "__main__":
+    main()
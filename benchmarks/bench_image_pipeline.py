@@ -0,0 +1,120 @@
+"""
+Benchmark: grade_from_image latency with the old temp-file path vs in memory
+The old OCR tab decoded the upload with PIL, saved it as a PNG temp file,
+slept 0.1 s before deleting it, and OCR re-opened the file so the Gemini
+SDK re-encoded the decoded image. The new path hands the upload's bytes to
+the vision model unchanged. Gemini is replaced by a stand-in that encodes
+its inputs the way the SDK does, and grading runs against the local stub.
+
+Usage: python benchmarks/bench_image_pipeline.py [images]
+"""
+
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageDraw
+
+from assessment_grading import AssessmentGradingAssistant
+from llm_gateway import LLMGateway
+from stub_llm_server import start_stub_server
+
+
+class StandInVisionModel:
+    """Encodes PIL images like google.generativeai (PNG for PNG files,
+    JPEG otherwise) and records the payload size"""
+
+    def __init__(self):
+        self.payload_bytes = []
+
+    def generate_content(self, parts):
+        size = 0
+        for part in parts:
+            if isinstance(part, dict):
+                size += len(part["data"])
+            elif isinstance(part, Image.Image):
+                buffer = io.BytesIO()
+                part.save(buffer, format="PNG" if part.format == "PNG" else "JPEG")
+                size += buffer.tell()
+        self.payload_bytes.append(size)
+        return type("Response", (), {"text": "x = 4 because 2x = 8"})()
+
+
+def make_photo(seed: int, size=(2448, 3264)) -> bytes:
+    """A phone-camera sized JPEG of a handwritten-looking page"""
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, (236, 232, 220))
+    draw = ImageDraw.Draw(img)
+    for line in range(40):
+        y = 120 + line * 75
+        x = 100
+        while x < size[0] - 200:
+            width = rng.randint(20, 90)
+            draw.line([(x, y + rng.randint(-6, 6)), (x + width, y + rng.randint(-6, 6))],
+                      fill=(30, 30, 90), width=4)
+            x += width + rng.randint(15, 40)
+    noise = Image.effect_noise(size, 18).convert("RGB")
+    img = Image.blend(img, noise, 0.08)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def legacy_grade(grader, upload: io.BytesIO):
+    """What the OCR tab and extract_text_from_image used to do"""
+    image = Image.open(upload)
+    temp_path = os.path.join(tempfile.gettempdir(), f"temp_homework_{uuid.uuid4().hex[:8]}.png")
+    try:
+        image.save(temp_path)
+        with Image.open(temp_path) as img:
+            result = grader.grade_from_image(img, "x = 4", "Mathematics")
+    finally:
+        if os.path.exists(temp_path):
+            time.sleep(0.1)
+            os.remove(temp_path)
+    return result
+
+
+def run(label: str, grade, grader, vision, photos):
+    vision.payload_bytes.clear()
+    timings = []
+    for photo in photos:
+        upload = io.BytesIO(photo)
+        start = time.perf_counter()
+        grade(grader, upload)
+        timings.append(time.perf_counter() - start)
+    mean_ms = 1000 * sum(timings) / len(timings)
+    mean_kb = sum(vision.payload_bytes) / len(vision.payload_bytes) / 1024
+    print(f"{label:22s} {mean_ms:8.1f} ms/image   payload {mean_kb:8.0f} KB")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    server, base_url = start_stub_server()
+    gateway = LLMGateway("stub-key", base_url=base_url)
+    grader = AssessmentGradingAssistant("stub-key", "stub", client=gateway, preprocess_images=False)
+    vision = StandInVisionModel()
+    grader.ocr_backend._vision_model = vision
+
+    photos = [make_photo(seed) for seed in range(count)]
+    print("=" * 60)
+    print(f"IMAGE PIPELINE BENCHMARK - {count} photos, "
+          f"{sum(map(len, photos)) / count / 1024:.0f} KB JPEG each")
+    print("=" * 60)
+    run("Temp PNG file (old)", legacy_grade, grader, vision, photos)
+    run("In memory (new)", lambda g, upload: g.grade_from_image(upload, "x = 4", "Mathematics"),
+        grader, vision, photos)
+
+    server.shutdown()
+    gateway.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark: OCR payload size and latency with and without image pre-processing
+Runs ImagePreprocessor over a fixture set of homework photos and reports
+bytes sent, pre-processing time, the rotation applied to undo the skew
+and the upload time at UPLINK_MBITS. OCR latency is measured for real when possible: with
+GEMINI_API_KEY set it calls Gemini, otherwise pytesseract if installed.
+
+By default the fixtures are synthetic phone photos (a tilted, unevenly lit
+page of text on a desk) written to a temp directory; pass a directory to
+use your own photos instead.
+
+Usage: python benchmarks/bench_image_preprocessing.py [photo_dir] [count]
+"""
+
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from image_preprocessing import ImagePreprocessor
+
+UPLINK_MBITS = 10
+PHOTO_SIZE = (3024, 4032)
+LINES = [
+    "Q1. Solve 2x + 6 = 14.",
+    "2x = 14 - 6 = 8, so x = 4.",
+    "Q2. What is photosynthesis?",
+    "Plants use sunlight, water and carbon",
+    "dioxide to make glucose and oxygen.",
+    "Q3. Area of a circle, r = 3 cm:",
+    "A = pi r^2 = 9 pi = 28.3 cm^2",
+]
+
+
+def load_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only has the small bitmap font
+        return ImageFont.load_default()
+
+
+def make_fixture(seed: int) -> (bytes, float):
+    """A JPEG phone photo of a written page; returns (bytes, true skew)"""
+    rng = random.Random(seed)
+    page = Image.new("L", (2100, 2800), 235)
+    draw = ImageDraw.Draw(page)
+    font = load_font(64)
+    y = 220
+    for _ in range(3):
+        for line in LINES:
+            draw.text((160 + rng.randint(0, 40), y), line, fill=rng.randint(70, 110), font=font)
+            y += 105
+    skew = rng.uniform(-6, 6)
+    page = page.rotate(skew, resample=Image.BICUBIC, expand=True, fillcolor=120)
+
+    photo = Image.new("L", PHOTO_SIZE, 120)
+    photo.paste(page, ((PHOTO_SIZE[0] - page.width) // 2, (PHOTO_SIZE[1] - page.height) // 2))
+    # Uneven lighting, a little blur and sensor noise
+    gradient = np.linspace(0.75, 1.05, PHOTO_SIZE[0])[None, :] * np.linspace(1.0, 0.85, PHOTO_SIZE[1])[:, None]
+    pixels = np.asarray(photo.filter(ImageFilter.GaussianBlur(1.2)), dtype=np.float32) * gradient
+    pixels += np.random.default_rng(seed).normal(0, 6, pixels.shape)
+    tint = np.clip(pixels, 0, 255).astype(np.uint8)
+    rgb = Image.merge("RGB", [Image.fromarray(tint), Image.fromarray(tint), Image.fromarray((tint * 0.92).astype(np.uint8))])
+
+    buffer = io.BytesIO()
+    rgb.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue(), skew
+
+
+def load_fixtures(photo_dir: str, count: int):
+    if photo_dir:
+        names = sorted(n for n in os.listdir(photo_dir) if n.lower().endswith((".jpg", ".jpeg", ".png")))
+        fixtures = []
+        for name in names[:count]:
+            with open(os.path.join(photo_dir, name), "rb") as f:
+                fixtures.append((name, f.read(), None))
+        return fixtures
+
+    fixture_dir = tempfile.mkdtemp(prefix="ocr_fixtures_")
+    fixtures = []
+    for seed in range(count):
+        data, skew = make_fixture(seed)
+        name = f"homework_{seed}.jpg"
+        with open(os.path.join(fixture_dir, name), "wb") as f:
+            f.write(data)
+        fixtures.append((name, data, skew))
+    print(f"Wrote {count} synthetic fixtures to {fixture_dir}")
+    return fixtures
+
+
+def make_ocr():
+    """(label, ocr(bytes) -> text) for the best OCR available, or None"""
+    if os.getenv("GEMINI_API_KEY"):
+        from assessment_grading import AssessmentGradingAssistant
+
+        grader = AssessmentGradingAssistant(os.getenv("GROQ_API_KEY", "unused"), "unused", preprocess_images=False)
+        return "Gemini", grader.extract_text_from_image
+    try:
+        import pytesseract
+    except ImportError:
+        return None
+    return "tesseract", lambda data: pytesseract.image_to_string(Image.open(io.BytesIO(data)))
+
+
+def upload_ms(size: int) -> float:
+    return 1000 * size * 8 / (UPLINK_MBITS * 1_000_000)
+
+
+def main():
+    photo_dir = sys.argv[1] if len(sys.argv) > 1 and os.path.isdir(sys.argv[1]) else None
+    count = int(sys.argv[-1]) if len(sys.argv) > 1 and sys.argv[-1].isdigit() else 6
+    fixtures = load_fixtures(photo_dir, count)
+    preprocessor = ImagePreprocessor()
+    ocr = make_ocr()
+
+    print("=" * 78)
+    print(f"IMAGE PRE-PROCESSING BENCHMARK - {len(fixtures)} photos, upload at {UPLINK_MBITS} Mbit/s")
+    print("=" * 78)
+    print(f"{'Photo':16s} {'original':>9s} {'processed':>10s} {'prep ms':>8s} "
+          f"{'skew':>6s} {'undo':>6s} {'upload ms':>16s}")
+
+    totals = {"before": 0, "after": 0, "prep": 0.0}
+    ocr_times = {"original": [], "processed": []}
+    for name, data, skew in fixtures:
+        start = time.perf_counter()
+        processed = preprocessor.process(data)
+        prep = time.perf_counter() - start
+        found = preprocessor.skew_angle(preprocessor.downscale(preprocessor.crop_to_content(
+            np.asarray(Image.open(io.BytesIO(data)).convert("L")))))
+        totals["before"] += len(data)
+        totals["after"] += len(processed)
+        totals["prep"] += prep
+        skew_text = f"{skew:6.1f}" if skew is not None else f"{'-':>6s}"
+        print(f"{name[:16]:16s} {len(data) / 1024:7.0f}KB {len(processed) / 1024:8.0f}KB {1000 * prep:8.0f} "
+              f"{skew_text} {found:6.1f} {upload_ms(len(data)):7.0f} -> {upload_ms(len(processed)):5.0f}")
+
+        if ocr:
+            for label, payload in (("original", data), ("processed", processed)):
+                start = time.perf_counter()
+                ocr[1](payload)
+                ocr_times[label].append(time.perf_counter() - start)
+
+    n = len(fixtures)
+    print(f"\nMean payload: {totals['before'] / n / 1024:.0f} KB -> {totals['after'] / n / 1024:.0f} KB "
+          f"({1 - totals['after'] / totals['before']:.0%} smaller), pre-processing {1000 * totals['prep'] / n:.0f} ms/photo")
+    if ocr:
+        print(f"{ocr[0]} OCR latency: original {1000 * np.mean(ocr_times['original']):.0f} ms, "
+              f"processed {1000 * np.mean(ocr_times['processed']):.0f} ms")
+    else:
+        print("OCR latency skipped: set GEMINI_API_KEY or install pytesseract")
+    print(f"Stats: {preprocessor.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Import-time report for app cold start (python -X importtime style)
+Measures what app.py imports before the first page can paint, and what each
+feature module costs when its page is first opened.
+
+Usage: python benchmarks/bench_import_time.py [--top N]
+"""
+
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported at the top of app.py, i.e. paid before the first paint
+APP_STARTUP_IMPORTS = ["streamlit", "dotenv", "response_cache", "model_registry"]
+
+# Imported lazily, when the matching page or method is first used
+FEATURE_IMPORTS = {
+    "Grading page": ["assessment_grading"],
+    "OCR (first image)": ["PIL.Image", "google.generativeai"],
+    "Recommender page": ["content_recommender"],
+    "Embedding model (background warm-up)": ["sentence_transformers"],
+    "Well-being page": ["wellbeing_monitor"],
+    "Scheduling page": ["scheduling_rewards"],
+}
+
+
+def measure(modules):
+    """Run a fresh interpreter with -X importtime and parse its report
+
+    Returns (total_ms, [(cumulative_ms, name), ...]) or (None, error).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        cwd=REPO_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"
+        return None, last_line
+
+    entries = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        cumulative_us = int(cumulative)
+        entries.append((cumulative_us / 1000, name.strip()))
+        if not name[1:].startswith(" "):
+            total_us += cumulative_us  # top-level import
+    return total_us / 1000, entries
+
+
+def print_report(label, modules, top_n):
+    total_ms, entries = measure(modules)
+    if total_ms is None:
+        print(f"{label:<40} unavailable ({entries})")
+        return
+    print(f"{label:<40} {total_ms:>9.1f} ms")
+    for cumulative_ms, name in sorted(entries, reverse=True)[:top_n]:
+        print(f"    {cumulative_ms:>9.1f} ms  {name}")
+
+
+def main():
+    top_n = 5
+    if "--top" in sys.argv:
+        top_n = int(sys.argv[sys.argv.index("--top") + 1])
+
+    print("=" * 60)
+    print("IMPORT TIME REPORT (fresh interpreter per row)")
+    print("=" * 60)
+    print_report("App startup (before first paint)", APP_STARTUP_IMPORTS, top_n)
+    print()
+    for label, modules in FEATURE_IMPORTS.items():
+        print_report(label, modules, top_n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: per-call latency with a fresh client per call vs the pooled gateway
+Runs against the local stub server over TLS (self-signed certificate made
+with the openssl CLI), so the difference is the TCP + TLS handshake that
+keep-alive connection reuse saves.
+
+Usage: python benchmarks/bench_llm_gateway.py [calls] [--plain]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_gateway import LLMGateway
+from stub_llm_server import start_stub_server
+
+MESSAGES = [{"role": "user", "content": "Grade this answer."}]
+
+
+def make_self_signed_cert(directory: str):
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-keyout", keyfile, "-out", certfile],
+        check=True, capture_output=True
+    )
+    return certfile, keyfile
+
+
+def time_calls(make_gateway, calls: int) -> float:
+    """Mean milliseconds per call; make_gateway() is called per call or once"""
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        gateway = make_gateway()
+        gateway.chat.completions.create(model="stub", messages=MESSAGES, max_tokens=10)
+        timings.append(time.perf_counter() - start)
+    return 1000 * sum(timings) / len(timings)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 50
+    use_tls = "--plain" not in sys.argv
+
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile = keyfile = None
+        if use_tls:
+            certfile, keyfile = make_self_signed_cert(tmp)
+        server, base_url = start_stub_server(certfile=certfile, keyfile=keyfile)
+
+        def fresh_gateway():
+            # One client per call, as when every engine and session built its own
+            return LLMGateway("stub-key", base_url=base_url, verify=False, max_keepalive_connections=0)
+
+        shared = LLMGateway("stub-key", base_url=base_url, verify=False)
+        shared.chat.completions.create(model="stub", messages=MESSAGES, max_tokens=10)  # open the connection
+
+        print("=" * 60)
+        print(f"LLM GATEWAY BENCHMARK - {calls} calls against {base_url}")
+        print("=" * 60)
+        fresh_ms = time_calls(fresh_gateway, calls)
+        pooled_ms = time_calls(lambda: shared, calls)
+        print(f"Fresh client per call: {fresh_ms:8.2f} ms/call")
+        print(f"Pooled gateway:        {pooled_ms:8.2f} ms/call")
+        print(f"Saved per call:        {fresh_ms - pooled_ms:8.2f} ms")
+        print(f"Gateway stats: {shared.get_stats()}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
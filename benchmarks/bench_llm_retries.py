@@ -0,0 +1,70 @@
+"""
+Benchmark: grading latency and correctness with transient errors and slow tails
+Runs grade_homework against the local stub server, which fails a share of
+requests with 429/503 and makes a share of them slow. Compares single
+attempts (the old behaviour), retries only, and retries plus hedging.
+
+Usage: python benchmarks/bench_llm_retries.py [calls]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from assessment_grading import AssessmentGradingAssistant
+from llm_gateway import LLMGateway
+from retry_policy import RetryPolicy
+from stub_llm_server import start_stub_server
+
+ERROR_RATE = 0.05
+SLOW_RATE = 0.03
+LATENCY = 0.05
+SLOW_LATENCY = 1.0
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(label: str, retry_policy, calls: int):
+    server, base_url = start_stub_server(latency=LATENCY, error_rate=ERROR_RATE,
+                                         slow_rate=SLOW_RATE, slow_latency=SLOW_LATENCY)
+    gateway = LLMGateway("stub-key", base_url=base_url, retry_policy=retry_policy)
+    grader = AssessmentGradingAssistant("stub-key", "stub", client=gateway)
+
+    timings = []
+    failed = 0
+    for i in range(calls):
+        start = time.perf_counter()
+        result = grader.grade_homework(f"Answer {i}", "Correct answer", "Math")
+        timings.append(time.perf_counter() - start)
+        if "error" in result:
+            failed += 1
+
+    print(f"{label:22s} p50 {1000 * percentile(timings, 0.5):7.1f} ms  "
+          f"p95 {1000 * percentile(timings, 0.95):7.1f} ms  "
+          f"p99 {1000 * percentile(timings, 0.99):7.1f} ms  "
+          f"bad grades {failed:3d}/{calls}  requests {server.request_count}")
+    print(f"{'':22s} {retry_policy.get_stats()}")
+    server.shutdown()
+    gateway.close()
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("=" * 60)
+    print(f"LLM RETRY BENCHMARK - {calls} grading calls")
+    print(f"{ERROR_RATE:.0%} transient errors, {SLOW_RATE:.0%} slow requests "
+          f"({LATENCY * 1000:.0f} ms normal, {SLOW_LATENCY * 1000:.0f} ms slow)")
+    print("=" * 60)
+    run("Single attempt", RetryPolicy(max_attempts=1, hedge=False), calls)
+    run("Retries", RetryPolicy(base_delay=0.05, hedge=False), calls)
+    run("Retries + hedging", RetryPolicy(base_delay=0.05, hedge=True, hedge_min_delay=0.05), calls)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: LLM calls saved by the objective pre-grader
+Grades a quiz-style class set (multiple choice, numeric, one-word and
+open-ended questions) against the local stub server with grade_batch,
+once with objective grading off and once on, and reports LLM calls, wall
+time and how many answers each tier graded. The stub's canned reply is
+not a real grade, so only counts and timings are meaningful.
+
+Usage: python benchmarks/bench_objective_grading.py [students] [latency_seconds]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from assessment_grading import AssessmentGradingAssistant
+from bench_async_engines import start_stub_process
+from llm_gateway import LLMGateway
+from objective_grader import ObjectiveGrader
+
+# (correct answer, typical student answers); the last question is open-ended
+QUESTIONS = [
+    ("B", ["B", "b) Mitochondria", "C", "Option B", "D"]),
+    ("1. A 2. C 3. B 4. D", ["1. A 2. C 3. B 4. D", "1-A, 2-B, 3-B, 4-D", "1) a 2) c 3) d 4) d"]),
+    ("x = 4", ["x = 4", "x=4", "4", "x = 5", "2x = 8 so x = 4"]),
+    ("28.3 cm^2", ["28.3 cm^2", "28.27 cm2", "28 cm^2", "9 pi cm^2"]),
+    ("Photosynthesis", ["photosynthesis", "Photosynthesys", "Respiration", "making food from light"]),
+    ("Plants make glucose from light, water and carbon dioxide, releasing oxygen.",
+     ["Plants use sunlight to make food.", "They breathe in oxygen.", "Glucose and oxygen are made from CO2 and water using light."]),
+]
+
+
+def submissions(students: int):
+    rng = random.Random(0)
+    for key, answers in QUESTIONS:
+        yield key, [rng.choice(answers) for _ in range(students)]
+
+
+def run(label: str, grader: AssessmentGradingAssistant, students: int):
+    calls_before = grader.client.get_stats()["calls"]
+    start = time.perf_counter()
+    tiers = {}
+    for key, answers in submissions(students):
+        for result in grader.grade_batch(answers, key, "Mathematics", 10, max_workers=16):
+            tier = result.get("grading_tier", "error")
+            tiers[tier] = tiers.get(tier, 0) + 1
+    elapsed = time.perf_counter() - start
+    calls = grader.client.get_stats()["calls"] - calls_before
+    print(f"{label:22s} {calls:9d} {elapsed:8.2f}s   {tiers}")
+
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    process, base_url = start_stub_process(latency)
+    try:
+        print("=" * 78)
+        print(f"OBJECTIVE GRADING BENCHMARK - {len(QUESTIONS)} questions x {students} students, "
+              f"{latency}s per LLM call")
+        print("=" * 78)
+        print(f"{'Mode':22s} {'LLM calls':>9s} {'wall':>9s}   answers per tier")
+
+        gateway = LLMGateway("stub-key", base_url=base_url)
+        llm_only = AssessmentGradingAssistant("stub-key", "stub", client=gateway, objective_grading=False)
+        run("LLM only", llm_only, students)
+
+        objective = ObjectiveGrader()
+        tiered = AssessmentGradingAssistant("stub-key", "stub", client=gateway, objective_grader=objective)
+        run("objective + LLM", tiered, students)
+
+        stats = objective.get_stats()
+        print(f"\nGraded locally: {stats['local']} of {stats['local'] + stats['escalated']} "
+              f"({stats['local_rate']:.0%}), {stats['avg_local_us']} µs per answer on average")
+    finally:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
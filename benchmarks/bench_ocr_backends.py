@@ -0,0 +1,88 @@
+"""
+Benchmark: OCR throughput of the remote and local backends
+Reads a stack of synthetic scanned worksheets (pre-processed as the grading
+assistant would) with each available OCR backend and reports images per
+second one at a time and as one extract_batch call.
+
+- Gemini Vision when GEMINI_API_KEY is set; otherwise a stand-in with
+  REMOTE_LATENCY seconds per request, so the remote column still shows
+  what per-image API latency costs a batch.
+- easyocr and Tesseract when installed, in a worker pool of 1 process and
+  of one per CPU. Model load time is measured separately by warm_up().
+
+Usage: python benchmarks/bench_ocr_backends.py [images]
+"""
+
+import importlib.util
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_image_preprocessing import make_fixture
+from image_preprocessing import ImagePreprocessor
+from ocr_backends import GeminiOCRBackend, LocalOCRBackend
+
+REMOTE_LATENCY = 2.0
+
+
+class StandInVisionModel:
+    """Sleeps like a Gemini Vision request"""
+
+    def generate_content(self, parts):
+        time.sleep(REMOTE_LATENCY)
+        return type("Response", (), {"text": "Q1. Solve 2x + 6 = 14."})()
+
+
+def measure(backend, images):
+    """(images/s one at a time, images/s as one batch, sample text)"""
+    start = time.perf_counter()
+    texts = [backend.extract_text(image) for image in images]
+    single = len(images) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    backend.extract_batch(images)
+    batch = len(images) / (time.perf_counter() - start)
+    return single, batch, texts[0]
+
+
+def report(label, backend, images, load_seconds=None):
+    single, batch, text = measure(backend, images)
+    load = f"{load_seconds:6.1f}" if load_seconds is not None else f"{'-':>6s}"
+    print(f"{label:26s} {load} {single:10.2f} {batch:10.2f}   {text.splitlines()[0][:24] if text else ''!r}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    preprocessor = ImagePreprocessor()
+    images = [preprocessor.process(make_fixture(seed)[0]) for seed in range(count)]
+
+    print("=" * 78)
+    print(f"OCR BACKEND BENCHMARK - {count} pre-processed worksheets, {os.cpu_count()} CPUs")
+    print("=" * 78)
+    print(f"{'Backend':26s} {'load s':>6s} {'single/s':>10s} {'batch/s':>10s}   first text")
+
+    remote = GeminiOCRBackend()
+    label = "gemini"
+    if not remote.api_key:
+        remote._vision_model = StandInVisionModel()
+        label = f"remote stand-in {REMOTE_LATENCY:.0f}s"
+    report(label, remote, images)
+
+    engines = [(engine, module) for engine, module in (("easyocr", "easyocr"), ("tesseract", "pytesseract"))
+               if importlib.util.find_spec(module)]
+    for engine, _ in engines:
+        for workers in sorted({1, os.cpu_count() or 1}):
+            backend = LocalOCRBackend(engine, workers=workers)
+            try:
+                load_seconds = backend.warm_up()
+                report(f"{engine} x{workers}", backend, images, load_seconds)
+            finally:
+                backend.close()
+    if not engines:
+        print("Local backends skipped: install easyocr or pytesseract (plus the tesseract binary)")
+
+
+if __name__ == "__main__":
+    main()
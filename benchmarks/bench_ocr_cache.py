@@ -0,0 +1,102 @@
+"""
+Benchmark: OCR calls saved by the OCR cache
+Grades a class set of synthetic homework photos through
+AssessmentGradingAssistant with a stand-in vision model (OCR_LATENCY
+seconds per call, echoing which photo it was shown) and replays the
+traffic a teacher generates: every photo graded, then re-graded after a
+rubric change, resubmitted as the same file, and forwarded as a
+re-compressed copy. Runs once with the default exact-digest cache and once
+with near-duplicate matching turned on. Distinct pages must never hit, so
+a false hit (text from another photo) is counted separately.
+
+Usage: python benchmarks/bench_ocr_cache.py [photos]
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+
+from assessment_grading import AssessmentGradingAssistant
+from bench_image_preprocessing import make_fixture
+from ocr_cache import OCRCache
+
+OCR_LATENCY = 1.5
+
+
+class FakeVisionModel:
+    """Sleeps like a vision call and returns the id of the photo it saw"""
+
+    def __init__(self, ids_by_size):
+        self.ids_by_size = ids_by_size
+        self.calls = 0
+
+    def generate_content(self, parts):
+        self.calls += 1
+        time.sleep(OCR_LATENCY)
+        return type("Response", (), {"text": f"answer sheet {self.ids_by_size.get(len(parts[1]['data']), '?')}"})()
+
+
+def recompress(data: bytes, quality: int = 60) -> bytes:
+    """What a messaging app does to a forwarded photo"""
+    buffer = io.BytesIO()
+    Image.open(io.BytesIO(data)).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def run(photos, near_duplicates: bool):
+    grader = AssessmentGradingAssistant("unused", "unused",
+                                        ocr_cache=OCRCache(data_dir=tempfile.mkdtemp(), near_duplicates=near_duplicates))
+    # Map each photo's pre-processed size to its id so the stand-in model
+    # can say which photo it was sent
+    sizes = {}
+    for i, data in enumerate(photos):
+        for variant in (data, recompress(data)):
+            sizes[len(grader.preprocessor.process(variant))] = i
+    vision = FakeVisionModel(sizes)
+    grader.ocr_backend._vision_model = vision
+
+    rounds = [
+        ("first grading", lambda data: data),
+        ("rubric change", lambda data: data),
+        ("same file again", lambda data: data),
+        ("re-compressed", recompress),
+    ]
+
+    print(f"\n{'near_duplicates=' + str(near_duplicates):22s} {'OCR calls':>10s} {'cached':>7s} {'wrong':>6s} {'seconds':>8s}")
+    for label, transform in rounds:
+        calls_before = vision.calls
+        cached = wrong = 0
+        start = time.perf_counter()
+        for i, data in enumerate(photos):
+            text, from_cache = grader._extract_text(transform(data))
+            cached += from_cache
+            wrong += text != f"answer sheet {i}" and not text.endswith("?")
+        elapsed = time.perf_counter() - start
+        print(f"{label:22s} {vision.calls - calls_before:10d} {cached:7d} {wrong:6d} {elapsed:8.1f}")
+
+    stats = grader.ocr_cache.get_stats()
+    print(f"Hit rate {stats['hit_rate']:.0%} ({stats['exact_hits']} exact, {stats['near_hits']} near), "
+          f"OCR time saved {stats['saved_seconds']}s")
+    print(f"Vision calls: {vision.calls} with the cache vs {len(photos) * len(rounds)} without")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    photos = [make_fixture(seed)[0] for seed in range(count)]
+
+    print("=" * 70)
+    print(f"OCR CACHE BENCHMARK - {count} photos, {OCR_LATENCY}s per OCR call")
+    print("=" * 70)
+    run(photos, near_duplicates=False)
+    run(photos, near_duplicates=True)
+
+
+if __name__ == "__main__":
+    main()
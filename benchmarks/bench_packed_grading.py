@@ -0,0 +1,98 @@
+"""
+Benchmark: calls and tokens per student with packed batch grading
+Grades a class of open-ended answers against the local stub server with
+grade_batch (one request per student) and grade_batch_packed at a few pack
+sizes, and reports LLM calls, prompt/completion tokens per student (as
+counted by the stub, ~4 characters per token) and wall time. The stub
+leaves out one student from a fraction DROP_RATE of packed replies, so the
+rejection of incomplete replies and individual re-grading are exercised too.
+
+Usage: python benchmarks/bench_packed_grading.py [students] [latency_seconds]
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from assessment_grading import AssessmentGradingAssistant
+from llm_gateway import LLMGateway
+from stub_llm_server import DEFAULT_REPLY, start_stub_server
+
+DROP_RATE = 0.2
+CORRECT_ANSWER = (
+    "Photosynthesis is the process by which green plants use light energy, absorbed by chlorophyll "
+    "in the chloroplasts, to convert carbon dioxide and water into glucose and oxygen. The light-dependent "
+    "reactions split water and produce ATP and NADPH; the Calvin cycle uses them to fix carbon dioxide "
+    "into sugars. Oxygen is released as a by-product. 6CO2 + 6H2O -> C6H12O6 + 6O2."
+)
+ANSWERS = [
+    "Plants use sunlight to turn carbon dioxide and water into glucose. Oxygen comes out as waste.",
+    "Photosynthesis happens in chloroplasts. Chlorophyll absorbs light and the plant makes sugar and oxygen.",
+    "It is when plants breathe in oxygen and breathe out carbon dioxide at night.",
+    "Light reactions make ATP and NADPH, then the Calvin cycle fixes CO2 into glucose. O2 is released.",
+    "Plants make food from the soil using their roots and sunlight.",
+]
+
+
+def make_reply(rng: random.Random):
+    def reply(body):
+        prompt = body["messages"][-1]["content"]
+        students = re.findall(r"^\[(S\d+)\]$", prompt, re.MULTILINE)
+        if not students:
+            return DEFAULT_REPLY
+        if rng.random() < DROP_RATE:
+            students = students[:-1]
+        single = json.loads(DEFAULT_REPLY)
+        return json.dumps({"results": [dict(single, student=student) for student in students]})
+    return reply
+
+
+def run(label: str, grade, gateway: LLMGateway, students: int):
+    before = gateway.get_stats()
+    start = time.perf_counter()
+    results = grade()
+    elapsed = time.perf_counter() - start
+    after = gateway.get_stats()
+    assert len(results) == students and all(result is not None for result in results)
+
+    calls = after["calls"] - before["calls"]
+    prompt = (after["prompt_tokens"] - before["prompt_tokens"]) / students
+    completion = (after["completion_tokens"] - before["completion_tokens"]) / students
+    print(f"{label:20s} {calls:6d} {prompt:10.0f} {completion:11.0f} {prompt + completion:10.0f} {elapsed:8.2f}s")
+    return prompt + completion
+
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    server, base_url = start_stub_server(latency=latency, reply_text=make_reply(random.Random(1)))
+    gateway = LLMGateway("stub-key", base_url=base_url)
+    # No response cache and no objective tier: every answer needs the LLM
+    grader = AssessmentGradingAssistant("stub-key", "stub", client=gateway, objective_grading=False)
+    answers = [ANSWERS[i % len(ANSWERS)] + f" (student {i + 1})" for i in range(students)]
+
+    print("=" * 72)
+    print(f"PACKED GRADING BENCHMARK - {students} students, {latency}s per LLM call")
+    print("=" * 72)
+    print(f"{'Mode':20s} {'calls':>6s} {'prompt/st':>10s} {'complete/st':>11s} {'total/st':>10s} {'wall':>9s}")
+
+    baseline = run("one per student", lambda: grader.grade_batch(answers, CORRECT_ANSWER, "Biology", 10),
+                   gateway, students)
+    for pack_size in (4, 8, 16):
+        stats_before = grader.get_batch_stats()
+        total = run(f"packed x{pack_size}",
+                    lambda: grader.grade_batch_packed(answers, CORRECT_ANSWER, "Biology", 10, pack_size=pack_size),
+                    gateway, students)
+        retried = grader.get_batch_stats()["retried_individually"] - stats_before["retried_individually"]
+        print(f"{'':20s} {1 - total / baseline:.0%} fewer tokens per student, {retried} re-graded individually")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
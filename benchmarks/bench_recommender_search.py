@@ -0,0 +1,69 @@
+"""
+Micro-benchmark: per-query latency of find_similar_resources scoring
+Compares the original path (norm of the whole matrix + full argsort on every
+query) with the fast path (unit vectors stored at insert time, one
+matrix-vector product + argpartition top-k) from 1k to 1M resources.
+
+Usage: python benchmarks/bench_recommender_search.py [size ...]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_store import normalize_rows
+from vector_index import ExactIndex
+
+DIM = 384  # all-MiniLM-L6-v2
+TOP_K = 5
+
+
+def original_search(embeddings: np.ndarray, query: np.ndarray, top_k: int):
+    """The scoring code find_similar_resources used before the fast path"""
+    similarities = np.dot(embeddings, query) / (
+        np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query)
+    )
+    top_indices = np.argsort(similarities)[-top_k:][::-1]
+    return top_indices, similarities[top_indices]
+
+
+def time_per_query(search, queries) -> float:
+    """Median milliseconds per query"""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        timings.append(time.perf_counter() - start)
+    return 1000 * float(np.median(timings))
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 1000000]
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((20, DIM), dtype=np.float32)
+
+    print("=" * 60)
+    print(f"RECOMMENDER SEARCH BENCHMARK - dim={DIM}, top_k={TOP_K}")
+    print("=" * 60)
+    print(f"{'resources':>10} {'original ms':>12} {'fast ms':>10} {'speedup':>9}")
+
+    for size in sizes:
+        embeddings = rng.standard_normal((size, DIM), dtype=np.float32)
+        original_ms = time_per_query(lambda q: original_search(embeddings, q, TOP_K), queries)
+
+        # Normalise once, as add_learning_resources does at insert time
+        embeddings = normalize_rows(embeddings)
+        index = ExactIndex(normalized=True)
+        index.sync(embeddings)
+        fast_ms = time_per_query(lambda q: index.search(q, TOP_K), queries)
+
+        print(f"{size:>10} {original_ms:>12.3f} {fast_ms:>10.3f} {original_ms / fast_ms:>8.1f}x")
+        del embeddings, index
+
+
+if __name__ == "__main__":
+    main()
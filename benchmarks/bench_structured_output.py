@@ -0,0 +1,85 @@
+"""
+Benchmark: parse success rate and parse time for structured LLM responses
+Compares the old find('{') / rfind('}') + json.loads extraction with
+structured_output.parse_structured on a corpus of realistic replies: clean
+JSON, prose around it, code fences, braces in prose and strings, trailing
+commas, Python literals, smart quotes and replies cut off at max_tokens.
+
+Usage: python benchmarks/bench_structured_output.py [repeats]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from structured_output import StructuredOutputError, get_parse_stats, parse_structured
+
+GRADING = {
+    "score": 7,
+    "percentage": 70.0,
+    "feedback": "Good use of the formula {a + b}; check the units.",
+    "strengths": ["Clear working"],
+    "improvements": ["Units"],
+    "mistakes": ["Forgot m/s"]
+}
+GRADING_TEXT = json.dumps(GRADING, indent=2)
+
+CORPUS = [
+    ("clean", GRADING_TEXT),
+    ("prose around", "Here is my evaluation:\n" + GRADING_TEXT + "\nLet me know if you need more."),
+    ("code fence", "```json\n" + GRADING_TEXT + "\n```"),
+    ("brace in prose", "Using the rubric {strict} I graded it:\n" + GRADING_TEXT),
+    ("two objects", GRADING_TEXT + "\nAlternative grading: {\"score\": 6}"),
+    ("trailing comma", GRADING_TEXT.replace('"Forgot m/s"\n  ]', '"Forgot m/s",\n  ],')),
+    ("python literals", GRADING_TEXT.replace('"mistakes": [\n    "Forgot m/s"\n  ]', '"mistakes": None')),
+    ("smart quotes", GRADING_TEXT.replace('"score"', "“score”")),
+    ("truncated", GRADING_TEXT[:GRADING_TEXT.index('"improvements"') + 30]),
+    ("score as text", GRADING_TEXT.replace('"score": 7', '"score": "7/10"')),
+]
+
+
+def legacy_parse(text: str):
+    start_idx = text.find('{')
+    end_idx = text.rfind('}') + 1
+    if start_idx != -1 and end_idx != 0:
+        return json.loads(text[start_idx:end_idx])
+    raise ValueError("No JSON found")
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("=" * 60)
+    print(f"STRUCTURED OUTPUT BENCHMARK - {len(CORPUS)} reply shapes x {repeats}")
+    print("=" * 60)
+    print(f"{'Reply shape':18s} {'legacy':>8s} {'new':>8s} {'new ms':>8s}")
+
+    legacy_ok = new_ok = 0
+    for label, text in CORPUS:
+        try:
+            legacy_parse(text)
+            legacy = "ok"
+            legacy_ok += 1
+        except ValueError:
+            legacy = "FAIL"
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            try:
+                parse_structured(text, "grading")
+                new = "ok"
+            except StructuredOutputError:
+                new = "FAIL"
+        elapsed_ms = 1000 * (time.perf_counter() - start) / repeats
+        new_ok += new == "ok"
+        print(f"{label:18s} {legacy:>8s} {new:>8s} {elapsed_ms:8.3f}")
+
+    print(f"\nLegacy success rate: {legacy_ok / len(CORPUS):.0%}")
+    print(f"New success rate:    {new_ok / len(CORPUS):.0%}")
+    print(f"Parse stats: {get_parse_stats()['grading']}")
+
+
+if __name__ == "__main__":
+    main()
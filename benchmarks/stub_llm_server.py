@@ -0,0 +1,166 @@
+"""
+Local stub of the Groq chat completions endpoint for benchmarks
+Answers POST /openai/v1/chat/completions with a canned completion (or an SSE
+stream when "stream": true), with optional artificial latency and TLS.
+Can also inject transient 429/503 errors and slow tail requests.
+
+Usage: python benchmarks/stub_llm_server.py [port] [latency_seconds]
+"""
+
+import json
+import random
+import ssl
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = json.dumps({
+    "score": 7,
+    "percentage": 70.0,
+    "feedback": "Stub feedback.",
+    "strengths": ["Clear structure"],
+    "improvements": ["Add detail"],
+    "mistakes": []
+})
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    # Room for bursts of hundreds of concurrent connects from async clients
+    request_queue_size = 1024
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self.server.request_count += 1
+        if self.server.random.random() < self.server.slow_rate:
+            time.sleep(self.server.slow_latency)
+        else:
+            time.sleep(self.server.latency)
+
+        if self.server.random.random() < self.server.error_rate:
+            self._send_error_status(self.server.random.choice([429, 503]))
+            return
+
+        reply = self.server.reply_text
+        if callable(reply):
+            reply = reply(body)
+
+        if body.get("stream"):
+            self._send_stream(body, reply)
+        else:
+            prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+            completion_tokens = len(reply) // 4
+            self._send_json({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            })
+
+    def _send_json(self, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error_status(self, status: int):
+        data = json.dumps({"error": {"message": "Injected stub error", "type": "stub_error"}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "0.05")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, body, reply):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk_size = 8
+        for start in range(0, len(reply), chunk_size):
+            event = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": reply[start:start + chunk_size]}, "finish_reason": None}]
+            }
+            self._write_chunk(f"data: {json.dumps(event)}\n\n")
+            time.sleep(self.server.stream_delay)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port: int = 0, latency: float = 0.0, reply_text=DEFAULT_REPLY,
+                      stream_delay: float = 0.0, certfile: str = None, keyfile: str = None,
+                      error_rate: float = 0.0, slow_rate: float = 0.0, slow_latency: float = 0.0,
+                      seed: int = 0):
+    """Start the stub on a daemon thread and return (server, base_url)
+
+    reply_text may be a string or a callable taking the request body. With
+    certfile/keyfile the server speaks HTTPS, so TLS handshakes are included.
+    A fraction error_rate of requests fail with 429 or 503, and a fraction
+    slow_rate take slow_latency instead of latency.
+    """
+    server = StubLLMServer(("127.0.0.1", port), StubLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.reply_text = reply_text
+    server.stream_delay = stream_delay
+    server.request_count = 0
+    server.error_rate = error_rate
+    server.slow_rate = slow_rate
+    server.slow_latency = slow_latency
+    server.random = random.Random(seed)
+    # Hedged requests that lose the race may find their connection closed
+    server.handle_error = lambda request, client_address: None
+
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    server, url = start_stub_server(port, latency)
+    print(f"Stub LLM server listening on {url} (set GROQ_BASE_URL={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -3,29 +3,159 @@ Feature 2: Personalized Content Recommender & Q/A Agent
 Simple RAG with vector embeddings + Groq LLM
 """
 
+import asyncio
 import os
-from groq import Groq
-from sentence_transformers import SentenceTransformer
+from llm_gateway import LLMGateway, get_gateway
 import numpy as np
-from typing import List, Dict, Tuple
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
 import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from response_cache import ResponseCache
+from embedding_store import EmbeddingBuffer, content_hash, normalize_rows, save_embeddings, load_embeddings
+from vector_index import MetadataIndex, VectorIndex, create_index
+from model_registry import DEFAULT_EMBEDDING_MODEL, get_embedding_model
+from structured_output import (JSONStreamScanner, StructuredOutputError, astructured_chat_completion,
+                               parse_structured, structured_chat_completion)
+
+EMBEDDING_MODEL_NAME = DEFAULT_EMBEDDING_MODEL
+ANSWER_SYSTEM_PROMPT = "You are a helpful teacher who explains concepts clearly and simply."
+WORKSHEET_SYSTEM_PROMPT = "You are an expert educator creating engaging practice materials."
 
 class ContentRecommender:
-    def __init__(self, api_key: str, model: str):
-        """Initialize content recommender with RAG capabilities"""
-        self.client = Groq(api_key=api_key)
+    def __init__(self, api_key: str, model: str, cache: Optional[ResponseCache] = None,
+                 index_dir: Optional[str] = None, index_backend: str = "exact",
+                 index_options: Optional[Dict] = None, normalize_embeddings: bool = True,
+                 query_cache_size: int = 512, client: Optional[LLMGateway] = None,
+                 index_save_delay: float = 2.0):
+        """Initialize content recommender with RAG capabilities
+        
+        cache is used for worksheet generation; pass a shared ResponseCache
+        to reuse results across engines. When index_dir is set, the embedding
+        index is saved there index_save_delay seconds after a change, so a
+        run of add_learning_resources calls rewrites the files once rather
+        than once per call (0 saves on every change). It can be reloaded
+        with load_index() instead of re-encoding the knowledge base.
+        
+        index_backend selects how find_similar_resources searches: "exact"
+        scores every resource, "ivf" scans only the nearest clusters
+        (see vector_index.IVFIndex for the index_options knobs). With
+        normalize_embeddings (the fast path) vectors are stored unit-length at
+        insert time, so a query is one matrix-vector product plus an
+        argpartition top-k. Up to query_cache_size query embeddings are kept
+        in an LRU cache, which is cleared whenever the embedding model changes.
+        LLM calls go through client, which defaults to the process-wide
+        pooled LLMGateway.
+        
+        One instance can be shared by many threads (e.g. Streamlit sessions):
+        adding resources and searching are guarded by an internal lock.
+        """
+        self.client = client or get_gateway(api_key)
         self.model = model
+        self.cache = cache
+        self.index_dir = index_dir
+        self.embedding_model_name = EMBEDDING_MODEL_NAME
         self.embedding_model = None
         self.knowledge_base = []
-        self.embeddings = None
+        self._resource_hashes = set()
+        self.normalize_embeddings = normalize_embeddings
+        self._embedding_buffer = EmbeddingBuffer()
+        self.vector_index: VectorIndex = create_index(
+            index_backend, normalized=normalize_embeddings, **(index_options or {})
+        )
+        self.metadata_index = MetadataIndex()
+        self._index_lock = threading.RLock()
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()
+        self._query_cache_model = None
+        self._query_cache_hits = 0
+        self._query_cache_misses = 0
+        self._query_cache_lock = threading.Lock()
+        self.index_save_delay = index_save_delay
+        self._save_timer: Optional[threading.Timer] = None
+        self._save_lock = threading.Lock()
+    
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        """Embeddings of the knowledge base, one row per resource"""
+        return self._embedding_buffer.vectors
+    
+    @embeddings.setter
+    def embeddings(self, value: Optional[np.ndarray]):
+        self._embedding_buffer = EmbeddingBuffer.from_array(value)
+        self.vector_index.reset()
         
     def initialize_embeddings(self):
-        """Initialize sentence transformer for embeddings"""
+        """Initialize sentence transformer for embeddings
+        
+        The model comes from the process-wide registry, so every recommender
+        in the process shares one loaded copy.
+        """
         if self.embedding_model is None:
-            print("Loading embedding model...")
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.embedding_model = get_embedding_model(self.embedding_model_name)
         return self.embedding_model
     
+    def save_index(self, index_dir: Optional[str] = None) -> bool:
+        """Persist embeddings (float32 .npy) and resource metadata (JSON)
+        
+        Also writes out any change still waiting for a delayed save.
+        """
+        index_dir = index_dir or self.index_dir
+        with self._index_lock:
+            if self._save_timer is not None and index_dir == self.index_dir:
+                self._save_timer.cancel()
+                self._save_timer = None
+            # Rows already in the buffer never change, so the view can be
+            # written after the lock is released
+            embeddings, resources = self.embeddings, list(self.knowledge_base)
+        if not index_dir or embeddings is None:
+            return False
+        with self._save_lock:
+            save_embeddings(index_dir, embeddings, resources,
+                            self.embedding_model_name, normalized=self.normalize_embeddings)
+        return True
+    
+    def _schedule_save(self):
+        """Save the index after index_save_delay, once for all changes until then"""
+        if not self.index_dir:
+            return
+        if self.index_save_delay <= 0:
+            self.save_index()
+            return
+        with self._index_lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.index_save_delay, self._delayed_save)
+                # Not a daemon, so a pending save still happens at interpreter exit
+                self._save_timer.daemon = False
+                self._save_timer.start()
+    
+    def _delayed_save(self):
+        with self._index_lock:
+            self._save_timer = None
+        self.save_index()
+    
+    def load_index(self, index_dir: Optional[str] = None, mmap: bool = True) -> bool:
+        """Load a saved index, memory-mapping the embeddings matrix
+        
+        Returns False if no index built with the current embedding model
+        exists, in which case the knowledge base is left untouched.
+        """
+        index_dir = index_dir or self.index_dir
+        if not index_dir:
+            return False
+        loaded = load_embeddings(index_dir, self.embedding_model_name, mmap=mmap,
+                                 normalized=self.normalize_embeddings)
+        if loaded is None:
+            return False
+        with self._index_lock:
+            self.embeddings, self.knowledge_base = loaded
+            self._resource_hashes = {content_hash(r) for r in self.knowledge_base}
+            self.metadata_index.reset()
+            self.metadata_index.add(self.knowledge_base)
+        print(f"Loaded {len(self.knowledge_base)} resources from {index_dir}")
+        return True
+    
     def add_learning_resources(self, resources: List[Dict]):
         """Add learning resources to knowledge base
         
@@ -35,58 +165,156 @@ class ContentRecommender:
         - resource_type: str (video, article, worksheet, etc.)
         - difficulty: str (beginner, intermediate, advanced)
         - teaching_method: str (visual, interactive, discussion, etc.)
-        """
-        self.knowledge_base.extend(resources)
         
-        # Generate embeddings for all resources
-        model = self.initialize_embeddings()
-        texts = [f"{r['topic']} {r['content']}" for r in self.knowledge_base]
-        self.embeddings = model.encode(texts)
+        Only resources not already in the knowledge base are encoded; their
+        vectors are appended to the existing matrix. Identical resources
+        (by content hash) are skipped.
+        """
+        with self._index_lock:
+            new_resources = []
+            new_hashes = set()
+            for resource in resources:
+                resource_hash = content_hash(resource)
+                if resource_hash in self._resource_hashes or resource_hash in new_hashes:
+                    continue
+                new_hashes.add(resource_hash)
+                new_resources.append(resource)
+            
+            skipped = len(resources) - len(new_resources)
+            if new_resources:
+                # Generate embeddings for the new resources only
+                model = self.initialize_embeddings()
+                texts = [f"{r['topic']} {r['content']}" for r in new_resources]
+                vectors = model.encode(texts)
+                if self.normalize_embeddings:
+                    vectors = normalize_rows(vectors)
+                self._embedding_buffer.append(vectors)
+                self.knowledge_base.extend(new_resources)
+                self.metadata_index.add(new_resources)
+                self._resource_hashes.update(new_hashes)
+                self._schedule_save()
         
-        print(f"Added {len(resources)} resources. Total: {len(self.knowledge_base)}")
+        print(f"Added {len(new_resources)} resources ({skipped} duplicates skipped). Total: {len(self.knowledge_base)}")
     
-    def find_similar_resources(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Find most relevant resources using semantic similarity"""
+    def find_similar_resources(self, query: str, top_k: int = 5,
+                               filters: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """Find most relevant resources using semantic similarity
+        
+        filters restricts the search to resources whose difficulty,
+        resource_type or teaching_method match, before any scoring happens,
+        e.g. {"teaching_method": "visual", "difficulty": "beginner"}.
+        """
         if not self.knowledge_base:
             return []
         
+        query_embedding = self._encode_queries([query])[0]
+        
+        with self._index_lock:
+            candidates = self.metadata_index.rows(filters)
+            if candidates is not None and len(candidates) == 0:
+                return []
+            
+            # Index any newly added embeddings, then search by cosine similarity
+            self.vector_index.sync(self.embeddings)
+            top_indices, similarities = self.vector_index.search(query_embedding, top_k, candidates)
+            
+            return self._build_results(top_indices, similarities)
+    
+    def find_similar_resources_batch(self, queries: List[str], top_k: int = 5,
+                                     filters: Optional[Dict[str, str]] = None) -> List[List[Dict]]:
+        """Find relevant resources for many queries at once
+        
+        All queries are encoded in a single forward pass and scored with one
+        matrix-matrix product, e.g. when recommending for a whole class.
+        Returns one result list per query, in input order. filters works as
+        in find_similar_resources and applies to every query.
+        """
+        if not queries:
+            return []
+        if not self.knowledge_base:
+            return [[] for _ in queries]
+        
+        query_embeddings = self._encode_queries(list(queries))
+        
+        with self._index_lock:
+            candidates = self.metadata_index.rows(filters)
+            if candidates is not None and len(candidates) == 0:
+                return [[] for _ in queries]
+            
+            self.vector_index.sync(self.embeddings)
+            return [
+                self._build_results(top_indices, similarities)
+                for top_indices, similarities in self.vector_index.search_batch(query_embeddings, top_k, candidates)
+            ]
+    
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Encode queries, reusing cached embeddings for repeated strings
+        
+        Cache misses are encoded together in a single forward pass.
+        """
         model = self.initialize_embeddings()
-        query_embedding = model.encode([query])[0]
+        model_key = (self.embedding_model_name, id(model))
         
-        # Calculate cosine similarity
-        similarities = np.dot(self.embeddings, query_embedding) / (
-            np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(query_embedding)
-        )
+        with self._query_cache_lock:
+            if self._query_cache_model != model_key:
+                self._query_cache.clear()
+                self._query_cache_model = model_key
+            
+            embeddings = {}
+            for query in queries:
+                if query in self._query_cache:
+                    self._query_cache.move_to_end(query)
+                    embeddings[query] = self._query_cache[query]
+                    self._query_cache_hits += 1
+                else:
+                    self._query_cache_misses += 1
         
-        # Get top K indices
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        missing = list(dict.fromkeys(q for q in queries if q not in embeddings))
+        if missing:
+            encoded = np.asarray(model.encode(missing), dtype=np.float32)
+            with self._query_cache_lock:
+                for query, embedding in zip(missing, encoded):
+                    embeddings[query] = embedding
+                    if self.query_cache_size > 0 and self._query_cache_model == model_key:
+                        self._query_cache[query] = embedding
+                        self._query_cache.move_to_end(query)
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
         
+        return np.stack([embeddings[q] for q in queries])
+    
+    def get_query_cache_stats(self) -> Dict:
+        """Hit/miss counters for the query embedding cache"""
+        with self._query_cache_lock:
+            lookups = self._query_cache_hits + self._query_cache_misses
+            return {
+                "size": len(self._query_cache),
+                "max_size": self.query_cache_size,
+                "hits": self._query_cache_hits,
+                "misses": self._query_cache_misses,
+                "hit_rate": round(self._query_cache_hits / lookups, 3) if lookups else 0.0
+            }
+    
+    def _build_results(self, top_indices, similarities) -> List[Dict]:
+        """Copy the matched resources and attach their similarity scores"""
         results = []
-        for idx in top_indices:
+        for idx, similarity in zip(top_indices, similarities):
             resource = self.knowledge_base[idx].copy()
-            resource['similarity_score'] = float(similarities[idx])
+            resource['similarity_score'] = float(similarity)
             results.append(resource)
         
         return results
     
-    def recommend_content(self, topic: str, student_level: str = "intermediate", 
-                         teaching_method: str = None, num_recommendations: int = 3) -> List[Dict]:
-        """Recommend personalized learning content"""
-        
-        # Build search query
+    def _recommendation_query(self, topic: str, student_level: str, teaching_method: str = None) -> str:
         query = f"{topic} {student_level}"
         if teaching_method:
             query += f" {teaching_method}"
+        return query
+    
+    def _recommendation_request(self, topic: str, student_level: str, filtered: List[Dict],
+                                num_recommendations: int) -> Dict:
+        """Chat completion arguments asking the LLM to explain the recommendations"""
         
-        # Find similar resources
-        similar_resources = self.find_similar_resources(query, top_k=10)
-        
-        # Filter by criteria
-        filtered = similar_resources
-        if teaching_method:
-            filtered = [r for r in filtered if teaching_method.lower() in r.get('teaching_method', '').lower()]
-        
-        # Use LLM to rank and explain recommendations
         resources_text = "\n".join([
             f"- {r['topic']} ({r['resource_type']}, {r['difficulty']}): {r['content'][:100]}..."
             for r in filtered[:num_recommendations]
@@ -99,31 +327,73 @@ class ContentRecommender:
 Explain why each resource is recommended and how it can help the student learn effectively.
 Format as JSON array with explanations."""
 
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": "You are an educational content curator helping personalize learning."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.6,
+            "max_tokens": 800,
+            "feature": "recommendations"
+        }
+    
+    def recommend_content(self, topic: str, student_level: str = "intermediate", 
+                         teaching_method: str = None, num_recommendations: int = 3) -> List[Dict]:
+        """Recommend personalized learning content"""
+        
+        # Find similar resources among those matching the teaching method
+        filtered = self.find_similar_resources(
+            self._recommendation_query(topic, student_level, teaching_method),
+            top_k=num_recommendations,
+            filters={"teaching_method": teaching_method}
+        )
+        
+        # Use LLM to rank and explain recommendations
         try:
             response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an educational content curator helping personalize learning."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.6,
-                max_tokens=800
+                **self._recommendation_request(topic, student_level, filtered, num_recommendations)
             )
-            
             explanation = response.choices[0].message.content
-            
         except Exception as e:
             explanation = f"Error getting recommendations: {str(e)}"
         
         # Return top recommendations with explanations
-        recommendations = filtered[:num_recommendations]
         return {
-            "recommendations": recommendations,
+            "recommendations": filtered[:num_recommendations],
             "explanation": explanation
         }
     
-    def answer_question(self, question: str, context_topic: str = None) -> Dict:
-        """Answer subject-related questions using RAG"""
+    async def afind_similar_resources(self, query: str, top_k: int = 5,
+                                      filters: Optional[Dict] = None) -> List[Dict]:
+        """Async counterpart of find_similar_resources (runs in a worker thread)"""
+        return await asyncio.to_thread(self.find_similar_resources, query, top_k, filters)
+    
+    async def arecommend_content(self, topic: str, student_level: str = "intermediate",
+                                 teaching_method: str = None, num_recommendations: int = 3) -> List[Dict]:
+        """Async counterpart of recommend_content"""
+        
+        filtered = await self.afind_similar_resources(
+            self._recommendation_query(topic, student_level, teaching_method),
+            top_k=num_recommendations,
+            filters={"teaching_method": teaching_method}
+        )
+        
+        try:
+            response = await self.client.chat.completions.acreate(
+                **self._recommendation_request(topic, student_level, filtered, num_recommendations)
+            )
+            explanation = response.choices[0].message.content
+        except Exception as e:
+            explanation = f"Error getting recommendations: {str(e)}"
+        
+        return {
+            "recommendations": filtered[:num_recommendations],
+            "explanation": explanation
+        }
+    
+    def _build_answer_prompt(self, question: str, context_topic: str = None) -> Tuple[str, List[Dict]]:
+        """Retrieve resources for a question and build the RAG prompt"""
         
         # Find relevant resources
         search_query = question
@@ -147,36 +417,90 @@ Relevant Learning Materials:
 
 Provide a clear, simple, and accurate answer. Use the learning materials as reference but explain in an easy-to-understand way suitable for students.
 """
-
+        return prompt, relevant_resources
+    
+    def _answer_request(self, prompt: str) -> Dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": ANSWER_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.4,
+            "max_tokens": 600,
+            "feature": "qa"
+        }
+    
+    @staticmethod
+    def _answer_result(answer, relevant_resources: List[Dict], key: str = "answer") -> Dict:
+        return {
+            key: answer,
+            "sources": [r['topic'] for r in relevant_resources],
+            "confidence": "high" if relevant_resources else "low"
+        }
+    
+    @staticmethod
+    def _answer_failure(error: Exception) -> Dict:
+        return {
+            "answer": f"Error answering question: {str(error)}",
+            "sources": [],
+            "confidence": "none"
+        }
+    
+    def answer_question(self, question: str, context_topic: str = None) -> Dict:
+        """Answer subject-related questions using RAG"""
+        
+        prompt, relevant_resources = self._build_answer_prompt(question, context_topic)
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful teacher who explains concepts clearly and simply."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.4,
-                max_tokens=600
-            )
-            
-            answer = response.choices[0].message.content
-            
-            return {
-                "answer": answer,
-                "sources": [r['topic'] for r in relevant_resources],
-                "confidence": "high" if relevant_resources else "low"
-            }
-            
+            response = self.client.chat.completions.create(**self._answer_request(prompt))
         except Exception as e:
-            return {
-                "answer": f"Error answering question: {str(e)}",
-                "sources": [],
-                "confidence": "none"
-            }
+            return self._answer_failure(e)
+        return self._answer_result(response.choices[0].message.content, relevant_resources)
     
-    def generate_practice_worksheet(self, topic: str, difficulty: str, 
-                                    num_questions: int = 5) -> Dict:
-        """Generate practice questions for a topic"""
+    async def aanswer_question(self, question: str, context_topic: str = None) -> Dict:
+        """Async counterpart of answer_question"""
+        
+        prompt, relevant_resources = await asyncio.to_thread(self._build_answer_prompt, question, context_topic)
+        try:
+            response = await self.client.chat.completions.acreate(**self._answer_request(prompt))
+        except Exception as e:
+            return self._answer_failure(e)
+        return self._answer_result(response.choices[0].message.content, relevant_resources)
+    
+    def answer_question_stream(self, question: str, context_topic: str = None) -> Dict:
+        """Streaming variant of answer_question
+        
+        Retrieval runs up front; "answer_stream" is a generator that yields
+        the answer text as it is generated (e.g. for st.write_stream).
+        """
+        
+        prompt, relevant_resources = self._build_answer_prompt(question, context_topic)
+        
+        def answer_stream():
+            try:
+                yield from self.client.stream_chat_completion(**self._answer_request(prompt))
+            except Exception as e:
+                yield f"\n\nError answering question: {str(e)}"
+        
+        return self._answer_result(answer_stream(), relevant_resources, key="answer_stream")
+    
+    async def aanswer_question_stream(self, question: str, context_topic: str = None) -> Dict:
+        """Async counterpart of answer_question_stream; "answer_stream" is an
+        async generator"""
+        
+        prompt, relevant_resources = await asyncio.to_thread(self._build_answer_prompt, question, context_topic)
+        
+        async def answer_stream():
+            try:
+                async for chunk in self.client.astream_chat_completion(**self._answer_request(prompt)):
+                    yield chunk
+            except Exception as e:
+                yield f"\n\nError answering question: {str(e)}"
+        
+        return self._answer_result(answer_stream(), relevant_resources, key="answer_stream")
+    
+    def _worksheet_request(self, topic: str, difficulty: str, num_questions: int) -> Dict:
+        """Arguments for (a)structured_chat_completion when writing a worksheet"""
         
         prompt = f"""Generate a practice worksheet for students.
 
@@ -202,41 +526,171 @@ Format as JSON:
     ]
 }}
 """
-
+        return {
+            "system_prompt": WORKSHEET_SYSTEM_PROMPT,
+            "user_prompt": prompt,
+            "schema": "worksheet",
+            "temperature": 0.7,
+            "max_tokens": 1500,
+            "feature": "worksheet"
+        }
+    
+    def _worksheet_stream_request(self, request: Dict) -> Dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": request["system_prompt"]},
+                {"role": "user", "content": request["user_prompt"]}
+            ],
+            "temperature": request["temperature"],
+            "max_tokens": request["max_tokens"],
+            "feature": request["feature"]
+        }
+    
+    @staticmethod
+    def _fallback_worksheet(result_text: str, topic: str) -> Dict:
+        return {
+            "title": f"{topic} Practice Worksheet",
+            "questions": [{"question": result_text, "type": "general", "answer": "", "explanation": ""}]
+        }
+    
+    @staticmethod
+    def _worksheet_failure(error: Exception, topic: str) -> Dict:
+        if isinstance(error, StructuredOutputError):
+            return ContentRecommender._fallback_worksheet(error.text, topic)
+        return {
+            "title": "Error",
+            "questions": [{"question": f"Error: {str(error)}", "type": "error", "answer": "", "explanation": ""}]
+        }
+    
+    def generate_practice_worksheet(self, topic: str, difficulty: str, 
+                                    num_questions: int = 5) -> Dict:
+        """Generate practice questions for a topic"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert educator creating engaging practice materials."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1500
-            )
-            
-            result_text = response.choices[0].message.content
-            
-            try:
-                start_idx = result_text.find('{')
-                end_idx = result_text.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = result_text[start_idx:end_idx]
-                    worksheet = json.loads(json_str)
-                else:
-                    raise ValueError("No JSON found")
-            except:
-                worksheet = {
-                    "title": f"{topic} Practice Worksheet",
-                    "questions": [{"question": result_text, "type": "general", "answer": "", "explanation": ""}]
-                }
-            
-            return worksheet
-            
+            return structured_chat_completion(self.client, self.cache, self.model,
+                                              **self._worksheet_request(topic, difficulty, num_questions))
         except Exception as e:
-            return {
-                "title": "Error",
-                "questions": [{"question": f"Error: {str(e)}", "type": "error", "answer": "", "explanation": ""}]
-            }
+            return self._worksheet_failure(e, topic)
+    
+    async def agenerate_practice_worksheet(self, topic: str, difficulty: str,
+                                           num_questions: int = 5) -> Dict:
+        """Async counterpart of generate_practice_worksheet"""
+        try:
+            return await astructured_chat_completion(self.client, self.cache, self.model,
+                                                     **self._worksheet_request(topic, difficulty, num_questions))
+        except Exception as e:
+            return self._worksheet_failure(e, topic)
+    
+    def _cached_worksheet(self, request: Dict, topic: str) -> Tuple[Optional[str], Optional[Dict]]:
+        """Return (cache key, cached worksheet or None) for a streaming request"""
+        if self.cache is None:
+            return None, None
+        key = ResponseCache.make_key(self.model, request["system_prompt"], request["user_prompt"],
+                                     request["temperature"], request["max_tokens"])
+        entry = self.cache.get(key)
+        if entry is None:
+            return key, None
+        try:
+            return key, parse_structured(entry["text"], "worksheet")
+        except StructuredOutputError:
+            return key, self._fallback_worksheet(entry["text"], topic)
+    
+    def _finish_worksheet_stream(self, text: str, streamed: List[Dict], topic: str,
+                                 key: Optional[str], latency: float) -> Dict:
+        try:
+            worksheet = parse_structured(text, "worksheet")
+        except StructuredOutputError:
+            # Keep whatever questions already streamed; no re-ask mid-render
+            if streamed:
+                return {"title": f"{topic} Practice Worksheet", "questions": list(streamed)}
+            return self._fallback_worksheet(text, topic)
+        if key is not None:
+            self.cache.set(key, text, latency=latency)
+        return worksheet
+    
+    @staticmethod
+    def _unstreamed_questions(worksheet: Dict, streamed: List[Dict]) -> List[Dict]:
+        """Questions of worksheet not already yielded while streaming
+        
+        The scanner skips items it cannot parse that the final parse may
+        repair, so streamed is not always the first questions of worksheet.
+        """
+        remaining = Counter(json.dumps(question, sort_keys=True, default=str) for question in streamed)
+        unstreamed = []
+        for question in worksheet.get("questions", []):
+            canonical = json.dumps(question, sort_keys=True, default=str)
+            if remaining[canonical]:
+                remaining[canonical] -= 1
+            else:
+                unstreamed.append(question)
+        return unstreamed
+    
+    @staticmethod
+    def _stream_error_events(error: Exception, streamed: List[Dict]) -> List[Tuple[str, Dict]]:
+        error_question = {"question": f"Error: {str(error)}", "type": "error", "answer": "", "explanation": ""}
+        return [("question", error_question),
+                ("worksheet", {"title": "Error", "questions": streamed + [error_question]})]
+    
+    def generate_practice_worksheet_stream(self, topic: str, difficulty: str,
+                                           num_questions: int = 5) -> Iterator[Tuple[str, Dict]]:
+        """Streaming variant of generate_practice_worksheet
+        
+        Yields ("question", question) as soon as each question object closes
+        in the streamed JSON, then ("worksheet", worksheet) with the full
+        result. The finished text is stored in the response cache under the
+        same key as generate_practice_worksheet, and a cache hit is replayed
+        without calling the model.
+        """
+        
+        request = self._worksheet_request(topic, difficulty, num_questions)
+        key, worksheet = self._cached_worksheet(request, topic)
+        
+        streamed = []
+        if worksheet is None:
+            scanner = JSONStreamScanner("questions")
+            start = time.perf_counter()
+            try:
+                for chunk in self.client.stream_chat_completion(**self._worksheet_stream_request(request)):
+                    for question in scanner.feed(chunk):
+                        streamed.append(question)
+                        yield "question", question
+            except Exception as e:
+                yield from self._stream_error_events(e, streamed)
+                return
+            worksheet = self._finish_worksheet_stream(scanner.text, streamed, topic, key,
+                                                      time.perf_counter() - start)
+        
+        # Cache hits, and questions the scanner could not pick out (e.g. malformed JSON), are sent at the end
+        for question in self._unstreamed_questions(worksheet, streamed):
+            yield "question", question
+        yield "worksheet", worksheet
+    
+    async def agenerate_practice_worksheet_stream(self, topic: str, difficulty: str,
+                                                  num_questions: int = 5) -> AsyncIterator[Tuple[str, Dict]]:
+        """Async counterpart of generate_practice_worksheet_stream"""
+        
+        request = self._worksheet_request(topic, difficulty, num_questions)
+        key, worksheet = self._cached_worksheet(request, topic)
+        
+        streamed = []
+        if worksheet is None:
+            scanner = JSONStreamScanner("questions")
+            start = time.perf_counter()
+            try:
+                async for chunk in self.client.astream_chat_completion(**self._worksheet_stream_request(request)):
+                    for question in scanner.feed(chunk):
+                        streamed.append(question)
+                        yield "question", question
+            except Exception as e:
+                for event in self._stream_error_events(e, streamed):
+                    yield event
+                return
+            worksheet = self._finish_worksheet_stream(scanner.text, streamed, topic, key,
+                                                      time.perf_counter() - start)
+        
+        for question in self._unstreamed_questions(worksheet, streamed):
+            yield "question", question
+        yield "worksheet", worksheet
 
 
 # Sample knowledge base for demo
@@ -0,0 +1,160 @@
+"""
+Embedding storage for the ContentRecommender
+An append-only, geometrically growing float32 buffer for incremental adds,
+plus on-disk persistence: embeddings are stored as a float32 .npy matrix next
+to a JSON sidecar with the resource metadata, so a warm start can memory-map
+the matrix instead of re-encoding the knowledge base.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "resources.json"
+
+
+def content_hash(resource: Dict) -> str:
+    """Stable hash of a resource, used to skip re-adding identical items"""
+    payload = json.dumps(resource, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingBuffer:
+    def __init__(self, initial_capacity: int = 64, growth_factor: float = 2.0):
+        """Append-only float32 matrix backed by a preallocated buffer
+        
+        Capacity grows geometrically, so appending N rows one batch at a time
+        costs amortised O(N) copies instead of rebuilding the matrix each time.
+        """
+        self.initial_capacity = max(1, initial_capacity)
+        self.growth_factor = max(1.1, growth_factor)
+        self._data = None
+        self._size = 0
+        self._owned = False
+
+    @classmethod
+    def from_array(cls, array: np.ndarray, **kwargs) -> "EmbeddingBuffer":
+        """Wrap an existing matrix (e.g. a memory-mapped one) without copying
+        
+        The array is only copied into a private, growable buffer on the first
+        append, so read-only workloads keep sharing the mapped pages.
+        """
+        buffer = cls(**kwargs)
+        if array is not None and len(array):
+            buffer._data = array
+            buffer._size = array.shape[0]
+        return buffer
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._data is None else self._data.shape[0]
+
+    @property
+    def vectors(self) -> Optional[np.ndarray]:
+        """View of the filled rows, or None when the buffer is empty"""
+        if self._data is None or self._size == 0:
+            return None
+        return self._data[:self._size]
+
+    def append(self, vectors: np.ndarray):
+        """Append rows, growing the buffer geometrically when it is full"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        count = vectors.shape[0]
+        if count == 0:
+            return
+
+        needed = self._size + count
+        if self._data is None or not self._owned or needed > self.capacity:
+            new_capacity = max(self.capacity, self.initial_capacity)
+            while new_capacity < needed:
+                new_capacity = int(new_capacity * self.growth_factor) + 1
+            data = np.empty((new_capacity, vectors.shape[1]), dtype=np.float32)
+            if self._size:
+                data[:self._size] = self._data[:self._size]
+            self._data = data
+            self._owned = True
+
+        self._data[self._size:needed] = vectors
+        self._size = needed
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (zero rows are left as zeros)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def save_embeddings(directory: str, embeddings: np.ndarray, resources: List[Dict],
+                    model_name: str, normalized: bool = False) -> Path:
+    """Write the embeddings matrix and resource metadata to directory
+
+    Both files are written to temporary names first and then renamed, so a
+    reader never sees a half-written index.
+    """
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if len(resources) != matrix.shape[0]:
+        raise ValueError(f"{len(resources)} resources but {matrix.shape[0]} embeddings")
+
+    tmp_matrix = path / (EMBEDDINGS_FILE + ".tmp")
+    with open(tmp_matrix, "wb") as f:
+        np.save(f, matrix)
+
+    tmp_meta = path / (METADATA_FILE + ".tmp")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({
+            "model": model_name,
+            "normalized": normalized,
+            "count": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "resources": resources
+        }, f)
+
+    os.replace(tmp_matrix, path / EMBEDDINGS_FILE)
+    os.replace(tmp_meta, path / METADATA_FILE)
+    return path
+
+
+def load_embeddings(directory: str, model_name: Optional[str] = None,
+                    mmap: bool = True,
+                    normalized: Optional[bool] = None) -> Optional[Tuple[np.ndarray, List[Dict]]]:
+    """Load a saved index, or return None if there is no usable one
+
+    With mmap=True the matrix is memory-mapped read-only, so loading is
+    near-instant and several processes share the same pages. An index built
+    with a different embedding model, or with different normalisation when
+    normalized is given, is ignored.
+    """
+    path = Path(directory)
+    matrix_path = path / EMBEDDINGS_FILE
+    meta_path = path / METADATA_FILE
+    if not matrix_path.exists() or not meta_path.exists():
+        return None
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+
+    if model_name and metadata.get("model") != model_name:
+        return None
+    if normalized is not None and metadata.get("normalized", False) != normalized:
+        return None
+
+    embeddings = np.load(matrix_path, mmap_mode="r" if mmap else None)
+    resources = metadata.get("resources", [])
+    if embeddings.shape[0] != len(resources):
+        return None
+
+    return embeddings, resources
@@ -0,0 +1,265 @@
+"""
+Image pre-processing for OCR
+Shrinks homework photos before they are sent to the vision model: crop to
+the written area, downscale to a target DPI, grayscale, deskew and
+contrast normalisation, then re-encode as JPEG. Phone photos are usually
+far larger than OCR needs, so this cuts upload bytes and model latency.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class ImagePreprocessor:
+    def __init__(self, target_dpi: int = 200, page_width_inches: float = 8.5,
+                 grayscale: bool = True, deskew: bool = True,
+                 normalize_contrast: bool = True, crop: bool = True,
+                 jpeg_quality: int = 85, max_skew_degrees: float = 15.0):
+        """Configure the pipeline; every step can be switched off
+
+        The image is assumed to show one page page_width_inches wide (after
+        cropping), so it is downscaled to about target_dpi * page_width_inches
+        pixels across; smaller images are never upscaled. Deskew only
+        corrects angles up to max_skew_degrees.
+        """
+        self.target_dpi = target_dpi
+        self.page_width_inches = page_width_inches
+        self.grayscale = grayscale
+        self.deskew = deskew
+        self.normalize_contrast = normalize_contrast
+        self.crop = crop
+        self.jpeg_quality = jpeg_quality
+        self.max_skew_degrees = max_skew_degrees
+
+        self._lock = threading.Lock()
+        self._stats = {"images": 0, "skipped": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+
+    @classmethod
+    def from_env(cls) -> Optional["ImagePreprocessor"]:
+        """Build a preprocessor from OCR_TARGET_DPI, or None when
+        OCR_PREPROCESS is 0"""
+        if os.getenv("OCR_PREPROCESS", "1") == "0":
+            return None
+        return cls(target_dpi=int(os.getenv("OCR_TARGET_DPI", "200")))
+
+    def process(self, data: bytes) -> bytes:
+        """Return data (any format OpenCV reads) pre-processed and JPEG encoded
+
+        If the image cannot be decoded, or the result would not be smaller,
+        the original bytes are returned unchanged.
+        """
+        return self.prepare(data)[0]
+
+    def prepare(self, data: bytes) -> Tuple[bytes, Optional[np.ndarray]]:
+        """Like process(), but also return the pre-processed pixels (None if
+        the image could not be decoded), e.g. for perceptual hashing"""
+        import cv2
+
+        start = time.perf_counter()
+        output = data
+        image = None
+        try:
+            flags = cv2.IMREAD_GRAYSCALE if self.grayscale else cv2.IMREAD_COLOR
+            decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+            if decoded is not None:
+                image = self.apply(decoded)
+                encoded = self._encode(image)
+                if encoded is not None and len(encoded) < len(data):
+                    output = encoded
+        except Exception as e:
+            print(f"Image pre-processing failed, sending the original: {e}")
+
+        self._record(start, len(data), len(output), output is data)
+        return output, image
+
+    def process_pil(self, img) -> Optional[bytes]:
+        """Pre-process a PIL image; returns JPEG bytes, or None on failure"""
+        return self.prepare_pil(img)[0]
+
+    def prepare_pil(self, img) -> Tuple[Optional[bytes], Optional[np.ndarray]]:
+        """Like process_pil(), but also return the pre-processed pixels"""
+        start = time.perf_counter()
+        output = None
+        image = None
+        try:
+            if self.grayscale:
+                decoded = np.asarray(img.convert("L"))
+            else:
+                decoded = np.ascontiguousarray(np.asarray(img.convert("RGB"))[:, :, ::-1])
+            image = self.apply(decoded)
+            output = self._encode(image)
+        except Exception as e:
+            print(f"Image pre-processing failed, sending the original: {e}")
+
+        # No encoded input size to compare against, so bytes are not counted
+        self._record(start, 0, 0, output is None)
+        return output, image
+
+    def apply(self, image: np.ndarray) -> np.ndarray:
+        """Run the enabled steps on a decoded image (grayscale or BGR)"""
+        # The DPI is judged on the whole photo, which shows the whole page
+        page_shape = image.shape
+        if self.crop:
+            image = self.crop_to_content(image)
+        image = self.downscale(image, page_shape)
+        if self.deskew:
+            image = self.deskew_image(image)
+        if self.normalize_contrast:
+            image = self.equalize(image)
+        return image
+
+    def _encode(self, image: np.ndarray) -> Optional[bytes]:
+        import cv2
+
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return encoded.tobytes() if ok else None
+
+    def _record(self, start: float, bytes_in: int, bytes_out: int, skipped: bool):
+        with self._lock:
+            self._stats["images"] += 1
+            self._stats["skipped"] += skipped
+            self._stats["bytes_in"] += bytes_in
+            self._stats["bytes_out"] += bytes_out
+            self._stats["seconds"] += time.perf_counter() - start
+
+    @staticmethod
+    def _ink_mask(gray: np.ndarray) -> np.ndarray:
+        """Binary mask of writing (dark strokes on a lighter page)"""
+        import cv2
+
+        # Adaptive threshold copes with uneven lighting across a photo
+        mask = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                     cv2.THRESH_BINARY_INV, 31, 15)
+        return cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+
+    @staticmethod
+    def _gray(image: np.ndarray) -> np.ndarray:
+        import cv2
+
+        return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    def _small(self, image: np.ndarray, side: int = 1000):
+        """Grayscale copy with its longest side at most side pixels, and the
+        factor to map its coordinates back"""
+        import cv2
+
+        gray = self._gray(image)
+        scale = min(1.0, side / max(gray.shape[:2]))
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return gray, scale
+
+    def crop_to_content(self, image: np.ndarray, margin: float = 0.02) -> np.ndarray:
+        """Crop to the bounding box of the writing plus a margin"""
+        small, scale = self._small(image)
+        points = np.argwhere(self._ink_mask(small))
+        if len(points) < 50:
+            return image
+        # Ignore stray specks: keep the central 99.6% of ink on each axis
+        top, left = np.percentile(points, 0.2, axis=0)
+        bottom, right = np.percentile(points, 99.8, axis=0)
+
+        height, width = image.shape[:2]
+        pad = margin * max(height, width)
+        top = max(0, int(top / scale - pad))
+        left = max(0, int(left / scale - pad))
+        bottom = min(height, int(bottom / scale + pad) + 1)
+        right = min(width, int(right / scale + pad) + 1)
+        if (bottom - top) * (right - left) > 0.95 * height * width:
+            return image
+        return image[top:bottom, left:right]
+
+    def downscale(self, image: np.ndarray, page_shape=None) -> np.ndarray:
+        """Shrink to target_dpi across page_width_inches (never enlarges)
+
+        page_shape is the shape of the full page when image is a crop of it.
+        """
+        import cv2
+
+        target_width = int(self.target_dpi * self.page_width_inches)
+        height, width = (page_shape or image.shape)[:2]
+        # The page may be photographed in landscape; scale the shorter side
+        scale = target_width / min(height, width)
+        if scale >= 1.0:
+            return image
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    def skew_angle(self, image: np.ndarray) -> float:
+        """Estimated rotation of the text lines in degrees (0 if unsure)
+
+        Tries angles within max_skew_degrees and keeps the one whose
+        horizontal projection of the ink is sharpest, i.e. where the text
+        lines line up with pixel rows.
+        """
+        import cv2
+
+        small, _ = self._small(image, side=800)
+        mask = self._ink_mask(small)
+        if cv2.countNonZero(mask) < 100:
+            return 0.0
+        center = (mask.shape[1] / 2, mask.shape[0] / 2)
+
+        def sharpness(angle: float) -> float:
+            rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+            rotated = cv2.warpAffine(mask, rotation, (mask.shape[1], mask.shape[0]), flags=cv2.INTER_NEAREST)
+            profile = rotated.sum(axis=1, dtype=np.float64)
+            return float(np.sum(np.diff(profile) ** 2))
+
+        # Coarse 1 degree sweep, then refine around the best angle
+        best = max(np.arange(-self.max_skew_degrees, self.max_skew_degrees + 0.5, 1.0), key=sharpness)
+        best = max(np.arange(best - 1.0, best + 1.01, 0.2), key=sharpness)
+        return float(best)
+
+    def deskew_image(self, image: np.ndarray) -> np.ndarray:
+        """Rotate so text lines are horizontal; tiny angles are left alone"""
+        import cv2
+
+        angle = self.skew_angle(image)
+        if abs(angle) < 0.3:
+            return image
+        height, width = image.shape[:2]
+        rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        # Fill the uncovered corners with the typical (page) colour
+        fill = np.median(image.reshape(-1, 1 if image.ndim == 2 else image.shape[2]), axis=0)
+        return cv2.warpAffine(image, rotation, (width, height), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=tuple(float(v) for v in fill))
+
+    @staticmethod
+    def equalize(image: np.ndarray) -> np.ndarray:
+        """Local contrast normalisation (CLAHE) on the lightness channel"""
+        import cv2
+
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        if image.ndim == 2:
+            return clahe.apply(image)
+        lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+        lab[:, :, 0] = clahe.apply(lab[:, :, 0])
+        return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+    def get_stats(self) -> Dict:
+        """Images processed, bytes before/after and mean milliseconds per image"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_ms"] = round(1000 * stats["seconds"] / stats["images"], 1) if stats["images"] else 0.0
+        stats["seconds"] = round(stats["seconds"], 3)
+        stats["reduction"] = round(1 - stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else 0.0
+        return stats
+
+
+if __name__ == "__main__":
+    import sys
+
+    preprocessor = ImagePreprocessor()
+    for path in sys.argv[1:]:
+        with open(path, "rb") as f:
+            data = f.read()
+        output = preprocessor.process(data)
+        out_path = os.path.splitext(path)[0] + ".preprocessed.jpg"
+        with open(out_path, "wb") as f:
+            f.write(output)
+        print(f"{path}: {len(data) / 1024:.0f} KB -> {len(output) / 1024:.0f} KB ({out_path})")
+    print(preprocessor.get_stats())
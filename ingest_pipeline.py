@@ -0,0 +1,361 @@
+"""
+Bulk ingest pipeline for scanned homework
+Splits a multi-page PDF, a ZIP of scans or a single image into pages and
+runs pre-processing, OCR and grading as overlapping stages connected by
+bounded queues, streaming each graded page out (e.g. as CSV or JSONL) as
+soon as it is done. At most a few queue-fulls of pages are in memory at
+once, however long the input is.
+"""
+
+import csv
+import io
+import json
+import os
+import queue
+import threading
+import time
+import zipfile
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ocr_backends import read_image_bytes
+from rate_limiter import PRIORITY_BATCH
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff")
+RESULT_FIELDS = ["page", "source", "score", "max_score", "percentage", "feedback",
+                 "strengths", "improvements", "mistakes", "extracted_text", "ocr_cached", "error"]
+
+_DONE = object()
+
+
+def _pdf_pages(data: bytes, label: str, dpi: int) -> Iterator[Tuple[str, object]]:
+    """Render each page of a PDF to PNG, one page at a time
+
+    A page that fails to render, or a PDF that cannot be opened, is
+    yielded with the exception in place of its image.
+    """
+    try:
+        import pymupdf
+    except ImportError:
+        try:
+            import fitz as pymupdf  # PyMuPDF < 1.24.3
+        except ImportError:
+            yield label, ImportError("PDF input needs PyMuPDF: pip install pymupdf")
+            return
+
+    try:
+        document = pymupdf.open(stream=data, filetype="pdf")
+    except Exception as e:
+        yield label, e
+        return
+    with document:
+        for number in range(1, document.page_count + 1):
+            try:
+                # Grayscale is all OCR needs and a third of the pixels
+                pixmap = document[number - 1].get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY)
+                page = pixmap.tobytes("png")
+            except Exception as e:
+                page = e
+            yield f"{label} p{number}", page
+
+
+def iter_pages(source, name: str = "upload", dpi: int = 200) -> Iterator[Tuple[str, object]]:
+    """Yield (label, encoded image) for every page in source
+
+    source is a path, bytes or file-like object (e.g. a Streamlit upload)
+    holding a PDF, a ZIP of images and/or PDFs, or a single image. ZIP
+    members are read and PDF pages rendered one at a time, as they are
+    consumed. A member or page that cannot be read is yielded with the
+    exception in place of its image, and the rest still follow.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        name = os.path.basename(source)
+        if zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                yield from _zip_pages(archive, dpi)
+            return
+    data = read_image_bytes(source)
+
+    if data.startswith(b"PK\x03\x04"):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            yield from _zip_pages(archive, dpi)
+    elif data.startswith(b"%PDF"):
+        yield from _pdf_pages(data, name, dpi)
+    else:
+        yield name, data
+
+
+def _zip_pages(archive: zipfile.ZipFile, dpi: int) -> Iterator[Tuple[str, object]]:
+    for info in sorted(archive.infolist(), key=lambda info: info.filename):
+        member = info.filename
+        if info.is_dir() or os.path.basename(member).startswith("."):
+            continue
+        if not member.lower().endswith((".pdf",) + IMAGE_EXTENSIONS):
+            continue
+        try:
+            data = archive.read(member)
+        except Exception as e:
+            yield member, e
+            continue
+        if member.lower().endswith(".pdf"):
+            yield from _pdf_pages(data, member, dpi)
+        else:
+            yield member, data
+
+
+class IngestPipeline:
+    def __init__(self, grader, correct_answer: str, subject: str, max_score: int = 10,
+                 prep_workers: int = 2, ocr_workers: int = 4, grade_workers: int = 8,
+                 queue_size: int = 8, dpi: int = 200):
+        """Configure the stages
+
+        grader is an AssessmentGradingAssistant; its preprocessor, OCR cache
+        and OCR backend are used for the first two stages. Each stage runs
+        on its own threads (prep_workers, ocr_workers, grade_workers) and
+        hands pages to the next through a queue of at most queue_size
+        pages, so a slow stage holds back the ones before it instead of
+        letting pages pile up. PDF pages are rendered at dpi.
+        """
+        self.grader = grader
+        self.correct_answer = correct_answer
+        self.subject = subject
+        self.max_score = max_score
+        self.prep_workers = prep_workers
+        self.ocr_workers = ocr_workers
+        self.grade_workers = grade_workers
+        self.queue_size = queue_size
+        self.dpi = dpi
+
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def run(self, source, name: str = "upload",
+            on_result: Optional[Callable[[Dict], None]] = None, ordered: bool = False) -> Iterator[Dict]:
+        """Yield a result dict per page, in completion order
+
+        Each result has the RESULT_FIELDS keys; "page" is the page's
+        position in the input. With ordered, a finished page is held back
+        until every earlier page is done, so results come out in input
+        order (only the small result dicts wait, never images). Pages that
+        fail at any stage are yielded with a zero score and "error" set
+        instead of stopping the run. Closing the generator early stops the
+        stages.
+        """
+        stop = threading.Event()
+        pages = queue.Queue(self.queue_size)
+        prepared = queue.Queue(self.queue_size)
+        extracted = queue.Queue(self.queue_size)
+        results = queue.Queue(self.queue_size)
+        self._stats = {"pages": 0, "errors": 0, "ocr_cached": 0, "start": time.perf_counter(),
+                       "busy_seconds": {"split": 0.0, "prep": 0.0, "ocr": 0.0, "grade": 0.0}}
+
+        threads = [threading.Thread(target=self._split, args=(source, name, pages, stop),
+                                    name="ingest-split", daemon=True)]
+        threads += self._stage("prep", self._prepare, pages, prepared, self.prep_workers, self.ocr_workers, stop)
+        threads += self._stage("ocr", self._ocr, prepared, extracted, self.ocr_workers, self.grade_workers, stop)
+        threads += self._stage("grade", self._grade, extracted, results, self.grade_workers, 1, stop)
+        for thread in threads:
+            thread.start()
+
+        waiting = {}
+        next_page = 0
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                result = self._result(item)
+                with self._lock:
+                    self._stats["pages"] += 1
+                    self._stats["errors"] += bool(result["error"])
+                    self._stats["ocr_cached"] += bool(result["ocr_cached"])
+                if not ordered:
+                    ready = [result]
+                else:
+                    waiting[result["page"]] = result
+                    ready = []
+                    while next_page in waiting:
+                        ready.append(waiting.pop(next_page))
+                        next_page += 1
+                for result in ready:
+                    if on_result:
+                        on_result(result)
+                    yield result
+            for page in sorted(waiting):
+                if on_result:
+                    on_result(waiting[page])
+                yield waiting[page]
+        finally:
+            stop.set()
+            with self._lock:
+                self._stats["seconds"] = time.perf_counter() - self._stats.pop("start")
+
+    def _put(self, outbox: queue.Queue, item, stop: threading.Event) -> bool:
+        """Block until outbox has room; False if the run was stopped"""
+        while not stop.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _busy(self, stage: str, start: float):
+        with self._lock:
+            self._stats["busy_seconds"][stage] += time.perf_counter() - start
+
+    def _split(self, source, name: str, outbox: queue.Queue, stop: threading.Event):
+        index = 0
+        if isinstance(source, (str, os.PathLike)):
+            name = os.path.basename(source)
+        try:
+            pages = iter_pages(source, name, self.dpi)
+            while True:
+                start = time.perf_counter()
+                page = next(pages, None)
+                self._busy("split", start)
+                if page is None:
+                    break
+                label, image = page
+                if isinstance(image, Exception):
+                    item = {"page": index, "source": label, "error": f"Could not read {label}: {str(image)}"}
+                else:
+                    item = {"page": index, "source": label, "image": image}
+                if not self._put(outbox, item, stop):
+                    break
+                index += 1
+        except Exception as e:
+            # The container itself is unreadable (e.g. a corrupt ZIP directory)
+            self._put(outbox, {"page": index, "source": name, "error": f"Could not read input: {str(e)}"}, stop)
+        finally:
+            for _ in range(self.prep_workers):
+                self._put(outbox, _DONE, stop)
+
+    def _stage(self, stage: str, work: Callable[[Dict], Dict], inbox: queue.Queue, outbox: queue.Queue,
+               workers: int, downstream_workers: int, stop: threading.Event) -> List[threading.Thread]:
+        """Threads that apply work to each page from inbox and pass it on
+
+        Pages that already failed are passed on untouched. The last worker
+        to finish sends one end marker per downstream worker.
+        """
+        remaining = [workers]
+        remaining_lock = threading.Lock()
+
+        def worker():
+            while not stop.is_set():
+                try:
+                    item = inbox.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                if not item.get("error"):
+                    start = time.perf_counter()
+                    try:
+                        item = work(item)
+                    except Exception as e:
+                        item["error"] = f"{stage} failed: {str(e)}"
+                    self._busy(stage, start)
+                if not self._put(outbox, item, stop):
+                    return
+            with remaining_lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                for _ in range(downstream_workers):
+                    self._put(outbox, _DONE, stop)
+
+        return [threading.Thread(target=worker, name=f"ingest-{stage}-{i}", daemon=True) for i in range(workers)]
+
+    def _prepare(self, item: Dict) -> Dict:
+        # The original scan is dropped here; only the smaller payload moves on
+        item["image"], item["cache_key"], item["text"] = self.grader.prepare_for_ocr(item.pop("image"))
+        item["ocr_cached"] = item["text"] is not None
+        return item
+
+    def _ocr(self, item: Dict) -> Dict:
+        image = item.pop("image")
+        if item["text"] is None:
+            item["text"] = self.grader.ocr_prepared(image, item["cache_key"])
+        if item["text"].startswith("Error"):
+            item["error"] = item["text"]
+        return item
+
+    def _grade(self, item: Dict) -> Dict:
+        item["grading"] = self.grader.grade_homework(item["text"], self.correct_answer, self.subject, self.max_score,
+                                                     priority=PRIORITY_BATCH, feature="batch_grading")
+        return item
+
+    def _result(self, item: Dict) -> Dict:
+        """Flatten a finished (or failed) page into a RESULT_FIELDS row"""
+        result = {field: None for field in RESULT_FIELDS}
+        result.update(page=item["page"], source=item["source"], max_score=self.max_score,
+                      ocr_cached=bool(item.get("ocr_cached")), error=item.get("error", ""))
+        if result["error"]:
+            result.update(score=0, percentage=0.0, feedback=result["error"],
+                          strengths=[], improvements=[], mistakes=[], extracted_text="")
+        else:
+            result.update(item["grading"])
+            result["extracted_text"] = item["text"]
+        return {field: result.get(field) for field in RESULT_FIELDS}
+
+    def get_stats(self) -> Dict:
+        """Pages done, errors, throughput and seconds each stage spent working"""
+        with self._lock:
+            stats = {key: value for key, value in self._stats.items() if key != "start"}
+            stats["busy_seconds"] = {stage: round(seconds, 3)
+                                     for stage, seconds in self._stats.get("busy_seconds", {}).items()}
+        seconds = stats.get("seconds")
+        if seconds:
+            stats["pages_per_second"] = round(stats["pages"] / seconds, 2)
+            stats["seconds"] = round(seconds, 3)
+        return stats
+
+
+class ResultWriter:
+    """Write pipeline results to a text stream as CSV or JSONL, one row at a time"""
+
+    def __init__(self, stream, format: str = "jsonl"):
+        if format not in ("csv", "jsonl"):
+            raise ValueError(f"Unknown output format '{format}'. Choose from: csv, jsonl")
+        self.stream = stream
+        self.format = format
+        self._csv = None
+        if format == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=RESULT_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, result: Dict):
+        if self._csv is not None:
+            row = {key: "; ".join(value) if isinstance(value, list) else value for key, value in result.items()}
+            self._csv.writerow(row)
+        else:
+            self.stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from dotenv import load_dotenv
+
+    from assessment_grading import AssessmentGradingAssistant
+    from ocr_cache import OCRCache
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Grade every page of a scanned PDF, ZIP or image")
+    parser.add_argument("source")
+    parser.add_argument("--answer", required=True, help="correct answer / solution")
+    parser.add_argument("--subject", default="Mathematics")
+    parser.add_argument("--max-score", type=int, default=10)
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+    args = parser.parse_args()
+
+    grader = AssessmentGradingAssistant(os.getenv("GROQ_API_KEY"), os.getenv("LLAMA_MODEL", "llama-3.3-70b-versatile"),
+                                        ocr_cache=OCRCache(data_dir="data"))
+    pipeline = IngestPipeline(grader, args.answer, args.subject, args.max_score)
+    writer = ResultWriter(sys.stdout, args.format)
+    for result in pipeline.run(args.source, ordered=True):
+        writer.write(result)
+    print(pipeline.get_stats(), file=sys.stderr)
@@ -0,0 +1,348 @@
+"""
+Shared LLM gateway
+One pooled, keep-alive HTTP client per process that every engine routes its
+chat.completions.create calls through, so connections and TLS sessions are
+reused instead of being set up per engine and per session. Async callers
+get AsyncGroq clients on pooled httpx.AsyncClients per event loop.
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from rate_limiter import PRIORITY_INTERACTIVE, RateLimiter, estimate_tokens
+from retry_policy import DeadlineExceeded, RetryPolicy
+
+
+class _Completions:
+    def __init__(self, gateway: "LLMGateway"):
+        self._gateway = gateway
+
+    def create(self, **kwargs):
+        return self._gateway.create_chat_completion(**kwargs)
+
+    async def acreate(self, **kwargs):
+        return await self._gateway.acreate_chat_completion(**kwargs)
+
+
+class _Chat:
+    def __init__(self, gateway: "LLMGateway"):
+        self.completions = _Completions(gateway)
+
+
+class LLMGateway:
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 max_connections: int = 20, max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 30.0, timeout: float = 60.0,
+                 verify=True, rate_limiter: Optional[RateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 async_max_connections: int = 200, async_shard_size: int = 8):
+        """Create the pooled client
+
+        Exposes the same chat.completions.create(...) call as a Groq client,
+        so engines can use it as a drop-in replacement. base_url points the
+        gateway at another server, e.g. a local stub for benchmarks (defaults
+        to GROQ_BASE_URL or the Groq API). When rate_limiter is set, every
+        call waits for it first (see rate_limiter.RateLimiter). When
+        retry_policy is set it owns retries, so the SDK's own are turned off.
+        Async calls use their own pool of up to async_max_connections,
+        split into shards of async_shard_size connections that requests
+        are spread over round-robin: httpcore scans every connection of a
+        pool per request, which gets slow with hundreds of them.
+        """
+        import httpx
+        from groq import Groq
+
+        self.base_url = base_url or os.getenv("GROQ_BASE_URL") or None
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.async_max_connections = async_max_connections
+        self.async_shard_size = max(1, async_shard_size)
+        self._api_key = api_key
+        self._verify = verify
+        self._timeout = timeout
+        # httpx.AsyncClient connections belong to the loop that opened them;
+        # each loop maps to (clients, round-robin counter)
+        self._async_clients = weakref.WeakKeyDictionary()
+
+        self._http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=timeout,
+            verify=verify
+        )
+        self._client = Groq(
+            api_key=api_key,
+            base_url=self.base_url,
+            http_client=self._http_client,
+            max_retries=0 if retry_policy is not None else 2
+        )
+        self.chat = _Chat(self)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "errors": 0, "total_seconds": 0.0,
+                       "prompt_tokens": 0, "completion_tokens": 0}
+
+    def create_chat_completion(self, feature: str = "default",
+                               priority: int = PRIORITY_INTERACTIVE,
+                               deadline: Optional[float] = None, hedge: bool = False,
+                               **kwargs):
+        """Forward a chat completion request over the pooled connection
+
+        feature names the caller for per-feature concurrency caps and
+        priority picks the lane (PRIORITY_INTERACTIVE or PRIORITY_BATCH).
+        deadline (seconds) overrides the retry policy's budget for this call
+        and hedge allows a duplicate request when the call runs past p95.
+        """
+        if self.retry_policy is None:
+            return self._limited_create(feature, priority, None, kwargs)
+
+        on_rate_limited = self.rate_limiter.pause if self.rate_limiter is not None else None
+        return self.retry_policy.call(
+            lambda deadline_at: self._limited_create(feature, priority, deadline_at, kwargs),
+            key=feature,
+            deadline=deadline,
+            hedge=hedge,
+            on_rate_limited=on_rate_limited
+        )
+
+    def stream_chat_completion(self, feature: str = "default",
+                               priority: int = PRIORITY_INTERACTIVE,
+                               deadline: Optional[float] = None, **kwargs) -> Iterator[str]:
+        """Yield the completion text piece by piece as it is generated
+
+        Holds a rate limiter slot until the stream ends. Opening the stream
+        is retried like any other call, but once text has been yielded a
+        failure is raised to the caller, since a retry would repeat output.
+        """
+        kwargs["stream"] = True
+        estimated = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(feature, priority, estimated)
+        try:
+            if self.retry_policy is None:
+                stream = self._timed_create(None, kwargs)
+            else:
+                on_rate_limited = self.rate_limiter.pause if self.rate_limiter is not None else None
+                stream = self.retry_policy.call(
+                    lambda deadline_at: self._timed_create(deadline_at, kwargs),
+                    key=f"{feature}:stream",
+                    deadline=deadline,
+                    on_rate_limited=on_rate_limited
+                )
+            with stream:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        finally:
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(feature, estimated)
+
+    def _get_async_client(self):
+        loop = asyncio.get_running_loop()
+        shards = self._async_clients.get(loop)
+        if shards is None:
+            shards = self._async_clients[loop] = (self._make_async_clients(), itertools.count())
+        clients, counter = shards
+        return clients[next(counter) % len(clients)]
+
+    def _make_async_clients(self):
+        from groq import AsyncGroq
+        import httpx
+
+        clients = []
+        remaining = max(1, self.async_max_connections)
+        while remaining > 0:
+            size = min(self.async_shard_size, remaining)
+            remaining -= size
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=size,
+                    max_keepalive_connections=size,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=self._timeout,
+                verify=self._verify
+            )
+            clients.append(AsyncGroq(
+                api_key=self._api_key,
+                base_url=self.base_url,
+                http_client=http_client,
+                max_retries=0 if self.retry_policy is not None else 2
+            ))
+        return clients
+
+    async def acreate_chat_completion(self, feature: str = "default",
+                                      priority: int = PRIORITY_INTERACTIVE,
+                                      deadline: Optional[float] = None, hedge: bool = False,
+                                      **kwargs):
+        """Async counterpart of create_chat_completion"""
+        if self.retry_policy is None:
+            return await self._alimited_create(feature, priority, None, kwargs)
+
+        on_rate_limited = self.rate_limiter.pause if self.rate_limiter is not None else None
+        return await self.retry_policy.acall(
+            lambda deadline_at: self._alimited_create(feature, priority, deadline_at, kwargs),
+            key=feature,
+            deadline=deadline,
+            hedge=hedge,
+            on_rate_limited=on_rate_limited
+        )
+
+    async def astream_chat_completion(self, feature: str = "default",
+                                      priority: int = PRIORITY_INTERACTIVE,
+                                      deadline: Optional[float] = None, **kwargs) -> AsyncIterator[str]:
+        """Async counterpart of stream_chat_completion"""
+        kwargs["stream"] = True
+        estimated = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(feature, priority, estimated)
+        try:
+            if self.retry_policy is None:
+                stream = await self._atimed_create(None, kwargs)
+            else:
+                on_rate_limited = self.rate_limiter.pause if self.rate_limiter is not None else None
+                stream = await self.retry_policy.acall(
+                    lambda deadline_at: self._atimed_create(deadline_at, kwargs),
+                    key=f"{feature}:stream",
+                    deadline=deadline,
+                    on_rate_limited=on_rate_limited
+                )
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.response.aclose()
+        finally:
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(feature, estimated)
+
+    async def _alimited_create(self, feature: str, priority: int,
+                               deadline_at: Optional[float], kwargs: Dict):
+        if self.rate_limiter is None:
+            return await self._atimed_create(deadline_at, kwargs)
+
+        estimated = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+        async with self.rate_limiter.alimit(feature, priority, estimated) as usage:
+            response = await self._atimed_create(deadline_at, kwargs)
+            usage["actual_tokens"] = getattr(getattr(response, "usage", None), "total_tokens", None)
+            return response
+
+    async def _atimed_create(self, deadline_at: Optional[float], kwargs: Dict):
+        if deadline_at is not None:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Deadline exceeded before the request was sent")
+            kwargs = dict(kwargs, timeout=remaining)
+
+        client = self._get_async_client()
+        start = time.perf_counter()
+        try:
+            response = await client.chat.completions.create(**kwargs)
+            self._count_tokens(response)
+            return response
+        except Exception:
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self._stats["calls"] += 1
+                self._stats["total_seconds"] += elapsed
+
+    def _limited_create(self, feature: str, priority: int,
+                        deadline_at: Optional[float], kwargs: Dict):
+        if self.rate_limiter is None:
+            return self._timed_create(deadline_at, kwargs)
+
+        estimated = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+        with self.rate_limiter.limit(feature, priority, estimated) as usage:
+            response = self._timed_create(deadline_at, kwargs)
+            usage["actual_tokens"] = getattr(getattr(response, "usage", None), "total_tokens", None)
+            return response
+
+    def _timed_create(self, deadline_at: Optional[float], kwargs: Dict):
+        if deadline_at is not None:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Deadline exceeded before the request was sent")
+            kwargs = dict(kwargs, timeout=remaining)
+
+        start = time.perf_counter()
+        try:
+            response = self._client.chat.completions.create(**kwargs)
+            self._count_tokens(response)
+            return response
+        except Exception:
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self._stats["calls"] += 1
+                self._stats["total_seconds"] += elapsed
+
+    def _count_tokens(self, response):
+        # Streams have no usage until they are consumed; they are not counted
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            with self._stats_lock:
+                self._stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                self._stats["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def get_stats(self) -> Dict:
+        """Call count, error count, mean latency, tokens used, rate limiter
+        and retry stats"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_seconds"] = round(stats["total_seconds"] / stats["calls"], 4) if stats["calls"] else 0.0
+        stats["total_seconds"] = round(stats["total_seconds"], 3)
+        if self.rate_limiter is not None:
+            stats["rate_limiter"] = self.rate_limiter.get_stats()
+        if self.retry_policy is not None:
+            stats["retry"] = self.retry_policy.get_stats()
+        return stats
+
+    def close(self):
+        """Close the pooled connections"""
+        self._http_client.close()
+
+    async def aclose(self):
+        """Close the async connection pools of the running event loop"""
+        shards = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if shards is not None:
+            for client in shards[0]:
+                await client.close()
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(api_key: str, base_url: Optional[str] = None, **options) -> LLMGateway:
+    """Return the process-wide gateway for (api_key, base_url), creating it once
+
+    options (max_connections, keepalive_expiry, rate_limiter, retry_policy,
+    ...) only apply when the gateway is first created. The rate limiter and
+    retry policy default to RateLimiter.from_env() and RetryPolicy.from_env().
+    """
+    key = (api_key, base_url)
+    with _gateways_lock:
+        if key not in _gateways:
+            options.setdefault("rate_limiter", RateLimiter.from_env())
+            options.setdefault("retry_policy", RetryPolicy.from_env())
+            _gateways[key] = LLMGateway(api_key, base_url=base_url, **options)
+        return _gateways[key]
@@ -0,0 +1,75 @@
+"""
+Process-wide registry for embedding models
+Loads each SentenceTransformer once per process and shares it across
+Streamlit sessions and threads; can warm models up in the background.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+_models = {}
+_load_seconds = {}
+_name_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _lock_for(name: str) -> threading.Lock:
+    with _registry_lock:
+        if name not in _name_locks:
+            _name_locks[name] = threading.Lock()
+        return _name_locks[name]
+
+
+def get_embedding_model(name: str = DEFAULT_EMBEDDING_MODEL):
+    """Return the shared SentenceTransformer for name, loading it on first use
+
+    Concurrent callers for the same model wait for a single load instead of
+    each loading their own copy.
+    """
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _lock_for(name):
+        model = _models.get(name)
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+
+            print(f"Loading embedding model {name}...")
+            start = time.perf_counter()
+            model = SentenceTransformer(name)
+            _load_seconds[name] = time.perf_counter() - start
+            _models[name] = model
+            print(f"Loaded {name} in {_load_seconds[name]:.2f}s")
+    return model
+
+
+def warm_up(name: str = DEFAULT_EMBEDDING_MODEL) -> threading.Thread:
+    """Start loading a model on a daemon thread and return the thread"""
+    def _load():
+        try:
+            get_embedding_model(name)
+        except Exception as e:
+            print(f"Background load of {name} failed: {str(e)}")
+
+    thread = threading.Thread(target=_load, name=f"warm-up-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_loaded(name: str = DEFAULT_EMBEDDING_MODEL) -> bool:
+    """Whether the model is already in memory"""
+    return name in _models
+
+
+def get_load_time(name: str = DEFAULT_EMBEDDING_MODEL) -> Optional[float]:
+    """Seconds the model took to load, or None if it has not loaded yet"""
+    return _load_seconds.get(name)
+
+
+def get_load_stats() -> Dict[str, float]:
+    """Load time in seconds for every loaded model"""
+    return {name: round(seconds, 3) for name, seconds in _load_seconds.items()}
@@ -0,0 +1,280 @@
+"""
+Rule-based grading for objective answers
+Multiple-choice keys, numeric answers (with a tolerance) and short
+exact-phrase answers are graded locally in microseconds. Anything it cannot
+grade with certainty returns None, and AssessmentGradingAssistant escalates
+that answer to the LLM as before.
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+TIERS = ("mcq", "numeric", "exact")
+
+_OPTION = r"\(?([A-Ea-e])\)?"
+# "B", "(b)", "B) Mitochondria", "Option C", "Answer: d"
+_SINGLE_OPTION = re.compile(
+    r"^\s*(?:(?:the\s+)?(?:answer|ans|option|choice)(?:\s+is)?\s*[:.\-]?\s*)?"
+    r"\(?([A-Ea-e])(?:(?:\)|\]|[.:](?=\s|$))(?:\s+(\S.*?))?)?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+# "1. A 2. C", "1-a, 2-c", "Q1) B Q2) D"
+_NUMBERED_OPTION = re.compile(r"(?:q\s*)?(\d+)\s*[.):\-]?\s*" + _OPTION + r"(?![A-Za-z])", re.IGNORECASE)
+_NUMBER = r"[-+−]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?(?:[eE][-+]?\d+)?|[-+−]?\.\d+"
+# An optional "x =" and a single number or fraction, then an optional unit
+_NUMERIC_ANSWER = re.compile(
+    r"^\s*(?:([A-Za-z]\w*)\s*=\s*)?"
+    r"(" + _NUMBER + r")(?:\s*/\s*(\d+))?"
+    r"\s*(%|[A-Za-z°µ][\w°µ²³/^*\s-]{0,15}?)?\s*\.?\s*$"
+)
+_ARTICLES = {"a", "an", "the"}
+
+
+def parse_options(text: str) -> Optional[Dict[int, str]]:
+    """Option letters by question number, or None if text is not an MCQ key
+
+    Accepts a single letter (optionally with the option's text), numbered
+    answers ("1. A 2. C") or a list of letters ("A, C, B"), numbered from 1.
+    """
+    single = _SINGLE_OPTION.match(text)
+    if single:
+        return {1: single.group(1).upper()}
+
+    numbered = _NUMBERED_OPTION.findall(text)
+    if numbered and not re.sub(r"[\s,;/|]+", "", _NUMBERED_OPTION.sub("", text)):
+        return {int(number): letter.upper() for number, letter in numbered}
+
+    tokens = [token for token in re.split(r"[\s,;/|]+", text.strip()) if token]
+    if len(tokens) > 1 and all(re.fullmatch(_OPTION, token) for token in tokens):
+        return {i: re.fullmatch(_OPTION, token).group(1).upper() for i, token in enumerate(tokens, 1)}
+    return None
+
+
+def option_text(text: str) -> str:
+    """Text after the letter of a single-option answer ("Lincoln" in "A. Lincoln"), else """""
+    single = _SINGLE_OPTION.match(text)
+    return (single.group(2) or "") if single else ""
+
+
+def parse_numeric(text: str) -> Optional[Tuple[float, str, str]]:
+    """(value, unit, variable) of an answer that is a single number, else None"""
+    match = _NUMERIC_ANSWER.match(text)
+    if not match:
+        return None
+    variable, number, denominator, unit = match.groups()
+    try:
+        value = float(number.replace(",", "").replace("−", "-"))
+        if denominator:
+            value /= int(denominator)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return value, normalize_unit(unit or ""), (variable or "").lower()
+
+
+def decimal_places(text: str) -> Optional[int]:
+    """Digits after the decimal point of a numeric answer's number, or None
+    for fractions, exponents and text that is not a single number"""
+    match = _NUMERIC_ANSWER.match(text)
+    if not match or match.group(3) or re.search(r"[eE]", match.group(2)):
+        return None
+    number = match.group(2)
+    return len(number.split(".", 1)[1]) if "." in number else 0
+
+
+def normalize_unit(unit: str) -> str:
+    unit = unit.lower().replace("²", "2").replace("³", "3")
+    return re.sub(r"[\s^*]", "", unit)
+
+
+def normalize_text(text: str) -> str:
+    """Case, accents, punctuation and articles folded away"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    words = re.sub(r"[^\w]+", " ", text).split()
+    return " ".join(word for word in words if word not in _ARTICLES)
+
+
+class ObjectiveGrader:
+    def __init__(self, numeric_tolerance: float = 0.0, absolute_tolerance: float = 1e-9,
+                 max_text_words: int = 6):
+        """Configure the rules
+
+        A numeric answer is correct when it rounds to the key at the key's
+        precision (28.27 for a key of 28.3, not 28.2); integer keys must
+        match exactly, so 1930 is wrong for 1945 and 12.1 for 12. For a
+        fraction key, a decimal answer of at least two places is correct
+        if it is the fraction rounded. numeric_tolerance (relative to the
+        key) widens this when set; absolute_tolerance absorbs float error.
+        Short text
+        keys (at most max_text_words words) match only exactly after
+        normalize_text. Wrong MCQ and numeric answers score zero here; a
+        text answer that does not match is escalated, since it may be a
+        synonym or a misspelling only the LLM can judge ("adsorption" is
+        one letter away from "absorption" but a different term).
+        """
+        self.numeric_tolerance = numeric_tolerance
+        self.absolute_tolerance = absolute_tolerance
+        self.max_text_words = max_text_words
+
+        self._lock = threading.Lock()
+        self._stats = {tier: 0 for tier in TIERS}
+        self._stats.update(escalated=0, local_ns=0)
+
+    @classmethod
+    def from_env(cls) -> Optional["ObjectiveGrader"]:
+        """Build a grader from OBJECTIVE_NUMERIC_TOLERANCE, or None when
+        OBJECTIVE_GRADING is 0"""
+        if os.getenv("OBJECTIVE_GRADING", "1") == "0":
+            return None
+        return cls(numeric_tolerance=float(os.getenv("OBJECTIVE_NUMERIC_TOLERANCE", "0")))
+
+    def grade(self, student_answer: str, correct_answer: str, max_score: int = 10) -> Optional[Dict]:
+        """Grade locally, or return None if the answer needs the LLM
+
+        The result has the same keys as AssessmentGradingAssistant's
+        grade_homework, plus "grading_tier" (one of TIERS).
+        """
+        start = time.perf_counter_ns()
+        result = None
+        try:
+            result = (self._grade_mcq(student_answer, correct_answer, max_score)
+                      or self._grade_numeric(student_answer, correct_answer, max_score)
+                      or self._grade_text(student_answer, correct_answer, max_score))
+        except Exception as e:
+            print(f"Objective grading failed, escalating to the LLM: {e}")
+
+        with self._lock:
+            if result is None:
+                self._stats["escalated"] += 1
+            else:
+                self._stats[result["grading_tier"]] += 1
+                self._stats["local_ns"] += time.perf_counter_ns() - start
+        return result
+
+    @staticmethod
+    def _result(tier: str, score: float, max_score: int, feedback: str,
+                mistakes: Optional[List[str]] = None) -> Dict:
+        score = round(score, 2)
+        return {
+            "score": score,
+            "percentage": round(100.0 * score / max_score, 1) if max_score else 0.0,
+            "feedback": feedback,
+            "strengths": ["Correct answer"] if not mistakes and score > 0 else [],
+            "improvements": [],
+            "mistakes": mistakes or [],
+            "grading_tier": tier,
+        }
+
+    def _grade_mcq(self, student_answer: str, correct_answer: str, max_score: int) -> Optional[Dict]:
+        key = parse_options(correct_answer)
+        if key is None:
+            return None
+        answers = parse_options(student_answer)
+        if answers is None:
+            return None
+        if len(key) == 1:
+            if len(answers) != 1:
+                return None
+            key_text = option_text(correct_answer)
+            if key_text and normalize_text(option_text(student_answer)) != normalize_text(key_text):
+                # "A. Lincoln" may be a name rather than option A; only an
+                # answer repeating the option's text is graded on its letter
+                return None
+            # A lone letter answers the only question, whatever it is numbered
+            answers = {1: next(iter(answers.values()))}
+        elif set(answers) - set(key):
+            return None
+        elif len(answers) != len(key) and not _NUMBERED_OPTION.search(student_answer):
+            # An unnumbered list of the wrong length cannot be lined up
+            return None
+
+        mistakes = [f"Question {number}: answered {answers[number]}, correct answer {letter}"
+                    if number in answers else f"Question {number}: not answered (correct answer {letter})"
+                    for number, letter in sorted(key.items()) if answers.get(number) != letter]
+        correct = len(key) - len(mistakes)
+        if len(key) == 1:
+            feedback = (f"Correct: {key[1]}." if correct else
+                        f"Incorrect: the answer is {key[1]}, not {answers.get(1, 'blank')}.")
+        else:
+            feedback = f"{correct} of {len(key)} multiple-choice answers correct."
+        return self._result("mcq", max_score * correct / len(key), max_score, feedback, mistakes)
+
+    def _grade_numeric(self, student_answer: str, correct_answer: str, max_score: int) -> Optional[Dict]:
+        key = parse_numeric(correct_answer)
+        if key is None:
+            return None
+        answer = parse_numeric(student_answer)
+        if answer is None:
+            return None
+        key_value, key_unit, key_variable = key
+        value, unit, variable = answer
+        # Different units or variables may still be right (a conversion, a
+        # renamed unknown); leave those to the LLM
+        if unit != key_unit or (variable and key_variable and variable != key_variable):
+            return None
+
+        if abs(value - key_value) <= self._numeric_tolerance(student_answer, correct_answer, key_value):
+            return self._result("numeric", max_score, max_score, f"Correct: {student_answer.strip()}.")
+        return self._result("numeric", 0, max_score,
+                            f"Incorrect: expected {correct_answer.strip()}, got {student_answer.strip()}.",
+                            [f"Answered {student_answer.strip()} instead of {correct_answer.strip()}"])
+
+    def _numeric_tolerance(self, student_answer: str, correct_answer: str, key_value: float) -> float:
+        """Largest difference from the key still graded as correct"""
+        tolerance = max(self.absolute_tolerance, self.numeric_tolerance * abs(key_value))
+        places = decimal_places(correct_answer)
+        if places is None:
+            # A fraction or exponent key is exact; accept it rounded to two
+            # or more decimal places
+            places = decimal_places(student_answer)
+            if places is None or places < 2:
+                return tolerance
+        elif places == 0:
+            return tolerance
+        return max(tolerance, 0.5 * 10 ** -places + self.absolute_tolerance)
+
+    def _grade_text(self, student_answer: str, correct_answer: str, max_score: int) -> Optional[Dict]:
+        key = normalize_text(correct_answer)
+        # Option keys are the MCQ rules' call: folding articles would make
+        # "A, B" read as "b"
+        if not key or len(key.split()) > self.max_text_words or parse_options(correct_answer):
+            return None
+        answer = normalize_text(student_answer)
+        if answer == key:
+            return self._result("exact", max_score, max_score, "Correct.")
+        return None
+
+    def get_stats(self) -> Dict:
+        """Answers graded by each tier, escalations and mean local microseconds"""
+        with self._lock:
+            stats = dict(self._stats)
+        local = sum(stats[tier] for tier in TIERS)
+        total = local + stats["escalated"]
+        stats["local"] = local
+        stats["local_rate"] = round(local / total, 3) if total else 0.0
+        stats["avg_local_us"] = round(stats.pop("local_ns") / local / 1000, 1) if local else 0.0
+        return stats
+
+
+if __name__ == "__main__":
+    grader = ObjectiveGrader()
+    examples = [
+        ("B", "b) Mitochondria"),
+        ("1. A 2. C 3. B", "1-A, 2-D, 3-B"),
+        ("x = 4", "x=4.0"),
+        ("28.3 cm^2", "28.27 cm2"),
+        ("3/4", "0.75"),
+        ("Photosynthesis", "photosynthesis"),
+        ("absorption", "adsorption"),
+        ("A. Lincoln", "A. Johnson"),
+        ("Explain why the sky is blue", "Rayleigh scattering of sunlight"),
+    ]
+    for key, answer in examples:
+        result = grader.grade(answer, key)
+        print(f"{key!r:28} {answer!r:28} -> "
+              f"{'escalate' if result is None else (result['grading_tier'], result['score'])}")
+    print(grader.get_stats())
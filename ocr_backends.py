@@ -0,0 +1,355 @@
+"""
+OCR backends for AssessmentGradingAssistant
+GeminiOCRBackend sends each image to Gemini Vision (the original
+behaviour). LocalOCRBackend runs easyocr or Tesseract on the CPU in a pool
+of worker processes, each loading the model once, so a stack of scanned
+worksheets can be read offline without per-image API latency.
+"""
+
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from ocr_cache import OCRCache
+
+VISION_MODEL_NAME = "gemini-2.5-flash"
+OCR_PROMPT = """Please extract all the text from this image. 
+                This appears to be student homework or an assignment.
+                Return ONLY the text content you see, preserving the structure and formatting as much as possible.
+                Do not add any commentary or explanation."""
+
+# Encoded formats Gemini accepts as-is, by leading magic bytes
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+]
+
+
+def image_mime_type(data: bytes) -> Optional[str]:
+    """MIME type of encoded image bytes Gemini can take directly, else None"""
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def read_image_bytes(image) -> Optional[bytes]:
+    """Encoded bytes of image (path, bytes or file-like), or None for a PIL image"""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return bytes(image)
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, "rb") as f:
+            return f.read()
+    if hasattr(image, "getvalue"):
+        # BytesIO and Streamlit uploads: the whole buffer, wherever it was left
+        return image.getvalue()
+    if hasattr(image, "read"):
+        return image.read()
+    return None
+
+
+def encode_image(image) -> bytes:
+    """Encoded bytes of image; PIL images are saved as PNG"""
+    data = read_image_bytes(image)
+    if data is None:
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        data = buffer.getvalue()
+    return data
+
+
+@contextmanager
+def vision_image_part(image) -> Iterator:
+    """Yield image as a content part for the Gemini vision model
+
+    image may be a file path, bytes, a file-like object or a PIL image.
+    PNG, JPEG and WEBP bytes are sent as they are, with no decode or
+    re-encode; other formats are opened with PIL and closed afterwards.
+    """
+    data = read_image_bytes(image)
+    if data is None:
+        yield image
+        return
+
+    mime_type = image_mime_type(data)
+    if mime_type:
+        yield {"mime_type": mime_type, "data": data}
+        return
+
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as img:
+        yield img
+
+
+class OCRBackend:
+    """Common interface: extract_text() for one image, extract_batch() for many
+
+    Images may be file paths, bytes, file-like objects or PIL images.
+    Failures never raise; the text returned for that image starts with
+    "Error" instead, like the rest of the grading assistant.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"images": 0, "batches": 0, "errors": 0, "seconds": 0.0}
+
+    @property
+    def cache_namespace(self) -> str:
+        """OCRCache namespace for this backend's results"""
+        return OCRCache.make_namespace(self.name, OCR_PROMPT)
+
+    def extract_text(self, image) -> str:
+        return self.extract_batch([image])[0]
+
+    async def aextract_text(self, image) -> str:
+        return await asyncio.to_thread(self.extract_text, image)
+
+    def extract_batch(self, images: Sequence) -> List[str]:
+        raise NotImplementedError
+
+    def close(self):
+        """Release workers or connections held by the backend"""
+
+    def _record(self, start: float, texts: List[str], batch: bool = False):
+        with self._lock:
+            self._stats["images"] += len(texts)
+            self._stats["batches"] += batch
+            self._stats["errors"] += sum(text.startswith("Error") for text in texts)
+            self._stats["seconds"] += time.perf_counter() - start
+
+    def get_stats(self) -> Dict:
+        """Images read, errors and throughput in images per second"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["backend"] = self.name
+        stats["images_per_second"] = round(stats["images"] / stats["seconds"], 2) if stats["seconds"] else 0.0
+        stats["seconds"] = round(stats["seconds"], 3)
+        return stats
+
+
+class GeminiOCRBackend(OCRBackend):
+    """Gemini Vision over the network; batches run as concurrent requests"""
+
+    name = VISION_MODEL_NAME
+
+    def __init__(self, api_key: Optional[str] = None, max_workers: int = 8):
+        super().__init__()
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.max_workers = max_workers
+        # Gemini (and its heavy SDK import) is set up on first use
+        self._vision_model = None
+
+    @property
+    def vision_model(self):
+        """Gemini vision model, created on first use; None without an API key"""
+        if self._vision_model is None and self.api_key:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._vision_model = genai.GenerativeModel(VISION_MODEL_NAME)
+        return self._vision_model
+
+    def _call(self, image) -> str:
+        try:
+            if not self.vision_model:
+                return "Error: Gemini API key not configured"
+            with vision_image_part(image) as part:
+                response = self.vision_model.generate_content([OCR_PROMPT, part])
+            return response.text.strip()
+        except Exception as e:
+            return f"Error extracting text with Gemini Vision: {str(e)}"
+
+    def extract_text(self, image) -> str:
+        start = time.perf_counter()
+        text = self._call(image)
+        self._record(start, [text])
+        return text
+
+    async def aextract_text(self, image) -> str:
+        start = time.perf_counter()
+        try:
+            if not self.vision_model:
+                text = "Error: Gemini API key not configured"
+            else:
+                with vision_image_part(image) as part:
+                    response = await self.vision_model.generate_content_async([OCR_PROMPT, part])
+                text = response.text.strip()
+        except Exception as e:
+            text = f"Error extracting text with Gemini Vision: {str(e)}"
+        self._record(start, [text])
+        return text
+
+    def extract_batch(self, images: Sequence) -> List[str]:
+        start = time.perf_counter()
+        if not images:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(images)))) as executor:
+            texts = list(executor.map(self._call, images))
+        self._record(start, texts, batch=True)
+        return texts
+
+
+# Model loaded by LocalOCRBackend's initializer, one per worker process
+_worker_engine = None
+_worker_reader = None
+
+
+def _load_local_engine(engine: str, languages: Sequence[str]):
+    """Load engine's model into this (worker) process"""
+    global _worker_engine, _worker_reader
+    _worker_engine = engine
+    if engine == "easyocr":
+        import easyocr
+        _worker_reader = easyocr.Reader(list(languages), gpu=False, verbose=False)
+    elif engine == "tesseract":
+        import pytesseract
+        _worker_reader = pytesseract
+    else:
+        raise ValueError(f"Unknown local OCR engine '{engine}'")
+
+
+def _local_ocr(data: bytes) -> str:
+    """OCR one encoded image with the worker's model"""
+    try:
+        if _worker_engine == "easyocr":
+            return "\n".join(_worker_reader.readtext(data, detail=0, paragraph=True)).strip()
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as img:
+            return _worker_reader.image_to_string(img).strip()
+    except Exception as e:
+        return f"Error extracting text with {_worker_engine}: {str(e)}"
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+class LocalOCRBackend(OCRBackend):
+    """easyocr or Tesseract in a pool of worker processes
+
+    Each worker loads the model once when it starts, so only the first
+    image per worker pays the load time. The pool is created on first use
+    and kept until close().
+    """
+
+    def __init__(self, engine: str = "easyocr", workers: Optional[int] = None,
+                 languages: Sequence[str] = ("en",), chunksize: int = 1):
+        """Configure the pool
+
+        engine is "easyocr" or "tesseract". workers defaults to the number
+        of CPUs; each easyocr worker holds its own copy of the model (a few
+        hundred MB), so lower it on small machines. chunksize images are
+        sent to a worker at a time by extract_batch.
+        """
+        super().__init__()
+        if engine not in ("easyocr", "tesseract"):
+            raise ValueError(f"Unknown local OCR engine '{engine}'. Choose from: easyocr, tesseract")
+        self.engine = engine
+        self.name = f"local-{engine}"
+        self.workers = workers or os.cpu_count() or 1
+        self.languages = tuple(languages)
+        self.chunksize = chunksize
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.load_seconds = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # Spawn rather than fork: torch and Streamlit's threads do not
+                # survive a fork of a running process
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_load_local_engine,
+                    initargs=(self.engine, self.languages),
+                )
+            return self._pool
+
+    def warm_up(self) -> float:
+        """Start every worker and load its model; returns the seconds taken"""
+        start = time.perf_counter()
+        futures = [self.pool.submit(_worker_ready) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+        self.load_seconds = time.perf_counter() - start
+        return self.load_seconds
+
+    def extract_text(self, image) -> str:
+        start = time.perf_counter()
+        try:
+            text = self.pool.submit(_local_ocr, encode_image(image)).result()
+        except Exception as e:
+            text = self._failure(e, 1)[0]
+        self._record(start, [text])
+        return text
+
+    async def aextract_text(self, image) -> str:
+        start = time.perf_counter()
+        try:
+            text = await asyncio.wrap_future(self.pool.submit(_local_ocr, encode_image(image)))
+        except Exception as e:
+            text = self._failure(e, 1)[0]
+        self._record(start, [text])
+        return text
+
+    def extract_batch(self, images: Sequence) -> List[str]:
+        start = time.perf_counter()
+        if not images:
+            return []
+        try:
+            texts = list(self.pool.map(_local_ocr, [encode_image(image) for image in images],
+                                       chunksize=self.chunksize))
+        except Exception as e:
+            texts = self._failure(e, len(images))
+        self._record(start, texts, batch=True)
+        return texts
+
+    def _failure(self, error: Exception, count: int) -> List[str]:
+        if isinstance(error, BrokenProcessPool):
+            # A worker died or could not load the model (e.g. engine not
+            # installed); start a fresh pool on the next call
+            self.close()
+        return [f"Error extracting text with {self.engine}: {str(error)}"] * count
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+OCR_BACKENDS = {
+    "gemini": GeminiOCRBackend,
+    "easyocr": partial(LocalOCRBackend, "easyocr"),
+    "tesseract": partial(LocalOCRBackend, "tesseract"),
+}
+
+
+def create_ocr_backend(backend: str = "gemini", **options) -> OCRBackend:
+    """Build an OCR backend by name ("gemini", "easyocr" or "tesseract")"""
+    if backend not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR backend '{backend}'. Choose from: {', '.join(OCR_BACKENDS)}")
+    return OCR_BACKENDS[backend](**options)
+
+
+def ocr_backend_from_env(gemini_api_key: Optional[str] = None) -> OCRBackend:
+    """Backend named by OCR_BACKEND (default gemini); OCR_WORKERS sets the
+    local pool size"""
+    backend = os.getenv("OCR_BACKEND", "gemini")
+    if backend == "gemini":
+        return create_ocr_backend(backend, api_key=gemini_api_key)
+    workers = os.getenv("OCR_WORKERS")
+    return create_ocr_backend(backend, workers=int(workers) if workers else None)
@@ -0,0 +1,203 @@
+"""
+Cache for OCR results
+Keys extracted text on a SHA-256 digest of the pre-processed image, so a
+resubmitted photo or a re-run after a rubric change reuses the earlier OCR
+instead of calling the vision model again. Matching re-compressed copies on
+a difference hash (dHash) is opt-in: printed worksheets filled in by
+different students can have identical hashes. Two tiers like ResponseCache:
+an in-memory index of every entry and an on-disk SQLite store under data/.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+def image_digest(image) -> str:
+    """SHA-256 hex digest of a pixel array, encoded image bytes or a PIL image"""
+    digest = hashlib.sha256()
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        digest.update(image)
+    else:
+        pixels = np.ascontiguousarray(image if isinstance(image, np.ndarray) else np.asarray(image))
+        digest.update(f"{pixels.shape}{pixels.dtype}".encode("ascii"))
+        digest.update(pixels.tobytes())
+    return digest.hexdigest()
+
+
+def image_dhash(image, hash_size: int = 16) -> int:
+    """Difference hash of image as a hash_size**2-bit integer
+
+    image is a grayscale or BGR pixel array, encoded image bytes or a PIL
+    image. Each bit says whether a cell of a (hash_size + 1) x hash_size
+    thumbnail is brighter than its right-hand neighbour, so re-compression
+    flips only a few bits.
+    """
+    import cv2
+
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        pixels = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if pixels is None:
+            raise ValueError("Could not decode image for hashing")
+    elif isinstance(image, np.ndarray):
+        pixels = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    else:
+        pixels = np.asarray(image.convert("L"))
+
+    thumbnail = cv2.resize(pixels, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class OCRCache:
+    def __init__(self, data_dir: str = "data", near_duplicates: bool = False, max_distance: int = 4,
+                 max_entries: int = 5000, use_disk: bool = True):
+        """Initialize the OCR cache
+
+        A lookup hits when the same namespace (OCR model and prompt) holds
+        the query's exact digest. With near_duplicates, a miss falls back to
+        the stored entry whose perceptual hash is within max_distance of the
+        query's 256 bits, which also catches re-compressed copies. Leave it
+        off for class sets: two students' copies of the same printed
+        worksheet can hash identically, and returning another student's
+        text is far worse than a repeat OCR call. The least recently used
+        entries are dropped once there are more than max_entries.
+        """
+        self.near_duplicates = near_duplicates
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (namespace, digest) -> entry
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "near_hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+        self._db = None
+        if use_disk:
+            self.data_dir = Path(data_dir)
+            self.data_dir.mkdir(exist_ok=True)
+            self.db_path = self.data_dir / "ocr_cache.sqlite3"
+            self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS ocr_texts (
+                    namespace TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    phash TEXT,
+                    text TEXT NOT NULL,
+                    latency REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, digest)
+                )"""
+            )
+            self._db.commit()
+            self._load()
+
+    @staticmethod
+    def make_namespace(model: str, prompt: str) -> str:
+        """Namespace for results of one OCR model and prompt"""
+        return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+
+    def _load(self):
+        """Index every stored entry in memory, least recently used first"""
+        rows = self._db.execute(
+            "SELECT namespace, digest, phash, text, latency FROM ocr_texts ORDER BY accessed_at ASC"
+        ).fetchall()
+        for namespace, digest, phash, text, latency in rows:
+            self._entries[(namespace, digest)] = {
+                "text": text, "latency": latency, "phash": int(phash, 16) if phash else None
+            }
+
+    def _nearest(self, phash: int, namespace: str) -> Tuple[Optional[Tuple[str, str]], int]:
+        """Key of the entry in namespace with the closest perceptual hash, and its distance"""
+        best_key, best_distance = None, self.max_distance + 1
+        for key, entry in self._entries.items():
+            if key[0] != namespace or entry["phash"] is None:
+                continue
+            distance = hamming_distance(phash, entry["phash"])
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+                if distance == 0:
+                    break
+        return best_key, best_distance
+
+    def get(self, digest: str, namespace: str = "", phash: Optional[int] = None) -> Optional[Dict]:
+        """Return the entry for digest, or None
+
+        With near_duplicates and a phash, a missing digest falls back to the
+        nearest perceptual hash within max_distance. The entry is a dict
+        with the OCR "text", the "latency" of the original call and the
+        Hamming "distance" to the query (0 for an exact hit).
+        """
+        with self._lock:
+            key = (namespace, digest)
+            distance = 0
+            if key not in self._entries:
+                key = None
+                if self.near_duplicates and phash is not None:
+                    key, distance = self._nearest(phash, namespace)
+            if key is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            entry = self._entries[key]
+            self._stats["exact_hits" if key[1] == digest else "near_hits"] += 1
+            self._stats["saved_seconds"] += entry["latency"]
+            if self._db is not None:
+                self._db.execute(
+                    "UPDATE ocr_texts SET accessed_at = ? WHERE namespace = ? AND digest = ?",
+                    (time.time(), key[0], key[1])
+                )
+                self._db.commit()
+            return {"text": entry["text"], "latency": entry["latency"], "distance": distance}
+
+    def set(self, digest: str, text: str, latency: float = 0.0, namespace: str = "",
+            phash: Optional[int] = None):
+        """Store OCR text for digest (and its perceptual hash, if given) in both tiers"""
+        now = time.time()
+        with self._lock:
+            key = (namespace, digest)
+            self._entries[key] = {"text": text, "latency": latency, "phash": phash}
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+
+            if self._db is not None:
+                self._db.execute(
+                    """INSERT OR REPLACE INTO ocr_texts
+                       (namespace, digest, phash, text, latency, created_at, accessed_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (namespace, digest, f"{phash:x}" if phash is not None else None, text, latency, now, now)
+                )
+                self._db.executemany("DELETE FROM ocr_texts WHERE namespace = ? AND digest = ?", evicted)
+                self._db.commit()
+
+    def clear(self):
+        """Drop every cached OCR result from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM ocr_texts")
+                self._db.commit()
+
+    def get_stats(self) -> Dict:
+        """Exact and near-duplicate hits, misses and the OCR time they saved"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        hits = stats["exact_hits"] + stats["near_hits"]
+        lookups = hits + stats["misses"]
+        stats["hits"] = hits
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        stats["saved_seconds"] = round(stats["saved_seconds"], 2)
+        return stats
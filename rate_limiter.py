@@ -0,0 +1,266 @@
+"""
+Client-side rate limiting for LLM calls
+Token buckets for requests per minute and tokens per minute, a concurrency
+cap per feature, and priority lanes so interactive calls go ahead of
+background batch jobs. Threads and asyncio tasks share the same limits.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Optional
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """Bucket refilled continuously at per_minute / 60 units per second
+
+        burst is the bucket size (defaults to one minute's worth). The level
+        may go negative when a call turns out to cost more than estimated;
+        later callers then wait until it is paid back. clock returns
+        seconds (replaceable in tests).
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken (0 if available now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def pause(self, seconds: float):
+        """Drain the bucket so nothing is taken for roughly seconds"""
+        self._refill()
+        self.level = min(self.level, -seconds * self.rate)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 feature_concurrency: Optional[Dict[str, int]] = None,
+                 default_concurrency: int = 8, clock: Callable[[], float] = time.monotonic):
+        """Govern LLM calls across all engines in the process
+
+        requests_per_minute / tokens_per_minute of None mean unlimited.
+        feature_concurrency caps in-flight calls per feature name (e.g.
+        {"batch_grading": 4}); other features get default_concurrency.
+        Waiting calls are admitted in priority order (lower value first, so
+        PRIORITY_INTERACTIVE beats PRIORITY_BATCH), then first come first served.
+        clock is used for refills and wait statistics (replaceable in tests).
+        """
+        self._clock = clock
+        self.request_bucket = TokenBucket(requests_per_minute, clock=clock) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, clock=clock) if tokens_per_minute else None
+        self.feature_concurrency = dict(feature_concurrency or {})
+        self.default_concurrency = default_concurrency
+
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._in_flight = {}
+        self._async_waiters = {}
+        self._stats = {"admitted": 0, "waited": 0, "wait_seconds": 0.0}
+        self._lane_wait_seconds = {}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """Build a limiter from LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+        LLM_MAX_CONCURRENCY and LLM_BATCH_CONCURRENCY (unset means unlimited
+        rates, 8 concurrent calls per feature and 4 for batch grading)"""
+        rpm = os.getenv("LLM_REQUESTS_PER_MINUTE")
+        tpm = os.getenv("LLM_TOKENS_PER_MINUTE")
+        return cls(
+            requests_per_minute=float(rpm) if rpm else None,
+            tokens_per_minute=float(tpm) if tpm else None,
+            feature_concurrency={"batch_grading": int(os.getenv("LLM_BATCH_CONCURRENCY", "4"))},
+            default_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        )
+
+    def _limit_for(self, feature: str) -> int:
+        return self.feature_concurrency.get(feature, self.default_concurrency)
+
+    def _bucket_wait(self, tokens: float) -> float:
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.wait_time(1))
+        if self.token_bucket:
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        return wait
+
+    def _has_slot(self, feature: str) -> bool:
+        return self._in_flight.get(feature, 0) < self._limit_for(feature)
+
+    def _next_entry(self):
+        """The highest-priority waiter whose feature has a free slot"""
+        if not self._waiting:
+            return None
+        if self._has_slot(self._waiting[0][2]):
+            return self._waiting[0]
+        for waiting in sorted(self._waiting):
+            if self._has_slot(waiting[2]):
+                return waiting
+        return None
+
+    def _wake(self):
+        """Wake whoever may be admitted next (call with the lock held)"""
+        self._cond.notify_all()
+        waiter = self._async_waiters.get(self._next_entry())
+        if waiter is not None:
+            loop, event = waiter
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # the waiter's event loop is closed
+
+    def _dequeue(self, entry):
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        self._async_waiters.pop(entry, None)
+
+    def _admit(self, entry, estimated_tokens: float, start: float) -> float:
+        """Take the call's budget and slot (call with the lock held)"""
+        priority, _, feature = entry
+        self._dequeue(entry)
+        if self.request_bucket:
+            self.request_bucket.take(1)
+        if self.token_bucket:
+            self.token_bucket.take(estimated_tokens)
+        self._in_flight[feature] = self._in_flight.get(feature, 0) + 1
+
+        waited = self._clock() - start
+        self._stats["admitted"] += 1
+        if waited > 0.001:
+            self._stats["waited"] += 1
+            self._stats["wait_seconds"] += waited
+            self._lane_wait_seconds[priority] = self._lane_wait_seconds.get(priority, 0.0) + waited
+        self._wake()
+        return waited
+
+    def acquire(self, feature: str = "default", priority: int = PRIORITY_INTERACTIVE,
+                estimated_tokens: float = 0) -> float:
+        """Block until the call may start; returns the seconds spent waiting"""
+        start = self._clock()
+        with self._cond:
+            entry = (priority, next(self._sequence), feature)
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    timeout = None
+                    if self._next_entry() is entry:
+                        timeout = self._bucket_wait(estimated_tokens)
+                        if timeout <= 0:
+                            return self._admit(entry, estimated_tokens, start)
+                    self._cond.wait(timeout)
+            except BaseException:
+                self._dequeue(entry)
+                self._wake()
+                raise
+
+    async def aacquire(self, feature: str = "default", priority: int = PRIORITY_INTERACTIVE,
+                       estimated_tokens: float = 0) -> float:
+        """acquire() for asyncio code: waits without blocking the event loop"""
+        start = self._clock()
+        event = asyncio.Event()
+        with self._cond:
+            entry = (priority, next(self._sequence), feature)
+            heapq.heappush(self._waiting, entry)
+            self._async_waiters[entry] = (asyncio.get_running_loop(), event)
+        try:
+            while True:
+                with self._cond:
+                    timeout = None
+                    if self._next_entry() is entry:
+                        timeout = self._bucket_wait(estimated_tokens)
+                        if timeout <= 0:
+                            return self._admit(entry, estimated_tokens, start)
+                try:
+                    await asyncio.wait_for(event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        except BaseException:
+            with self._cond:
+                if entry in self._async_waiters:
+                    self._dequeue(entry)
+                    self._wake()
+            raise
+
+    def release(self, feature: str = "default", estimated_tokens: float = 0,
+                actual_tokens: Optional[float] = None):
+        """Finish a call, charging the token bucket for any underestimate"""
+        with self._cond:
+            self._in_flight[feature] = max(0, self._in_flight.get(feature, 0) - 1)
+            if self.token_bucket and actual_tokens is not None:
+                self.token_bucket.take(actual_tokens - estimated_tokens)
+            self._wake()
+
+    def pause(self, seconds: float):
+        """Hold back new calls, e.g. after the provider answered 429"""
+        with self._cond:
+            if self.request_bucket:
+                self.request_bucket.pause(seconds)
+            if self.token_bucket:
+                self.token_bucket.pause(seconds)
+            self._wake()
+
+    @contextmanager
+    def limit(self, feature: str = "default", priority: int = PRIORITY_INTERACTIVE,
+              estimated_tokens: float = 0):
+        """Context manager around acquire()/release(); yields a dict where the
+        caller can set "actual_tokens" once the response usage is known"""
+        self.acquire(feature, priority, estimated_tokens)
+        usage = {"actual_tokens": None}
+        try:
+            yield usage
+        finally:
+            self.release(feature, estimated_tokens, usage["actual_tokens"])
+
+    @asynccontextmanager
+    async def alimit(self, feature: str = "default", priority: int = PRIORITY_INTERACTIVE,
+                     estimated_tokens: float = 0):
+        """Async counterpart of limit()"""
+        await self.aacquire(feature, priority, estimated_tokens)
+        usage = {"actual_tokens": None}
+        try:
+            yield usage
+        finally:
+            self.release(feature, estimated_tokens, usage["actual_tokens"])
+
+    def get_stats(self) -> Dict:
+        """Admission counts, wait time per priority lane and calls in flight"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+            stats["lane_wait_seconds"] = {lane: round(s, 3) for lane, s in self._lane_wait_seconds.items()}
+            stats["in_flight"] = {f: n for f, n in self._in_flight.items() if n}
+            stats["queued"] = len(self._waiting)
+        return stats
+
+
+def estimate_tokens(messages, max_tokens: Optional[int] = None) -> int:
+    """Rough token cost of a request: ~4 characters per prompt token plus the completion budget"""
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in messages or [])
+    return prompt_chars // 4 + (max_tokens or 0)
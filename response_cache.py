@@ -0,0 +1,236 @@
+"""
+Content-addressed cache for LLM responses
+Two tiers: an in-memory LRU and an on-disk SQLite store under data/
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class ResponseCache:
+    def __init__(self, data_dir: str = "data", max_memory_entries: int = 256,
+                 max_disk_entries: int = 5000, ttl_seconds: Optional[float] = 7 * 24 * 3600,
+                 use_disk: bool = True):
+        """Initialize the response cache
+
+        Entries are keyed on a hash of (model, system prompt, user prompt,
+        temperature, max_tokens). Entries older than ttl_seconds are treated
+        as misses; each tier evicts least recently used entries once it holds
+        more than its maximum.
+        """
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "saved_seconds": 0.0,
+            "saved_tokens": 0
+        }
+
+        self._db = None
+        if use_disk:
+            self.data_dir = Path(data_dir)
+            self.data_dir.mkdir(exist_ok=True)
+            self.db_path = self.data_dir / "response_cache.sqlite3"
+            self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_prompt: str,
+                 temperature: float, max_tokens: int) -> str:
+        """Build the content address for a completion request"""
+        payload = json.dumps([model, system_prompt, user_prompt, temperature, max_tokens],
+                             ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached entry for key, or None on a miss
+
+        An entry is a dict with the response "text", plus the "latency" and
+        "tokens" the original call cost.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._is_expired(entry["created_at"]):
+                    del self._memory[key]
+                else:
+                    self._memory.move_to_end(key)
+                    self._record_hit("memory_hits", entry)
+                    return entry
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if self._is_expired(row[1]):
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        self._db.commit()
+                    else:
+                        entry = json.loads(row[0])
+                        entry["created_at"] = row[1]
+                        self._db.execute(
+                            "UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key)
+                        )
+                        self._db.commit()
+                        self._remember(key, entry)
+                        self._record_hit("disk_hits", entry)
+                        return entry
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, text: str, latency: float = 0.0, tokens: int = 0):
+        """Store a response in both tiers"""
+        now = time.time()
+        entry = {"text": text, "latency": latency, "tokens": tokens, "created_at": now}
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                value = json.dumps({"text": text, "latency": latency, "tokens": tokens})
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                self._evict_disk()
+                self._db.commit()
+
+    def delete(self, key: str):
+        """Drop key from both tiers (e.g. a response that turned out unusable)"""
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+
+    def _remember(self, key: str, entry: Dict):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._db.execute(
+                """DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?
+                )""",
+                (count - self.max_disk_entries,)
+            )
+
+    def _record_hit(self, tier: str, entry: Dict):
+        self._stats[tier] += 1
+        self._stats["saved_seconds"] += entry.get("latency", 0.0)
+        self._stats["saved_tokens"] += entry.get("tokens", 0)
+
+    def clear(self):
+        """Drop every cached response from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters plus the latency and tokens saved by hits"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hits"] = hits
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        stats["saved_seconds"] = round(stats["saved_seconds"], 2)
+        return stats
+
+
+def _lookup(cache: Optional[ResponseCache], model: str, system_prompt: str, user_prompt: str,
+            temperature: float, max_tokens: int):
+    """Return (key, cached text or None)"""
+    if cache is None:
+        return None, None
+    key = ResponseCache.make_key(model, system_prompt, user_prompt, temperature, max_tokens)
+    entry = cache.get(key)
+    return key, entry["text"] if entry is not None else None
+
+
+def _store(cache: Optional[ResponseCache], key: Optional[str], response, latency: float) -> str:
+    text = response.choices[0].message.content
+    if cache is not None:
+        usage = getattr(response, "usage", None)
+        tokens = getattr(usage, "total_tokens", 0) or 0
+        cache.set(key, text, latency=latency, tokens=tokens)
+    return text
+
+
+def cached_chat_completion(client, cache: Optional[ResponseCache], model: str,
+                           system_prompt: str, user_prompt: str,
+                           temperature: float, max_tokens: int,
+                           **call_options) -> str:
+    """Run a chat completion through the cache and return the response text
+
+    call_options (e.g. feature, priority) are passed on to the client on a miss.
+    """
+    key, text = _lookup(cache, model, system_prompt, user_prompt, temperature, max_tokens)
+    if text is not None:
+        return text
+
+    start = time.perf_counter()
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **call_options
+    )
+    return _store(cache, key, response, time.perf_counter() - start)
+
+
+async def acached_chat_completion(client, cache: Optional[ResponseCache], model: str,
+                                  system_prompt: str, user_prompt: str,
+                                  temperature: float, max_tokens: int,
+                                  **call_options) -> str:
+    """Async counterpart of cached_chat_completion (client must provide
+    chat.completions.acreate, as LLMGateway does)"""
+    key, text = _lookup(cache, model, system_prompt, user_prompt, temperature, max_tokens)
+    if text is not None:
+        return text
+
+    start = time.perf_counter()
+    response = await client.chat.completions.acreate(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **call_options
+    )
+    return _store(cache, key, response, time.perf_counter() - start)
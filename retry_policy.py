@@ -0,0 +1,279 @@
+"""
+Retry policy for LLM calls
+Jittered exponential backoff for transient errors (429, 5xx, timeouts,
+dropped connections), a deadline budget per call, and optional hedged
+requests: when an attempt runs longer than the recent p95 latency, a
+duplicate is sent and whichever answers first wins. call() runs attempts
+in threads, acall() runs them as asyncio tasks.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Optional
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# groq and httpx exception classes for timeouts and dropped connections
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "TimeoutException", "NetworkError"}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call's deadline budget ran out before an attempt succeeded"""
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 8.0,
+                 deadline: Optional[float] = 60.0, hedge: bool = True,
+                 hedge_min_samples: int = 20, hedge_min_delay: float = 0.5,
+                 latency_window: int = 200, max_hedge_workers: int = 32,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        """Configure retries and hedging
+
+        Attempt n (from 0) is retried after a random delay in
+        [0, min(max_delay, base_delay * 2**n)], or after the server's
+        Retry-After when that is longer. deadline bounds the whole call,
+        waits included (None means no budget). With hedge on, calls that
+        ask for it get a duplicate request once an attempt outlives the
+        p95 latency of the last latency_window calls for the same feature
+        (needs hedge_min_samples first, never sooner than hedge_min_delay).
+        clock and sleep (used for deadlines and the sync backoff waits) are
+        replaceable in tests.
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.latency_window = latency_window
+        self.max_hedge_workers = max_hedge_workers
+        self._clock = clock
+        self._sleep = sleep
+
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._executor = None
+        self._stats = {
+            "calls": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": 0,
+            "deadline_exceeded": 0,
+            "hedges": 0,
+            "hedge_wins": 0
+        }
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Build a policy from LLM_MAX_ATTEMPTS, LLM_DEADLINE_SECONDS and
+        LLM_HEDGE_REQUESTS (set to 0 to turn hedging off)"""
+        deadline = os.getenv("LLM_DEADLINE_SECONDS")
+        return cls(
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "4")),
+            deadline=float(deadline) if deadline else 60.0,
+            hedge=os.getenv("LLM_HEDGE_REQUESTS", "1") != "0"
+        )
+
+    @staticmethod
+    def status_code(error: Exception) -> Optional[int]:
+        return getattr(error, "status_code", None)
+
+    def is_retryable(self, error: Exception) -> bool:
+        """True for rate limits, server errors, timeouts and connection errors"""
+        status = self.status_code(error)
+        if status is not None:
+            return status in RETRYABLE_STATUS_CODES
+        if isinstance(error, (TimeoutError, ConnectionError)) and not isinstance(error, DeadlineExceeded):
+            return True
+        return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+    @staticmethod
+    def retry_after(error: Exception) -> Optional[float]:
+        """Seconds from the response's Retry-After header, if any"""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential delay before retrying attempt (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def record_latency(self, key: str, seconds: float):
+        with self._lock:
+            window = self._latencies.get(key)
+            if window is None:
+                window = self._latencies[key] = deque(maxlen=self.latency_window)
+            window.append(seconds)
+
+    def p95(self, key: str) -> Optional[float]:
+        """95th percentile latency of recent successful attempts for key"""
+        with self._lock:
+            samples = sorted(self._latencies.get(key, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """How long to wait before hedging, or None when there is too little history"""
+        with self._lock:
+            samples = len(self._latencies.get(key, ()))
+        if not self.hedge or samples < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.p95(key))
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def call(self, attempt: Callable[[Optional[float]], object], key: str = "default",
+             deadline: Optional[float] = None, hedge: bool = False,
+             on_rate_limited: Optional[Callable[[float], None]] = None):
+        """Run attempt(deadline_at) until it succeeds, retrying transient errors
+
+        deadline_at is the clock value (time.monotonic() by default) the
+        attempt must finish by (None when unbounded). deadline overrides the
+        policy's budget for this call. on_rate_limited(seconds) is called on
+        a 429 so a rate limiter can hold back other callers too.
+        """
+        self._count("calls")
+        budget = self.deadline if deadline is None else deadline
+        deadline_at = self._clock() + budget if budget else None
+
+        attempt_number = 0
+        while True:
+            try:
+                return self._run_attempt(attempt, key, deadline_at, hedge)
+            except Exception as e:
+                attempt_number += 1
+                self._sleep(self._retry_delay(e, attempt_number, deadline_at, budget, on_rate_limited))
+
+    async def acall(self, attempt: Callable[[Optional[float]], Awaitable], key: str = "default",
+                    deadline: Optional[float] = None, hedge: bool = False,
+                    on_rate_limited: Optional[Callable[[float], None]] = None):
+        """Async counterpart of call(); attempt(deadline_at) returns an awaitable"""
+        self._count("calls")
+        budget = self.deadline if deadline is None else deadline
+        deadline_at = self._clock() + budget if budget else None
+
+        attempt_number = 0
+        while True:
+            try:
+                return await self._arun_attempt(attempt, key, deadline_at, hedge)
+            except Exception as e:
+                attempt_number += 1
+                await asyncio.sleep(self._retry_delay(e, attempt_number, deadline_at, budget, on_rate_limited))
+
+    def _retry_delay(self, error: Exception, attempt_number: int, deadline_at: Optional[float],
+                     budget: Optional[float], on_rate_limited) -> float:
+        """Seconds to wait before the next attempt; raises error when giving up"""
+        if not self.is_retryable(error) or attempt_number >= self.max_attempts:
+            self._count("failures")
+            raise error
+
+        delay = self.backoff(attempt_number - 1)
+        if self.status_code(error) == 429:
+            self._count("rate_limited")
+            delay = max(delay, self.retry_after(error) or 0.0)
+            if on_rate_limited:
+                on_rate_limited(delay)
+
+        if deadline_at is not None and self._clock() + delay >= deadline_at:
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(f"Deadline of {budget}s exceeded after {attempt_number} attempts: {error}") from error
+        self._count("retries")
+        return delay
+
+    def _timed(self, attempt, key: str, deadline_at: Optional[float]):
+        start = self._clock()
+        result = attempt(deadline_at)
+        self.record_latency(key, self._clock() - start)
+        return result
+
+    def _run_attempt(self, attempt, key: str, deadline_at: Optional[float], hedge: bool):
+        delay = self.hedge_delay(key) if hedge else None
+        if delay is not None and deadline_at is not None and self._clock() + delay >= deadline_at:
+            delay = None
+        if delay is None:
+            return self._timed(attempt, key, deadline_at)
+
+        executor = self._get_executor()
+        primary = executor.submit(self._timed, attempt, key, deadline_at)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        # The primary is slower than p95: race a duplicate against it. The
+        # loser keeps running in the background and its result is dropped.
+        self._count("hedges")
+        backup = executor.submit(self._timed, attempt, key, deadline_at)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _atimed(self, attempt, key: str, deadline_at: Optional[float]):
+        start = self._clock()
+        result = await attempt(deadline_at)
+        self.record_latency(key, self._clock() - start)
+        return result
+
+    async def _arun_attempt(self, attempt, key: str, deadline_at: Optional[float], hedge: bool):
+        delay = self.hedge_delay(key) if hedge else None
+        if delay is not None and deadline_at is not None and self._clock() + delay >= deadline_at:
+            delay = None
+        if delay is None:
+            return await self._atimed(attempt, key, deadline_at)
+
+        primary = asyncio.ensure_future(self._atimed(attempt, key, deadline_at))
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        # Unlike threads, the losing task can be cancelled
+        self._count("hedges")
+        backup = asyncio.ensure_future(self._atimed(attempt, key, deadline_at))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is backup:
+                            self._count("hedge_wins")
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_hedge_workers,
+                                                    thread_name_prefix="llm-hedge")
+            return self._executor
+
+    def get_stats(self) -> Dict:
+        """Retry, rate-limit, deadline and hedging counters plus p95 per feature"""
+        with self._lock:
+            stats = dict(self._stats)
+            keys = list(self._latencies)
+        stats["p95_seconds"] = {key: round(self.p95(key), 3) for key in keys}
+        return stats
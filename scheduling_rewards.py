@@ -5,15 +5,20 @@ AI analyzes schedules for conflicts, suggests optimal times, and personalizes re
 
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import json
 from pathlib import Path
-from groq import Groq
+from llm_gateway import LLMGateway, get_gateway
 
 class SchedulingRewardSystem:
-    def __init__(self, groq_api_key: str, data_dir: str = "data", model: str = "llama-3.3-70b-versatile"):
-        """Initialize AI-powered scheduling and reward system"""
-        self.client = Groq(api_key=groq_api_key)
+    def __init__(self, groq_api_key: str, data_dir: str = "data", model: str = "llama-3.3-70b-versatile",
+                 client: Optional[LLMGateway] = None):
+        """Initialize AI-powered scheduling and reward system
+        
+        LLM calls go through client, which defaults to the process-wide
+        pooled LLMGateway.
+        """
+        self.client = client or get_gateway(groq_api_key)
         self.model = model
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
@@ -354,8 +359,19 @@ class SchedulingRewardSystem:
     
     # === AI-POWERED FEATURES ===
     
-    def ai_analyze_schedule_conflicts(self) -> Dict:
-        """Use AI to detect scheduling conflicts and suggest optimizations"""
+    def _ai_request(self, system_prompt: str, prompt: str, temperature: float, max_tokens: int) -> Dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "feature": "scheduling"
+        }
+    
+    def _schedule_conflicts_request(self) -> Dict:
         classes_summary = []
         for cls in self.schedule['classes']:
             classes_summary.append(f"{cls['day']} {cls['start_time']}-{cls['end_time']}: {cls['name']} ({cls['subject']})")
@@ -382,33 +398,42 @@ Provide:
 
 Format as a numbered list."""
         
+        return self._ai_request(
+            "You are an AI scheduling assistant that helps teachers optimize their schedules. Provide clear, actionable insights.",
+            prompt, temperature=0.7, max_tokens=800
+        )
+    
+    def _schedule_conflicts_result(self, analysis: str) -> Dict:
+        return {
+            "status": "success",
+            "analysis": analysis.replace('\n', '<br>'),
+            "total_classes": len(self.schedule['classes']),
+            "pending_assignments": len([a for a in self.schedule['assignments'] if a['status'] == 'pending'])
+        }
+    
+    def ai_analyze_schedule_conflicts(self) -> Dict:
+        """Use AI to detect scheduling conflicts and suggest optimizations"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an AI scheduling assistant that helps teachers optimize their schedules. Provide clear, actionable insights."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=800
-            )
-            
-            analysis = response.choices[0].message.content
-            
+            response = self.client.chat.completions.create(**self._schedule_conflicts_request())
+            return self._schedule_conflicts_result(response.choices[0].message.content)
+        except Exception as e:
             return {
-                "status": "success",
-                "analysis": analysis.replace('\n', '<br>'),
-                "total_classes": len(self.schedule['classes']),
-                "pending_assignments": len([a for a in self.schedule['assignments'] if a['status'] == 'pending'])
+                "status": "error",
+                "analysis": f"Error analyzing schedule: {str(e)}"
             }
+    
+    async def aai_analyze_schedule_conflicts(self) -> Dict:
+        """Async counterpart of ai_analyze_schedule_conflicts"""
+        try:
+            response = await self.client.chat.completions.acreate(**self._schedule_conflicts_request())
+            return self._schedule_conflicts_result(response.choices[0].message.content)
         except Exception as e:
             return {
                 "status": "error",
                 "analysis": f"Error analyzing schedule: {str(e)}"
             }
     
-    def ai_suggest_optimal_time(self, subject: str, duration_minutes: int = 60) -> Dict:
-        """AI suggests best time to schedule a new class based on existing schedule"""
+    def _optimal_time_request(self, subject: str, duration_minutes: int) -> Dict:
         classes_by_day = {}
         for cls in self.schedule['classes']:
             day = cls['day']
@@ -434,33 +459,44 @@ Suggest:
 
 Consider: avoiding back-to-back classes, energy levels throughout the day, and balanced weekly distribution."""
         
+        return self._ai_request(
+            "You are an AI scheduling expert for educators. Suggest optimal times based on cognitive science and work-life balance principles.",
+            prompt, temperature=0.7, max_tokens=500
+        )
+    
+    @staticmethod
+    def _optimal_time_result(suggestion: str, subject: str, duration_minutes: int) -> Dict:
+        return {
+            "status": "success",
+            "suggestion": suggestion.replace('\n', '<br>'),
+            "subject": subject,
+            "duration": duration_minutes
+        }
+    
+    def ai_suggest_optimal_time(self, subject: str, duration_minutes: int = 60) -> Dict:
+        """AI suggests best time to schedule a new class based on existing schedule"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an AI scheduling expert for educators. Suggest optimal times based on cognitive science and work-life balance principles."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=500
-            )
-            
-            suggestion = response.choices[0].message.content
-            
+            response = self.client.chat.completions.create(**self._optimal_time_request(subject, duration_minutes))
+            return self._optimal_time_result(response.choices[0].message.content, subject, duration_minutes)
+        except Exception as e:
             return {
-                "status": "success",
-                "suggestion": suggestion.replace('\n', '<br>'),
-                "subject": subject,
-                "duration": duration_minutes
+                "status": "error",
+                "suggestion": f"Error generating suggestion: {str(e)}"
             }
+    
+    async def aai_suggest_optimal_time(self, subject: str, duration_minutes: int = 60) -> Dict:
+        """Async counterpart of ai_suggest_optimal_time"""
+        try:
+            response = await self.client.chat.completions.acreate(**self._optimal_time_request(subject, duration_minutes))
+            return self._optimal_time_result(response.choices[0].message.content, subject, duration_minutes)
         except Exception as e:
             return {
                 "status": "error",
                 "suggestion": f"Error generating suggestion: {str(e)}"
             }
     
-    def ai_personalized_reward_suggestions(self, user_id: str, user_type: str = "student") -> Dict:
-        """AI analyzes user performance and suggests personalized rewards/motivations"""
+    def _reward_suggestions_request(self, user_id: str, user_type: str) -> Tuple[Dict, Dict]:
+        """Return (chat completion arguments, user profile)"""
         profile = self.get_user_profile(user_id, user_type)
         
         if profile.get('message') == 'User not found':
@@ -494,26 +530,44 @@ Provide:
 
 Be encouraging and specific!"""
         
+        request = self._ai_request(
+            "You are a motivational AI coach for students and teachers. Provide personalized, encouraging feedback.",
+            prompt, temperature=0.8, max_tokens=600
+        )
+        return request, profile
+    
+    @staticmethod
+    def _reward_suggestions_result(recommendations: str, user_id: str, profile: Dict) -> Dict:
+        return {
+            "status": "success",
+            "user_id": user_id,
+            "recommendations": recommendations.replace('\n', '<br>'),
+            "current_points": profile.get('total_points', 0),
+            "badges_count": len(profile.get('badges', []))
+        }
+    
+    def ai_personalized_reward_suggestions(self, user_id: str, user_type: str = "student") -> Dict:
+        """AI analyzes user performance and suggests personalized rewards/motivations"""
+        request, profile = self._reward_suggestions_request(user_id, user_type)
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a motivational AI coach for students and teachers. Provide personalized, encouraging feedback."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.8,
-                max_tokens=600
-            )
-            
-            recommendations = response.choices[0].message.content
-            
+            response = self.client.chat.completions.create(**request)
+            return self._reward_suggestions_result(response.choices[0].message.content, user_id, profile)
+        except Exception as e:
             return {
-                "status": "success",
-                "user_id": user_id,
-                "recommendations": recommendations.replace('\n', '<br>'),
-                "current_points": total_points,
-                "badges_count": badges_earned
+                "status": "error",
+                "recommendations": f"Error generating recommendations: {str(e)}"
             }
+    
+    async def aai_personalized_reward_suggestions(self, user_id: str, user_type: str = "student") -> Dict:
+        """Async counterpart of ai_personalized_reward_suggestions
+        
+        The profile lookup (and the JSON file write for a new user) stays
+        synchronous; it is local and quick next to the LLM call.
+        """
+        request, profile = self._reward_suggestions_request(user_id, user_type)
+        try:
+            response = await self.client.chat.completions.acreate(**request)
+            return self._reward_suggestions_result(response.choices[0].message.content, user_id, profile)
         except Exception as e:
             return {
                 "status": "error",
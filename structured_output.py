@@ -0,0 +1,443 @@
+"""
+Structured output helpers for LLM responses
+Brace-aware JSON extraction, a cheap repair pass and schema validation for
+each response type, with one re-ask of the model when all else fails. Also
+incremental scanning, so items of a JSON array can be used as soon as each
+one closes while the response is still streaming.
+"""
+
+import copy
+import json
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from response_cache import ResponseCache, acached_chat_completion, cached_chat_completion
+
+
+class JSONStreamScanner:
+    def __init__(self, array_key: str):
+        """Scan streamed JSON text for the objects inside the array under array_key
+
+        feed() each chunk as it arrives; it returns the objects of that array
+        which closed within the chunk, already parsed. Braces inside strings
+        are ignored, and text around the JSON (prose, code fences) is skipped.
+        """
+        self.array_key = array_key
+        self.text = ""
+        self._pos = 0
+        self._stack = []  # [bracket, key the container was stored under]
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key = None
+        self._item_start: Optional[int] = None
+        self._item_depth = 0
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Add a chunk of text and return the array items completed by it"""
+        self.text += chunk
+        items = []
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._expect_key:
+                        try:
+                            self._key = json.loads(text[self._string_start:self._pos + 1])
+                        except ValueError:
+                            self._key = None
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch in "{[":
+                parent = self._stack[-1] if self._stack else None
+                key = self._key if parent and parent[0] == "{" else None
+                self._stack.append((ch, key))
+                if (ch == "{" and self._item_start is None and parent
+                        and parent[0] == "[" and parent[1] == self.array_key):
+                    self._item_start = self._pos
+                    self._item_depth = len(self._stack)
+                self._expect_key = ch == "{"
+            elif ch in "}]":
+                if self._stack:
+                    depth = len(self._stack)
+                    self._stack.pop()
+                    if ch == "}" and self._item_start is not None and depth == self._item_depth:
+                        try:
+                            items.append(json.loads(text[self._item_start:self._pos + 1]))
+                        except ValueError:
+                            pass
+                        self._item_start = None
+                self._expect_key = False
+            elif ch == ",":
+                self._expect_key = bool(self._stack) and self._stack[-1][0] == "{"
+            elif ch == ":":
+                self._expect_key = False
+            self._pos += 1
+        return items
+
+
+class StructuredOutputError(ValueError):
+    """A response could not be turned into the expected JSON object"""
+
+    def __init__(self, message: str, text: str = ""):
+        super().__init__(message)
+        self.text = text
+
+
+class Field:
+    def __init__(self, kind, required: bool = True, default=None, choices=None,
+                 minimum: Optional[float] = None, maximum: Optional[float] = None):
+        """One top-level field of a response schema
+
+        kind is str, float, bool, list or dict. Values are coerced where that
+        is unambiguous (e.g. "7" -> 7.0, "true" -> True, "x" -> ["x"]);
+        numbers are clamped to [minimum, maximum]. Optional fields that are
+        missing get a copy of default.
+        """
+        self.kind = kind
+        self.required = required
+        self.default = default
+        self.choices = choices
+        self.minimum = minimum
+        self.maximum = maximum
+
+
+SCHEMAS = {
+    "grading": {
+        "score": Field(float, minimum=0),
+        "percentage": Field(float, required=False, minimum=0, maximum=100),
+        "feedback": Field(str),
+        "strengths": Field(list, required=False, default=[]),
+        "improvements": Field(list, required=False, default=[]),
+        "mistakes": Field(list, required=False, default=[])
+    },
+    # Several students graded in one request; each result is checked
+    # against "grading" separately
+    "grading_batch": {
+        "results": Field(list)
+    },
+    "hints": {
+        "estimated_score_range": Field(str, required=False, default="N/A"),
+        "hints": Field(list),
+        "review_topics": Field(list, required=False, default=[]),
+        "reflection_questions": Field(list, required=False, default=[])
+    },
+    "sentiment": {
+        "sentiment_score": Field(float, minimum=-1, maximum=1),
+        "stress_level": Field(str, choices=("low", "medium", "high")),
+        "emotions": Field(list, required=False, default=[]),
+        "concerns": Field(list, required=False, default=[]),
+        "positive_aspects": Field(list, required=False, default=[]),
+        "overall_assessment": Field(str, required=False, default="")
+    },
+    "intervention": {
+        "priority": Field(str, required=False, default="medium", choices=("low", "medium", "high")),
+        "interventions": Field(list),
+        "seek_support": Field(bool, required=False, default=False),
+        "support_message": Field(str, required=False, default="")
+    },
+    "worksheet": {
+        "title": Field(str),
+        "questions": Field(list)
+    }
+}
+
+# Keys every item of a list field must have
+ITEM_KEYS = {
+    ("intervention", "interventions"): ("title", "description"),
+    ("worksheet", "questions"): ("question", "answer")
+}
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_PYTHON_LITERALS = re.compile(r"([:\[,]\s*)(True|False|None)\b")
+_DANGLING_KEY = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*$')
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"'})
+
+
+def _scan(text: str, start: int):
+    """Walk text from start (a '{'); return (end, stack, in_string) where end
+    is the index just past the matching '}' or None if the object never closes"""
+    stack = []
+    in_string = False
+    escape = False
+    for pos in range(start, len(text)):
+        ch = text[pos]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return pos + 1, stack, False
+    return None, stack, in_string
+
+
+def find_json_object(text: str, max_candidates: int = 8) -> Tuple[Optional[Dict], Optional[str]]:
+    """Find the first JSON object in text, skipping prose, code fences and
+    braces inside strings
+
+    Returns (object, None) on success, otherwise (None, fragment) where
+    fragment is the best candidate text to hand to repair_json.
+    """
+    fragment = None
+    start = text.find("{")
+    candidates = 0
+    while start != -1 and candidates < max_candidates:
+        candidates += 1
+        end, _, _ = _scan(text, start)
+        if end is None:
+            # Never closes, e.g. the response was cut off at max_tokens
+            return None, fragment or text[start:]
+        candidate = text[start:end]
+        try:
+            value = json.loads(candidate)
+            if isinstance(value, dict):
+                return value, None
+        except ValueError:
+            pass
+        fragment = fragment or candidate
+        # Objects nested in a broken one are parts of it, not the answer
+        start = text.find("{", end)
+    return None, fragment
+
+
+def repair_json(fragment: str) -> Optional[Dict]:
+    """One cheap repair pass over a broken JSON object; None if it still fails
+
+    Fixes smart quotes, trailing commas, Python literals and truncation
+    (closes an open string and any open brackets, dropping a key left
+    without a value).
+    """
+    text = fragment.translate(_SMART_QUOTES)
+    text = _PYTHON_LITERALS.sub(lambda m: m.group(1) + {"True": "true", "False": "false", "None": "null"}[m.group(2)], text)
+
+    _, stack, in_string = _scan(text, text.find("{")) if "{" in text else (None, [], False)
+    if in_string:
+        text += '"'
+    if stack:
+        text = text.rstrip().rstrip(",:")
+        if stack[-1] == "{":
+            # A key cut off before its value: {"score": 7, "feedback"
+            text = _DANGLING_KEY.sub(r"\1", text).rstrip(",")
+        text += "".join("}" if bracket == "{" else "]" for bracket in reversed(stack))
+    text = _TRAILING_COMMA.sub(r"\1", text)
+
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _coerce(name: str, field: Field, value):
+    if field.kind is float:
+        if isinstance(value, bool):
+            raise StructuredOutputError(f"'{name}' should be a number")
+        if not isinstance(value, (int, float)):
+            match = _NUMBER.search(str(value))
+            if not match:
+                raise StructuredOutputError(f"'{name}' should be a number, got {value!r}")
+            value = float(match.group())
+        if field.minimum is not None:
+            value = max(field.minimum, value)
+        if field.maximum is not None:
+            value = min(field.maximum, value)
+        return value
+    if field.kind is bool:
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "yes", "1")
+        return bool(value)
+    if field.kind is list:
+        if isinstance(value, list):
+            return value
+        if value in (None, ""):
+            return []
+        return [value]
+    if field.kind is str:
+        value = "" if value is None else str(value)
+        if field.choices:
+            value = value.strip().lower()
+            if value not in field.choices:
+                raise StructuredOutputError(f"'{name}' should be one of {', '.join(field.choices)}, got {value!r}")
+        return value
+    if not isinstance(value, field.kind):
+        raise StructuredOutputError(f"'{name}' should be a {field.kind.__name__}")
+    return value
+
+
+def validate(data: Dict, schema: str) -> Dict:
+    """Check data against SCHEMAS[schema], coercing values and filling defaults"""
+    result = dict(data)
+    for name, field in SCHEMAS[schema].items():
+        if name not in data or data[name] is None:
+            if field.required:
+                raise StructuredOutputError(f"Missing required field '{name}'")
+            result[name] = copy.deepcopy(field.default)
+            continue
+        result[name] = _coerce(name, field, data[name])
+
+        item_keys = ITEM_KEYS.get((schema, name))
+        if item_keys:
+            if not result[name]:
+                raise StructuredOutputError(f"'{name}' is empty")
+            for item in result[name]:
+                if not isinstance(item, dict) or any(key not in item for key in item_keys):
+                    raise StructuredOutputError(f"Every item of '{name}' needs {', '.join(item_keys)}")
+    return result
+
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _record(schema: str, outcome: str, seconds: float):
+    with _stats_lock:
+        stats = _stats.setdefault(schema, {
+            "responses": 0, "direct": 0, "repaired": 0, "failed": 0,
+            "reasked": 0, "recovered": 0, "parse_seconds": 0.0
+        })
+        stats[outcome] += 1
+        if outcome in ("direct", "repaired", "failed"):
+            stats["responses"] += 1
+            stats["parse_seconds"] += seconds
+
+
+def get_parse_stats() -> Dict:
+    """Per schema: model replies parsed directly, after repair or not at
+    all, re-asks and how many of them recovered, plus the parse success rate
+    and mean parse time per reply"""
+    with _stats_lock:
+        snapshot = {schema: dict(stats) for schema, stats in _stats.items()}
+    for stats in snapshot.values():
+        parsed = stats["responses"] - stats["failed"]
+        stats["success_rate"] = round(parsed / stats["responses"], 3) if stats["responses"] else 0.0
+        stats["avg_parse_ms"] = round(1000 * stats["parse_seconds"] / stats["responses"], 3) if stats["responses"] else 0.0
+        del stats["parse_seconds"]
+    return snapshot
+
+
+def parse_structured(text: str, schema: str) -> Dict:
+    """Extract, repair if needed and validate a response against a schema
+
+    Raises StructuredOutputError (with the raw text attached) on failure.
+    """
+    start = time.perf_counter()
+    outcome = "failed"
+    try:
+        data, fragment = find_json_object(text or "")
+        outcome = "direct"
+        if data is None:
+            data = repair_json(fragment) if fragment else None
+            outcome = "repaired"
+        if data is None:
+            outcome = "failed"
+            raise StructuredOutputError("No valid JSON object found", text)
+        try:
+            return validate(data, schema)
+        except StructuredOutputError as e:
+            outcome = "failed"
+            e.text = text
+            raise
+    finally:
+        _record(schema, outcome, time.perf_counter() - start)
+
+
+def _reask_messages(system_prompt: str, user_prompt: str, text: str, error: Exception):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+        {"role": "assistant", "content": text},
+        {"role": "user", "content": f"That reply could not be used ({error}). "
+                                    "Reply with only the corrected JSON object."}
+    ]
+
+
+def _discard(cache, model: str, system_prompt: str, user_prompt: str, temperature: float, max_tokens: int):
+    """Evict an unparseable reply so later identical calls don't replay it"""
+    if cache is not None:
+        cache.delete(ResponseCache.make_key(model, system_prompt, user_prompt, temperature, max_tokens))
+
+
+def _store_corrected(cache, model: str, system_prompt: str, user_prompt: str,
+                     temperature: float, max_tokens: int, schema: str, data: Dict):
+    _record(schema, "recovered", 0.0)
+    if cache is not None:
+        key = ResponseCache.make_key(model, system_prompt, user_prompt, temperature, max_tokens)
+        cache.set(key, json.dumps(data))
+
+
+def structured_chat_completion(client, cache, model: str, system_prompt: str, user_prompt: str,
+                               schema: str, temperature: float, max_tokens: int,
+                               **call_options) -> Dict:
+    """Chat completion that returns a validated dict for schema
+
+    Goes through cached_chat_completion. If the reply cannot be parsed even
+    after repair_json, it is evicted from the cache and the model is asked
+    once more to correct its JSON; only a corrected reply that parses is
+    cached in its place. Raises StructuredOutputError if the second reply
+    fails too.
+    """
+    text = cached_chat_completion(client, cache, model, system_prompt, user_prompt,
+                                  temperature, max_tokens, **call_options)
+    try:
+        return parse_structured(text, schema)
+    except StructuredOutputError as e:
+        error = e
+
+    _discard(cache, model, system_prompt, user_prompt, temperature, max_tokens)
+    _record(schema, "reasked", 0.0)
+    response = client.chat.completions.create(
+        model=model,
+        messages=_reask_messages(system_prompt, user_prompt, text, error),
+        temperature=0.0,
+        max_tokens=max_tokens,
+        **call_options
+    )
+    data = parse_structured(response.choices[0].message.content, schema)
+    _store_corrected(cache, model, system_prompt, user_prompt, temperature, max_tokens, schema, data)
+    return data
+
+
+async def astructured_chat_completion(client, cache, model: str, system_prompt: str, user_prompt: str,
+                                      schema: str, temperature: float, max_tokens: int,
+                                      **call_options) -> Dict:
+    """Async counterpart of structured_chat_completion"""
+    text = await acached_chat_completion(client, cache, model, system_prompt, user_prompt,
+                                         temperature, max_tokens, **call_options)
+    try:
+        return parse_structured(text, schema)
+    except StructuredOutputError as e:
+        error = e
+
+    _discard(cache, model, system_prompt, user_prompt, temperature, max_tokens)
+    _record(schema, "reasked", 0.0)
+    response = await client.chat.completions.acreate(
+        model=model,
+        messages=_reask_messages(system_prompt, user_prompt, text, error),
+        temperature=0.0,
+        max_tokens=max_tokens,
+        **call_options
+    )
+    data = parse_structured(response.choices[0].message.content, schema)
+    _store_corrected(cache, model, system_prompt, user_prompt, temperature, max_tokens, schema, data)
+    return data
@@ -0,0 +1,77 @@
+"""
+Tests for streamed worksheet generation
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from content_recommender import ContentRecommender
+
+# The second question has a trailing comma: the stream scanner skips it,
+# the final parse repairs it
+WORKSHEET = (
+    '```json\n{"title": "Fractions", "questions": ['
+    '{"question": "Q1", "type": "short", "answer": "a", "explanation": ""}, '
+    '{"question": "Q2", "type": "short", "answer": "b", "explanation": "",}, '
+    '{"question": "Q3", "type": "short", "answer": "c", "explanation": ""}, '
+    '{"question": "Q4", "type": "short", "answer": "d", "explanation": ""}'
+    ']}\n```'
+)
+
+
+class FakeStreamingClient:
+    def __init__(self, text, chunk_size=7):
+        self.chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    def stream_chat_completion(self, **kwargs):
+        yield from self.chunks
+
+    async def astream_chat_completion(self, **kwargs):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def questions(events):
+    return [payload["question"] for kind, payload in events if kind == "question"]
+
+
+@pytest.fixture
+def recommender():
+    return ContentRecommender("unused", "stub", client=FakeStreamingClient(WORKSHEET))
+
+
+def test_stream_yields_each_question_once_despite_malformed_item(recommender):
+    events = list(recommender.generate_practice_worksheet_stream("Fractions", "easy", 4))
+    assert sorted(questions(events)) == ["Q1", "Q2", "Q3", "Q4"]
+    # Q2 only parses once the whole reply is repaired, so it comes last
+    assert questions(events) == ["Q1", "Q3", "Q4", "Q2"]
+    kind, worksheet = events[-1]
+    assert kind == "worksheet"
+    assert [q["question"] for q in worksheet["questions"]] == ["Q1", "Q2", "Q3", "Q4"]
+
+
+def test_async_stream_yields_each_question_once_despite_malformed_item(recommender):
+    async def collect():
+        return [event async for event in recommender.agenerate_practice_worksheet_stream("Fractions", "easy", 4)]
+
+    events = asyncio.run(collect())
+    assert questions(events) == ["Q1", "Q3", "Q4", "Q2"]
+    assert events[-1][0] == "worksheet"
+
+
+def test_identical_questions_are_each_yielded():
+    question = {"question": "Q", "type": "short", "answer": "a", "explanation": ""}
+    text = json.dumps({"title": "T", "questions": [question, question]})
+    recommender = ContentRecommender("unused", "stub", client=FakeStreamingClient(text))
+    events = list(recommender.generate_practice_worksheet_stream("T", "easy", 2))
+    assert questions(events) == ["Q", "Q"]
+
+
+def test_unstreamed_questions():
+    q1, q2, q3 = ({"question": f"Q{i}", "answer": str(i)} for i in (1, 2, 3))
+    worksheet = {"title": "T", "questions": [q1, q2, q3]}
+    assert ContentRecommender._unstreamed_questions(worksheet, [q1, q3]) == [q2]
+    assert ContentRecommender._unstreamed_questions(worksheet, []) == [q1, q2, q3]
+    assert ContentRecommender._unstreamed_questions(worksheet, [q3, q2, q1]) == []
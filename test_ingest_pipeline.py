@@ -0,0 +1,228 @@
+"""
+Tests for the staged scan ingest pipeline
+"""
+
+import io
+import json
+import random
+import threading
+import time
+import zipfile
+
+import pytest
+
+import ingest_pipeline
+from ingest_pipeline import RESULT_FIELDS, IngestPipeline, ResultWriter, iter_pages
+from rate_limiter import PRIORITY_BATCH
+
+PAGES = 24
+
+
+class FakeGrader:
+    """Stands in for AssessmentGradingAssistant; each page's image is b"page N"
+
+    Pages listed in fail_at raise in that stage; pages in cached skip OCR.
+    Every stage sleeps a little at random so pages finish out of order.
+    """
+
+    def __init__(self, fail_at=None, cached=(), delay=0.01):
+        self.fail_at = fail_at or {}
+        self.cached = set(cached)
+        self.delay = delay
+        self.ocr_calls = []
+        self.grade_calls = []
+
+    def _work(self, stage, page):
+        time.sleep(random.uniform(0, self.delay))
+        if page in self.fail_at.get(stage, ()):
+            raise RuntimeError(f"{stage} broke on page {page}")
+
+    def prepare_for_ocr(self, image):
+        page = int(image.split()[1])
+        self._work("prep", page)
+        return image.upper(), ("key", page), f"cached text {page}" if page in self.cached else None
+
+    def ocr_prepared(self, image, key):
+        page = key[1]
+        self.ocr_calls.append(page)
+        self._work("ocr", page)
+        assert image == f"PAGE {page}".encode()
+        return f"answer {page}"
+
+    def grade_homework(self, text, correct_answer, subject, max_score, *, priority, feature):
+        self.grade_calls.append((priority, feature))
+        page = int(text.split()[-1])
+        self._work("grade", page)
+        return {"score": page % (max_score + 1), "percentage": 50.0, "feedback": f"feedback {page}",
+                "strengths": ["s"], "improvements": [], "mistakes": []}
+
+
+def make_zip(count=PAGES, extra=()):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for page in range(count):
+            archive.writestr(f"scans/{page:03d}.png", f"page {page}".encode())
+        for member, data in extra:
+            archive.writestr(member, data)
+    return buffer.getvalue()
+
+
+def pipeline(grader, **kwargs):
+    kwargs.setdefault("queue_size", 2)
+    return IngestPipeline(grader, "answer", "Maths", 10, **kwargs)
+
+
+def run_with_timeout(generator, timeout=10.0):
+    """Collect every result, failing instead of hanging if the pipeline stalls"""
+    results = []
+    done = threading.Event()
+
+    def consume():
+        results.extend(generator)
+        done.set()
+
+    threading.Thread(target=consume, daemon=True).start()
+    assert done.wait(timeout), "pipeline hung"
+    return results
+
+
+def ingest_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("ingest-")]
+
+
+def wait_for_shutdown(timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while ingest_threads():
+        assert time.monotonic() < deadline, f"threads still running: {ingest_threads()}"
+        time.sleep(0.01)
+
+
+@pytest.fixture(autouse=True)
+def no_leftover_threads():
+    yield
+    wait_for_shutdown()
+
+
+def test_iter_pages_reads_zip_members_in_name_order(tmp_path):
+    data = make_zip(3, extra=[("notes.txt", b"skip me"), ("scans/.hidden.png", b"skip"), ("a.JPG", b"page 9")])
+    pages = list(iter_pages(data))
+    assert pages == [("a.JPG", b"page 9"), ("scans/000.png", b"page 0"),
+                     ("scans/001.png", b"page 1"), ("scans/002.png", b"page 2")]
+
+    path = tmp_path / "class.zip"
+    path.write_bytes(data)
+    assert list(iter_pages(str(path))) == pages
+    assert list(iter_pages(b"\x89PNG single", name="one.png")) == [("one.png", b"\x89PNG single")]
+
+
+def test_ordered_results_come_back_in_input_order():
+    grader = FakeGrader()
+    results = run_with_timeout(pipeline(grader).run(make_zip(), ordered=True))
+    assert [result["page"] for result in results] == list(range(PAGES))
+    assert [result["source"] for result in results] == [f"scans/{page:03d}.png" for page in range(PAGES)]
+    assert [result["feedback"] for result in results] == [f"feedback {page}" for page in range(PAGES)]
+    assert all(list(result) == RESULT_FIELDS and not result["error"] for result in results)
+    assert set(grader.grade_calls) == {(PRIORITY_BATCH, "batch_grading")}
+
+
+def test_unordered_results_cover_every_page_once():
+    results = run_with_timeout(pipeline(FakeGrader()).run(make_zip()))
+    assert sorted(result["page"] for result in results) == list(range(PAGES))
+    for result in results:
+        assert result["extracted_text"] == f"answer {result['page']}"
+        assert result["score"] == result["page"] % 11
+
+
+def test_on_result_sees_results_in_yield_order():
+    seen = []
+    results = run_with_timeout(pipeline(FakeGrader()).run(make_zip(), on_result=seen.append, ordered=True))
+    assert seen == results
+
+
+@pytest.mark.parametrize("stage", ["prep", "ocr", "grade"])
+def test_stage_failure_becomes_a_per_page_error(stage):
+    grader = FakeGrader(fail_at={stage: {3, 17}})
+    runner = pipeline(grader)
+    results = run_with_timeout(runner.run(make_zip(), ordered=True))
+
+    assert [result["page"] for result in results] == list(range(PAGES))
+    failed = [result for result in results if result["error"]]
+    assert [result["page"] for result in failed] == [3, 17]
+    assert failed[0]["error"] == f"{stage} failed: {stage} broke on page 3"
+    assert failed[0]["score"] == 0 and failed[0]["feedback"] == failed[0]["error"]
+    assert all(result["feedback"] == f"feedback {result['page']}" for result in results if not result["error"])
+    stats = runner.get_stats()
+    assert stats["pages"] == PAGES and stats["errors"] == 2
+
+
+def test_ocr_error_text_and_unreadable_pages_are_errors(monkeypatch):
+    grader = FakeGrader()
+    grader.ocr_prepared = lambda image, key: "Error: backend unavailable" if key[1] == 1 else f"answer {key[1]}"
+
+    def broken_pdf(data, label, dpi):
+        yield f"{label} p1", ValueError("damaged page")
+
+    monkeypatch.setattr(ingest_pipeline, "_pdf_pages", broken_pdf)
+    data = make_zip(3, extra=[("scans/zz.pdf", b"%PDF-1.7")])
+    results = run_with_timeout(pipeline(grader).run(data, ordered=True))
+    assert [result["error"] for result in results] == [
+        "", "Error: backend unavailable", "", "Could not read scans/zz.pdf p1: damaged page"]
+    assert len(grader.grade_calls) == 2
+
+
+def test_unreadable_input_is_one_error_row():
+    results = run_with_timeout(pipeline(FakeGrader()).run(b"PK\x03\x04 not really a zip", name="class.zip"))
+    assert len(results) == 1
+    assert results[0]["source"] == "class.zip" and results[0]["error"].startswith("Could not read input")
+
+
+def test_cached_pages_skip_ocr():
+    grader = FakeGrader(cached={0, 5})
+    runner = pipeline(grader)
+    results = run_with_timeout(runner.run(make_zip(8), ordered=True))
+    assert sorted(grader.ocr_calls) == [1, 2, 3, 4, 6, 7]
+    assert [result["ocr_cached"] for result in results] == [page in (0, 5) for page in range(8)]
+    assert results[5]["extracted_text"] == "cached text 5"
+    assert runner.get_stats()["ocr_cached"] == 2
+
+
+def test_threads_exit_after_a_full_run():
+    runner = pipeline(FakeGrader(delay=0), prep_workers=3, ocr_workers=2, grade_workers=5)
+    run_with_timeout(runner.run(make_zip()))
+    wait_for_shutdown()
+    stats = runner.get_stats()
+    assert stats["pages"] == PAGES and stats["pages_per_second"] > 0
+    assert set(stats["busy_seconds"]) == {"split", "prep", "ocr", "grade"}
+
+
+def test_closing_early_stops_every_stage():
+    grader = FakeGrader(delay=0.02)
+    results = pipeline(grader, queue_size=1).run(make_zip(200))
+    first = next(results)
+    assert len(ingest_threads()) > 0
+    results.close()
+    wait_for_shutdown()
+    # Bounded queues kept the stages from racing ahead of the consumer
+    assert first["error"] == "" and len(grader.grade_calls) < 50
+
+
+def test_result_writer_jsonl_and_csv():
+    results = run_with_timeout(pipeline(FakeGrader(fail_at={"grade": {1}})).run(make_zip(2), ordered=True))
+
+    stream = io.StringIO()
+    writer = ResultWriter(stream, "jsonl")
+    for result in results:
+        writer.write(result)
+    rows = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert rows == results
+
+    stream = io.StringIO()
+    writer = ResultWriter(stream, "csv")
+    for result in results:
+        writer.write(result)
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == ",".join(RESULT_FIELDS)
+    assert len(lines) == 3 and ",s," in lines[1] and "grade failed" in lines[2]
+
+    with pytest.raises(ValueError, match="Unknown output format"):
+        ResultWriter(io.StringIO(), "xlsx")
@@ -0,0 +1,212 @@
+"""
+Tests for the rule-based objective grader
+"""
+
+import pytest
+
+from objective_grader import ObjectiveGrader, decimal_places, option_text, parse_numeric, parse_options
+
+
+@pytest.fixture
+def grader():
+    return ObjectiveGrader()
+
+
+def score(grader, answer, key, max_score=10):
+    result = grader.grade(answer, key, max_score)
+    return None if result is None else result["score"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("B", {1: "B"}),
+    ("(b)", {1: "B"}),
+    ("b) Mitochondria", {1: "B"}),
+    ("Answer: d", {1: "D"}),
+    ("1. A 2. C 3. B", {1: "A", 2: "C", 3: "B"}),
+    ("1-a, 2-c", {1: "A", 2: "C"}),
+    ("A, C, B", {1: "A", 2: "C", 3: "B"}),
+    ("A cell wall", None),
+    ("Photosynthesis", None),
+])
+def test_parse_options(text, expected):
+    assert parse_options(text) == expected
+
+
+def test_option_text():
+    assert option_text("A. Lincoln") == "Lincoln"
+    assert option_text("b) Mitochondria") == "Mitochondria"
+    assert option_text("B") == ""
+    assert option_text("Photosynthesis") == ""
+
+
+@pytest.mark.parametrize("answer, expected", [
+    ("B", 10),
+    ("b) Mitochondria", 10),
+    ("Option B", 10),
+    ("C", 0),
+    ("D) Ribosome", 0),
+])
+def test_single_mcq(grader, answer, expected):
+    result = grader.grade(answer, "B")
+    assert result["grading_tier"] == "mcq"
+    assert result["score"] == expected
+
+
+def test_numbered_mcq_partial_credit(grader):
+    result = grader.grade("1-A, 2-D, 3-B", "1. A 2. C 3. B", 9)
+    assert result["grading_tier"] == "mcq"
+    assert result["score"] == 6
+    assert result["mistakes"] == ["Question 2: answered D, correct answer C"]
+
+
+def test_numbered_mcq_unanswered_question(grader):
+    result = grader.grade("1. A 3. B", "1. A 2. C 3. B", 9)
+    assert result["score"] == 6
+    assert "Question 2: not answered" in result["mistakes"][0]
+
+
+@pytest.mark.parametrize("answer, key", [
+    ("A, B", "B"),                  # several letters for a single key
+    ("A C", "1. A 2. C 3. B"),      # unnumbered list of the wrong length
+    ("1. A 4. C", "1. A 2. C 3. B"),  # a question the key does not have
+    ("The mitochondria", "B"),
+])
+def test_mcq_ambiguous_answers_escalate(grader, answer, key):
+    assert grader.grade(answer, key) is None
+
+
+@pytest.mark.parametrize("answer, key", [
+    ("A. Johnson", "A. Lincoln"),
+    ("E. faecalis", "E. coli"),
+    ("A", "A. Lincoln"),
+])
+def test_letter_and_text_key_needs_matching_text(grader, answer, key):
+    assert grader.grade(answer, key) is None
+
+
+def test_letter_and_text_key_graded_when_text_repeated(grader):
+    assert score(grader, "a) Lincoln", "A. Lincoln") == 10
+    assert score(grader, "E. coli", "E. coli") == 10
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("x = 4", (4.0, "", "x")),
+    ("28.3 cm^2", (28.3, "cm2", "")),
+    ("3/4", (0.75, "", "")),
+    ("1,250", (1250.0, "", "")),
+    ("−2.5", (-2.5, "", "")),
+    ("2x = 8 so x = 4", None),
+])
+def test_parse_numeric(text, expected):
+    assert parse_numeric(text) == expected
+
+
+@pytest.mark.parametrize("answer, key, expected", [
+    ("x=4.0", "x = 4", 10),
+    ("4", "x = 4", 10),
+    ("x = 5", "x = 4", 0),
+    ("28.27 cm2", "28.3 cm^2", 10),      # rounds to the key's precision
+    ("28.34 cm2", "28.3 cm^2", 10),
+    ("28.2 cm^2", "28.3 cm^2", 0),
+    ("28 cm^2", "28.3 cm^2", 0),
+    ("0.75", "3/4", 10),
+    ("0.67", "2/3", 10),                 # fraction rounded to 2 places
+    ("0.7", "2/3", 0),
+    ("0", "0", 10),
+    ("0.001", "0", 0),
+])
+def test_numeric_tolerance(grader, answer, key, expected):
+    result = grader.grade(answer, key)
+    assert result["grading_tier"] == "numeric"
+    assert result["score"] == expected
+
+
+@pytest.mark.parametrize("answer, key", [
+    ("1930", "1945"),
+    ("1944", "1945"),
+    ("99", "100"),
+    ("362", "365"),
+    ("12.1", "12"),
+    ("7.05", "7"),
+    ("x = 4.4", "x = 4"),
+    ("3.2", "3.4"),
+    ("9.9 m/s", "9.8 m/s"),
+    ("0.5", "0.4"),
+])
+def test_numeric_near_misses_score_zero(grader, answer, key):
+    result = grader.grade(answer, key)
+    assert result["grading_tier"] == "numeric"
+    assert result["score"] == 0
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1945", 0),
+    ("28.30 cm^2", 2),
+    ("x = -0.5", 1),
+    ("3/4", None),
+    ("6.02e23", None),
+    ("about four", None),
+])
+def test_decimal_places(text, expected):
+    assert decimal_places(text) == expected
+
+
+def test_numeric_tolerance_is_configurable():
+    assert score(ObjectiveGrader(numeric_tolerance=0.05), "28 cm^2", "28.3 cm^2") == 10
+
+
+@pytest.mark.parametrize("answer, key", [
+    ("283 mm^2", "28.3 cm^2"),   # a conversion the rules do not know
+    ("28.3", "28.3 cm^2"),       # missing unit
+    ("y = 4", "x = 4"),          # different unknown
+    ("9 pi cm^2", "28.3 cm^2"),
+])
+def test_numeric_unit_or_variable_mismatch_escalates(grader, answer, key):
+    assert grader.grade(answer, key) is None
+
+
+@pytest.mark.parametrize("answer, key", [
+    ("photosynthesis", "Photosynthesis"),
+    ("The Mitochondria.", "mitochondria"),
+    ("café", "Cafe"),
+])
+def test_exact_text(grader, answer, key):
+    result = grader.grade(answer, key)
+    assert result["grading_tier"] == "exact"
+    assert result["score"] == 10
+
+
+@pytest.mark.parametrize("answer, key", [
+    ("adsorption", "absorption"),
+    ("methanol", "ethanol"),
+    ("neuron", "neutron"),
+    ("ironic", "ionic"),
+    ("Russia", "Prussia"),
+    ("sodium chlorite", "sodium chloride"),
+    ("photosynthesys", "Photosynthesis"),
+    ("Respiration", "Photosynthesis"),
+])
+def test_near_miss_text_escalates(grader, answer, key):
+    assert grader.grade(answer, key) is None
+
+
+def test_long_text_key_escalates(grader):
+    key = "Plants make glucose from light, water and carbon dioxide, releasing oxygen."
+    assert grader.grade(key, key) is None
+
+
+def test_stats(grader):
+    grader.grade("B", "B")
+    grader.grade("x = 4", "x = 4")
+    grader.grade("adsorption", "absorption")
+    stats = grader.get_stats()
+    assert (stats["mcq"], stats["numeric"], stats["escalated"], stats["local"]) == (1, 1, 1, 2)
+    assert stats["local_rate"] == pytest.approx(0.667)
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("OBJECTIVE_GRADING", "0")
+    assert ObjectiveGrader.from_env() is None
+    monkeypatch.setenv("OBJECTIVE_GRADING", "1")
+    monkeypatch.setenv("OBJECTIVE_NUMERIC_TOLERANCE", "0.05")
+    assert ObjectiveGrader.from_env().numeric_tolerance == 0.05
@@ -0,0 +1,194 @@
+"""
+Tests for the token buckets and priority lanes of the rate limiter
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from rate_limiter import PRIORITY_BATCH, PRIORITY_INTERACTIVE, RateLimiter, TokenBucket, estimate_tokens
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_bucket_starts_full_and_refills_at_rate(clock):
+    bucket = TokenBucket(60, clock=clock)          # one unit per second
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.advance(0.5)
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert bucket.wait_time(1) == 0
+
+
+def test_bucket_never_exceeds_capacity(clock):
+    bucket = TokenBucket(60, burst=10, clock=clock)
+    clock.advance(3600)
+    bucket.take(10)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    # Asking for more than the bucket holds waits for a full bucket, not forever
+    assert bucket.wait_time(1000) == pytest.approx(10.0)
+
+
+def test_overdraft_is_paid_back_before_next_take(clock):
+    bucket = TokenBucket(600, clock=clock)         # 10 units per second
+    bucket.take(600 + 50)                          # call cost 50 more than was left
+    assert bucket.level == pytest.approx(-50)
+    assert bucket.wait_time(10) == pytest.approx(6.0)
+    clock.advance(6.0)
+    assert bucket.wait_time(10) == 0
+
+
+def test_pause_drains_bucket(clock):
+    bucket = TokenBucket(60, clock=clock)
+    bucket.pause(5)
+    assert bucket.wait_time(1) == pytest.approx(6.0)
+    clock.advance(6)
+    assert bucket.wait_time(1) == 0
+
+
+def test_limiter_admits_burst_then_waits_for_refill(clock):
+    limiter = RateLimiter(requests_per_minute=60, clock=clock)
+    for _ in range(60):
+        assert limiter.acquire("grading") == 0
+        limiter.release("grading")
+    assert limiter._bucket_wait(0) == pytest.approx(1.0)
+
+    admitted = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire("grading"), admitted.set()))
+    thread.start()
+    wait_until(lambda: limiter.get_stats()["queued"] == 1)
+    assert not admitted.wait(0.05)
+
+    clock.advance(1.0)
+    limiter.release("other")                       # any state change wakes the waiters
+    thread.join(2)
+    assert admitted.is_set()
+    stats = limiter.get_stats()
+    assert stats["admitted"] == 61 and stats["waited"] == 1
+    assert stats["lane_wait_seconds"] == {PRIORITY_INTERACTIVE: 1.0}
+
+
+def test_token_budget_charges_underestimates(clock):
+    limiter = RateLimiter(tokens_per_minute=6000, clock=clock)   # 100 tokens per second
+    limiter.acquire("grading", estimated_tokens=1000)
+    limiter.release("grading", estimated_tokens=1000, actual_tokens=6000)
+    assert limiter.token_bucket.level == pytest.approx(0)
+    assert limiter._bucket_wait(500) == pytest.approx(5.0)
+
+    with limiter.limit("grading", estimated_tokens=0) as usage:
+        usage["actual_tokens"] = 0
+    assert limiter.token_bucket.level == pytest.approx(0)
+
+
+def test_interactive_goes_ahead_of_queued_batch(clock):
+    limiter = RateLimiter(default_concurrency=1, clock=clock)
+    order = []
+
+    def call(name, priority):
+        limiter.acquire("llm", priority)
+        order.append(name)
+        limiter.release("llm")
+
+    limiter.acquire("llm")                         # hold the only slot
+    threads = []
+    for name, priority in [("batch-1", PRIORITY_BATCH), ("batch-2", PRIORITY_BATCH),
+                           ("interactive", PRIORITY_INTERACTIVE)]:
+        thread = threading.Thread(target=call, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: limiter.get_stats()["queued"] == len(threads))
+
+    limiter.release("llm")
+    for thread in threads:
+        thread.join(2)
+    assert order == ["interactive", "batch-1", "batch-2"]
+
+
+def test_full_feature_does_not_block_other_features(clock):
+    limiter = RateLimiter(feature_concurrency={"batch_grading": 1}, clock=clock)
+    limiter.acquire("batch_grading", PRIORITY_BATCH)
+    blocked = threading.Thread(target=limiter.acquire, args=("batch_grading", PRIORITY_BATCH))
+    blocked.start()
+    wait_until(lambda: limiter.get_stats()["queued"] == 1)
+
+    assert limiter.acquire("grading") == 0
+    assert limiter.get_stats()["in_flight"] == {"batch_grading": 1, "grading": 1}
+
+    limiter.release("batch_grading")
+    blocked.join(2)
+    assert limiter.get_stats()["in_flight"] == {"batch_grading": 1, "grading": 1}
+
+
+def test_async_interactive_goes_ahead_of_queued_batch(clock):
+    limiter = RateLimiter(default_concurrency=1, clock=clock)
+    order = []
+
+    async def call(name, priority):
+        async with limiter.alimit("llm", priority):
+            order.append(name)
+
+    async def main():
+        limiter.acquire("llm")
+        batch = asyncio.create_task(call("batch", PRIORITY_BATCH))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(call("interactive", PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0.01)
+        assert limiter.get_stats()["queued"] == 2
+        limiter.release("llm")
+        await asyncio.wait_for(asyncio.gather(batch, interactive), 2)
+
+    asyncio.run(main())
+    assert order == ["interactive", "batch"]
+
+
+def test_cancelled_waiter_leaves_the_queue(clock):
+    limiter = RateLimiter(default_concurrency=1, clock=clock)
+
+    async def main():
+        limiter.acquire("llm")
+        task = asyncio.create_task(limiter.aacquire("llm"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert limiter.get_stats()["queued"] == 0
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_REQUESTS_PER_MINUTE", "30")
+    monkeypatch.delenv("LLM_TOKENS_PER_MINUTE", raising=False)
+    monkeypatch.setenv("LLM_BATCH_CONCURRENCY", "2")
+    limiter = RateLimiter.from_env()
+    assert limiter.request_bucket.capacity == 30 and limiter.token_bucket is None
+    assert limiter._limit_for("batch_grading") == 2
+
+
+def test_estimate_tokens():
+    assert estimate_tokens([{"content": "x" * 400}], max_tokens=100) == 200
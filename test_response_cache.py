@@ -0,0 +1,160 @@
+"""
+Tests for the two-tier LLM response cache
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, cached_chat_completion
+from structured_output import StructuredOutputError, structured_chat_completion
+
+
+class FakeClient:
+    """Replies with each of replies in turn and records every call"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        text = self.replies.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+                               usage=SimpleNamespace(total_tokens=42))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(data_dir=str(tmp_path), max_memory_entries=2, max_disk_entries=3)
+
+
+def key(n):
+    return ResponseCache.make_key("model", "system", f"prompt {n}", 0.3, 100)
+
+
+def test_make_key_depends_on_every_parameter():
+    base = ResponseCache.make_key("m", "s", "u", 0.3, 100)
+    assert base == ResponseCache.make_key("m", "s", "u", 0.3, 100)
+    for other in (("m2", "s", "u", 0.3, 100), ("m", "s2", "u", 0.3, 100), ("m", "s", "u2", 0.3, 100),
+                  ("m", "s", "u", 0.7, 100), ("m", "s", "u", 0.3, 200)):
+        assert ResponseCache.make_key(*other) != base
+
+
+def test_miss_then_memory_hit(cache):
+    assert cache.get(key(1)) is None
+    cache.set(key(1), "one", latency=1.5, tokens=10)
+    entry = cache.get(key(1))
+    assert (entry["text"], entry["latency"], entry["tokens"]) == ("one", 1.5, 10)
+    stats = cache.get_stats()
+    assert (stats["misses"], stats["memory_hits"], stats["disk_hits"]) == (1, 1, 0)
+    assert stats["saved_seconds"] == 1.5 and stats["saved_tokens"] == 10
+
+
+def test_memory_lru_eviction_falls_back_to_disk(cache):
+    cache.set(key(1), "one")
+    cache.set(key(2), "two")
+    cache.get(key(1))              # key 2 is now least recently used
+    cache.set(key(3), "three")     # evicts key 2 from memory only
+    assert cache.get_stats()["memory_entries"] == 2
+
+    assert cache.get(key(2))["text"] == "two"
+    stats = cache.get_stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1
+
+
+def test_memory_only_cache_forgets_evicted_entries():
+    cache = ResponseCache(max_memory_entries=1, use_disk=False)
+    cache.set(key(1), "one")
+    cache.set(key(2), "two")
+    assert cache.get(key(1)) is None
+    assert cache.get(key(2))["text"] == "two"
+
+
+def test_disk_lru_eviction(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    for n in range(1, 4):
+        cache.set(key(n), str(n))
+        now[0] += 1
+    cache._memory.clear()
+    cache.get(key(1))              # key 2 is now least recently used on disk
+    now[0] += 1
+    cache.set(key(4), "4")
+    cache._memory.clear()
+    assert cache.get(key(2)) is None
+    assert [cache.get(key(n))["text"] for n in (1, 3, 4)] == ["1", "3", "4"]
+
+
+def test_persists_across_instances(tmp_path):
+    ResponseCache(data_dir=str(tmp_path)).set(key(1), "one", latency=2.0, tokens=5)
+    reopened = ResponseCache(data_dir=str(tmp_path))
+    entry = reopened.get(key(1))
+    assert entry["text"] == "one" and entry["tokens"] == 5
+    assert reopened.get_stats()["disk_hits"] == 1
+    assert reopened.get(key(1)) is not None
+    assert reopened.get_stats()["memory_hits"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(data_dir=str(tmp_path), ttl_seconds=60)
+    cache.set(key(1), "one")
+    now[0] += 61
+    assert cache.get(key(1)) is None
+    assert ResponseCache(data_dir=str(tmp_path), ttl_seconds=None).get(key(1)) is None
+
+
+def test_delete_and_clear(tmp_path):
+    cache = ResponseCache(data_dir=str(tmp_path))
+    cache.set(key(1), "one")
+    cache.set(key(2), "two")
+    cache.delete(key(1))
+    assert cache.get(key(1)) is None
+    assert ResponseCache(data_dir=str(tmp_path)).get(key(1)) is None
+    cache.clear()
+    assert cache.get(key(2)) is None
+    assert ResponseCache(data_dir=str(tmp_path)).get(key(2)) is None
+
+
+def test_cached_chat_completion_calls_the_client_once(cache):
+    client = FakeClient("hello")
+    args = ("model", "system", "prompt", 0.3, 100)
+    assert cached_chat_completion(client, cache, *args, feature="test") == "hello"
+    assert cached_chat_completion(client, cache, *args, feature="test") == "hello"
+    assert len(client.calls) == 1
+    assert client.calls[0]["feature"] == "test"
+    assert cache.get(ResponseCache.make_key(*args))["tokens"] == 42
+
+
+GOOD = json.dumps({"score": 7, "feedback": "ok"})
+
+
+def test_unparseable_reply_is_not_replayed_from_cache(cache):
+    client = FakeClient("not json at all", GOOD)
+    args = dict(model="model", system_prompt="system", user_prompt="prompt", schema="grading",
+                temperature=0.3, max_tokens=100)
+    assert structured_chat_completion(client, cache, **args)["score"] == 7
+    assert len(client.calls) == 2
+
+    # The corrected reply replaced the bad one: no call, no re-ask
+    assert structured_chat_completion(client, cache, **args)["score"] == 7
+    assert len(client.calls) == 2
+    assert json.loads(cache.get(ResponseCache.make_key("model", "system", "prompt", 0.3, 100))["text"])["score"] == 7
+
+
+def test_failed_reask_leaves_nothing_cached(cache):
+    client = FakeClient("not json", "still not json", GOOD)
+    args = dict(model="model", system_prompt="system", user_prompt="prompt", schema="grading",
+                temperature=0.3, max_tokens=100)
+    with pytest.raises(StructuredOutputError):
+        structured_chat_completion(client, cache, **args)
+    assert cache.get(ResponseCache.make_key("model", "system", "prompt", 0.3, 100)) is None
+
+    # The next identical call asks the model afresh instead of replaying the bad reply
+    assert structured_chat_completion(client, cache, **args)["score"] == 7
+    assert len(client.calls) == 3
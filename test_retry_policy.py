@@ -0,0 +1,235 @@
+"""
+Tests for retries, deadlines and hedged requests
+"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from retry_policy import DeadlineExceeded, RetryPolicy
+
+
+class FakeClock:
+    """Clock whose sleep() advances time instantly and records each wait"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int, retry_after: str = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={"retry-after": retry_after} if retry_after else {})
+
+
+class APIConnectionError(Exception):
+    """Named like groq's connection error"""
+
+
+class Failing:
+    """Callable that raises each error in turn, then returns "ok" """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.deadlines = []
+
+    def __call__(self, deadline_at):
+        self.deadlines.append(deadline_at)
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def policy(clock, **kwargs):
+    kwargs.setdefault("hedge", False)
+    return RetryPolicy(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (StatusError(429), True),
+    (StatusError(503), True),
+    (StatusError(400), False),
+    (StatusError(401), False),
+    (TimeoutError(), True),
+    (ConnectionError(), True),
+    (APIConnectionError(), True),
+    (DeadlineExceeded(), False),
+    (ValueError("bad request body"), False),
+])
+def test_is_retryable(error, retryable):
+    assert RetryPolicy().is_retryable(error) is retryable
+
+
+def test_backoff_is_jittered_and_capped():
+    retry = RetryPolicy(base_delay=0.5, max_delay=2.0)
+    for attempt, ceiling in [(0, 0.5), (1, 1.0), (2, 2.0), (6, 2.0)]:
+        delays = [retry.backoff(attempt) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2
+
+
+def test_retries_transient_errors_until_success(clock):
+    retry = policy(clock, max_attempts=4, deadline=None)
+    attempt = Failing(StatusError(503), TimeoutError())
+    assert retry.call(attempt) == "ok"
+    assert len(attempt.deadlines) == 3 and attempt.deadlines == [None] * 3
+    assert len(clock.sleeps) == 2
+    stats = retry.get_stats()
+    assert (stats["calls"], stats["retries"], stats["failures"]) == (1, 2, 0)
+
+
+def test_does_not_retry_non_retryable_errors(clock):
+    retry = policy(clock)
+    attempt = Failing(StatusError(400))
+    with pytest.raises(StatusError):
+        retry.call(attempt)
+    assert len(attempt.deadlines) == 1 and clock.sleeps == []
+    assert retry.get_stats()["failures"] == 1
+
+
+def test_gives_up_after_max_attempts(clock):
+    retry = policy(clock, max_attempts=3, deadline=None)
+    attempt = Failing(*[StatusError(500)] * 5)
+    with pytest.raises(StatusError):
+        retry.call(attempt)
+    assert len(attempt.deadlines) == 3
+
+
+def test_stops_at_the_deadline(clock):
+    retry = policy(clock, max_attempts=10, base_delay=4.0, max_delay=4.0, deadline=10.0)
+    attempt = Failing(*[StatusError(429, retry_after="4")] * 10)
+    with pytest.raises(DeadlineExceeded) as info:
+        retry.call(attempt)
+    # Every attempt is told the same absolute deadline, and no wait runs past it
+    assert set(attempt.deadlines) == {1010.0}
+    assert sum(clock.sleeps) < 10.0
+    assert len(attempt.deadlines) == 3
+    assert isinstance(info.value.__cause__, StatusError)
+    assert retry.get_stats()["deadline_exceeded"] == 1
+
+
+def test_per_call_deadline_overrides_policy(clock):
+    retry = policy(clock, deadline=60.0)
+    attempt = Failing()
+    retry.call(attempt, deadline=5.0)
+    assert attempt.deadlines == [1005.0]
+
+
+def test_rate_limit_waits_for_retry_after_and_notifies(clock):
+    retry = policy(clock, base_delay=0.1, max_delay=0.1, deadline=None)
+    paused = []
+    assert retry.call(Failing(StatusError(429, retry_after="3")), on_rate_limited=paused.append) == "ok"
+    assert clock.sleeps == [3.0] and paused == [3.0]
+    assert retry.get_stats()["rate_limited"] == 1
+
+
+def test_async_call_stops_at_the_deadline(clock):
+    retry = RetryPolicy(clock=clock, hedge=False, max_attempts=5, base_delay=0.001, max_delay=0.001,
+                        deadline=2.0)
+
+    async def attempt(deadline_at):
+        clock.now += 1.5                      # each attempt uses up 1.5s of the budget
+        raise StatusError(503)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(retry.acall(attempt))
+
+
+def test_hedge_delay_needs_history(clock):
+    retry = RetryPolicy(clock=clock, hedge_min_samples=20, hedge_min_delay=0.5)
+    assert retry.hedge_delay("grading") is None
+    for seconds in [1.0] * 19 + [5.0]:
+        retry.record_latency("grading", seconds)
+    assert retry.p95("grading") == 5.0
+    assert retry.hedge_delay("grading") == 5.0
+    assert RetryPolicy(hedge=False).hedge_delay("grading") is None
+
+
+def hedging_policy():
+    retry = RetryPolicy(hedge=True, hedge_min_samples=1, hedge_min_delay=0.05, deadline=None)
+    retry.record_latency("grading", 0.05)
+    return retry
+
+
+def test_hedged_call_returns_first_success():
+    retry = hedging_policy()
+    release = threading.Event()
+    calls = []
+
+    def attempt(deadline_at):
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            release.wait(5)                   # the primary hangs
+            return "slow"
+        return "fast"
+
+    start = time.monotonic()
+    assert retry.call(attempt, key="grading", hedge=True) == "fast"
+    assert time.monotonic() - start < 2
+    release.set()
+    stats = retry.get_stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_hedged_call_survives_one_failed_copy():
+    retry = hedging_policy()
+    calls = []
+
+    def attempt(deadline_at):
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.2)
+            return "primary"
+        raise ValueError("backup failed")
+
+    assert retry.call(attempt, key="grading", hedge=True) == "primary"
+    assert retry.get_stats()["hedge_wins"] == 0
+
+
+def test_fast_primary_is_not_hedged():
+    retry = hedging_policy()
+    attempt = Failing()
+    assert retry.call(attempt, key="grading", hedge=True) == "ok"
+    assert len(attempt.deadlines) == 1 and retry.get_stats()["hedges"] == 0
+
+
+def test_async_hedged_call_returns_first_success_and_cancels_loser():
+    retry = hedging_policy()
+    cancelled = []
+    calls = []
+
+    async def attempt(deadline_at):
+        calls.append(1)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return "slow"
+        return "fast"
+
+    async def main():
+        result = await retry.acall(attempt, key="grading", hedge=True)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "fast"
+    assert cancelled == [True]
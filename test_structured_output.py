@@ -0,0 +1,187 @@
+"""
+Tests for JSON extraction, repair, validation and the re-ask path
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from response_cache import ResponseCache
+from structured_output import (JSONStreamScanner, StructuredOutputError, find_json_object, get_parse_stats,
+                               parse_structured, repair_json, structured_chat_completion, validate)
+
+GRADING = {"score": 8, "percentage": 80, "feedback": "Good", "strengths": ["clear"],
+           "improvements": [], "mistakes": []}
+
+
+class FakeClient:
+    """Replies with each of replies in turn and records every call"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        text = self.replies.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=None)
+
+
+@pytest.mark.parametrize("text", [
+    json.dumps(GRADING),
+    "```json\n" + json.dumps(GRADING) + "\n```",
+    "Here is the grade:\n" + json.dumps(GRADING) + "\nLet me know if you need more.",
+    "Scores use {braces} in prose.\n" + json.dumps(GRADING),
+])
+def test_find_json_object(text):
+    assert find_json_object(text) == (GRADING, None)
+
+
+def test_find_json_object_ignores_braces_in_strings():
+    data = {"feedback": "use } and { carefully", "score": 1}
+    assert find_json_object("x " + json.dumps(data))[0] == data
+
+
+def test_find_json_object_returns_broken_outer_object_not_a_nested_one():
+    text = '{"title": "T", "questions": [{"question": "Q1", "answer": "a"}, {"question": "Q2",}]}'
+    data, fragment = find_json_object(text)
+    assert data is None
+    assert fragment == text
+
+
+def test_find_json_object_truncated():
+    text = 'Sure: {"score": 7, "feedback": "Good wo'
+    assert find_json_object(text) == (None, text[6:])
+
+
+@pytest.mark.parametrize("fragment, expected", [
+    ('{"score": 7, "strengths": ["a", "b",],}', {"score": 7, "strengths": ["a", "b"]}),
+    ('{"score": 7, "feedback": "Good wo', {"score": 7, "feedback": "Good wo"}),
+    ('{"score": 7, "strengths": ["a", ', {"score": 7, "strengths": ["a"]}),
+    ('{"score": 7, "feedback":', {"score": 7}),
+    ('{“score”: 7}', {"score": 7}),
+    ('{"flag": True, "other": None, "no": False}', {"flag": True, "other": None, "no": False}),
+])
+def test_repair_json(fragment, expected):
+    assert repair_json(fragment) == expected
+
+
+@pytest.mark.parametrize("fragment", ['{"score": 7 "feedback": "x"}', '{score: 7}', '[1, 2]'])
+def test_repair_json_gives_up(fragment):
+    assert repair_json(fragment) is None
+
+
+@pytest.mark.parametrize("text", [
+    "```json\n" + json.dumps(GRADING) + "\n```",
+    '{"score": 8, "feedback": "Good", "strengths": ["clear",],}',
+    '```json\n{"score": 8, "feedback": "Good", "strengths": ["clear"',
+])
+def test_parse_structured_recovers(text):
+    result = parse_structured(text, "grading")
+    assert result["score"] == 8.0
+    assert result["feedback"] == "Good"
+    assert result["strengths"] == ["clear"]
+
+
+def test_parse_structured_attaches_text_on_failure():
+    with pytest.raises(StructuredOutputError) as info:
+        parse_structured("I cannot grade this.", "grading")
+    assert info.value.text == "I cannot grade this."
+
+
+def test_validate_coerces_and_fills_defaults():
+    result = validate({"score": "7/10", "feedback": 3, "percentage": 140}, "grading")
+    assert result["score"] == 7.0
+    assert result["feedback"] == "3"
+    assert result["percentage"] == 100
+    assert result["strengths"] == [] and result["mistakes"] == []
+    assert validate({"score": -2, "feedback": "x"}, "grading")["score"] == 0
+
+    sentiment = validate({"sentiment_score": "0.5", "stress_level": " HIGH "}, "sentiment")
+    assert sentiment["stress_level"] == "high"
+    assert validate({"interventions": [{"title": "t", "description": "d"}], "seek_support": "yes"},
+                    "intervention")["seek_support"] is True
+
+
+@pytest.mark.parametrize("data, schema, message", [
+    ({"feedback": "x"}, "grading", "Missing required field 'score'"),
+    ({"score": "none", "feedback": "x"}, "grading", "'score' should be a number"),
+    ({"score": True, "feedback": "x"}, "grading", "'score' should be a number"),
+    ({"sentiment_score": 0, "stress_level": "extreme"}, "sentiment", "'stress_level' should be one of"),
+    ({"title": "T", "questions": []}, "worksheet", "'questions' is empty"),
+    ({"title": "T", "questions": [{"question": "Q"}]}, "worksheet", "needs question, answer"),
+])
+def test_validate_rejects(data, schema, message):
+    with pytest.raises(StructuredOutputError, match=message):
+        validate(data, schema)
+
+
+def test_stream_scanner_yields_items_as_they_close():
+    text = ('```json\n{"title": "T {not an item}", "meta": {"questions": "no"}, "questions": ['
+            '{"question": "Q1 }", "answer": "a", "parts": [{"x": 1}]}, '
+            '{"question": "Q2", "answer": "b",}, '
+            '{"question": "Q3", "answer": "c\\"}"}]}\n```')
+    scanner = JSONStreamScanner("questions")
+    items = []
+    for i in range(0, len(text), 5):
+        items += scanner.feed(text[i:i + 5])
+    # The malformed Q2 is skipped; the final parse still recovers it
+    assert [item["question"] for item in items] == ["Q1 }", "Q3"]
+    assert items[0]["parts"] == [{"x": 1}]
+    assert scanner.text == text
+    assert [q["question"] for q in parse_structured(scanner.text, "worksheet")["questions"]] == ["Q1 }", "Q2", "Q3"]
+
+
+def test_stream_scanner_ignores_other_arrays():
+    scanner = JSONStreamScanner("questions")
+    assert scanner.feed('{"answers": [{"question": "no"}], "questions": [{"question": "yes"}]}') == [{"question": "yes"}]
+
+
+def grade(client, cache=None):
+    return structured_chat_completion(client, cache, "model", "system", "prompt", "grading",
+                                      temperature=0.3, max_tokens=100, feature="grading")
+
+
+def test_parsed_reply_needs_one_call():
+    client = FakeClient(json.dumps(GRADING))
+    assert grade(client)["score"] == 8
+    assert len(client.calls) == 1
+
+
+def test_single_reask():
+    before = get_parse_stats().get("grading", {})
+    client = FakeClient("The student did well, about 8/10.", json.dumps(GRADING))
+    assert grade(client)["score"] == 8
+    assert len(client.calls) == 2
+
+    reask = client.calls[1]
+    assert reask["temperature"] == 0.0 and reask["feature"] == "grading"
+    assert [message["role"] for message in reask["messages"]] == ["system", "user", "assistant", "user"]
+    assert reask["messages"][2]["content"] == "The student did well, about 8/10."
+    assert "No valid JSON object found" in reask["messages"][3]["content"]
+
+    after = get_parse_stats()["grading"]
+    assert after["reasked"] - before.get("reasked", 0) == 1
+    assert after["recovered"] - before.get("recovered", 0) == 1
+
+
+def test_failed_reask_raises_without_a_third_call():
+    client = FakeClient("no json", "still no json", json.dumps(GRADING))
+    with pytest.raises(StructuredOutputError):
+        grade(client)
+    assert len(client.calls) == 2
+
+
+def test_corrected_reply_is_cached(tmp_path):
+    cache = ResponseCache(data_dir=str(tmp_path))
+    client = FakeClient('{"feedback": "missing score"}', json.dumps(GRADING))
+    assert grade(client, cache)["score"] == 8
+
+    again = FakeClient()
+    assert grade(again, cache)["score"] == 8
+    assert again.calls == []
+    reopened = ResponseCache(data_dir=str(tmp_path))
+    assert grade(again, reopened)["score"] == 8
+    assert again.calls == []
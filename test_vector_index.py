@@ -0,0 +1,249 @@
+"""
+Tests for the vector index backends and the metadata pre-filter
+"""
+
+import numpy as np
+import pytest
+
+from vector_index import ExactIndex, IVFIndex, MetadataIndex, create_index, recall_at_k, top_k_indices
+
+
+def baseline_search(vectors, query, top_k):
+    """The brute-force ranking find_similar_resources used before the index backends"""
+    similarities = np.dot(vectors, query) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    top_indices = np.argsort(similarities)[-top_k:][::-1]
+    return top_indices, similarities[top_indices]
+
+
+def linear_filter(resources, filters):
+    """Row ids a per-resource scan keeps: the baseline's case-insensitive substring
+    check for teaching_method, case-insensitive equality for the other fields"""
+    rows = []
+    for row, resource in enumerate(resources):
+        keep = True
+        for field, value in filters.items():
+            if not value:
+                continue
+            stored = resource.get(field, "").lower()
+            if field == "teaching_method":
+                keep = keep and value.lower() in stored
+            else:
+                keep = keep and value.lower() == stored
+        if keep:
+            rows.append(row)
+    return rows
+
+
+def clustered(rng, count, centers, spread=1.0):
+    """Rows scattered around randomly chosen centers, like topic-grouped embeddings"""
+    labels = rng.integers(len(centers), size=count)
+    return (centers[labels] + spread * rng.normal(size=(count, centers.shape[1]))).astype(np.float32)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+
+@pytest.fixture
+def centers(rng):
+    return rng.normal(size=(40, 32))
+
+
+@pytest.fixture
+def vectors(rng):
+    return rng.normal(size=(500, 32)).astype(np.float32)
+
+
+def test_top_k_indices():
+    scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3])
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 2]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 4, 0]
+    assert top_k_indices(scores, 0).tolist() == []
+
+
+@pytest.mark.parametrize("top_k", [1, 5, 10, 500, 600])
+def test_exact_search_matches_baseline_ranking(vectors, rng, top_k):
+    index = ExactIndex()
+    index.sync(vectors)
+    for query in rng.normal(size=(20, 32)).astype(np.float32):
+        found, similarities = index.search(query, top_k)
+        expected, expected_similarities = baseline_search(vectors, query, top_k)
+        assert found.tolist() == expected.tolist()
+        np.testing.assert_allclose(similarities, expected_similarities, rtol=1e-5, atol=1e-6)
+
+
+def test_exact_batch_matches_single_search(vectors, rng):
+    index = ExactIndex()
+    index.sync(vectors)
+    queries = rng.normal(size=(70, 32)).astype(np.float32)    # more than one chunk
+    for query, (found, similarities) in zip(queries, index.search_batch(queries, 5, chunk_size=32)):
+        expected, expected_similarities = baseline_search(vectors, query, 5)
+        assert found.tolist() == expected.tolist()
+        np.testing.assert_allclose(similarities, expected_similarities, rtol=1e-5, atol=1e-6)
+
+
+def test_normalized_rows_rank_the_same(vectors, rng):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = ExactIndex(normalized=True)
+    index.sync(unit)
+    query = rng.normal(size=32).astype(np.float32)
+    assert index.search(query, 10)[0].tolist() == baseline_search(vectors, query, 10)[0].tolist()
+
+
+def test_candidates_restrict_the_search(vectors, rng):
+    index = ExactIndex()
+    index.sync(vectors)
+    candidates = np.arange(0, 500, 7)
+    query = rng.normal(size=32).astype(np.float32)
+    expected, _ = baseline_search(vectors[candidates], query, 5)
+    assert index.search(query, 5, candidates)[0].tolist() == candidates[expected].tolist()
+    assert [found.tolist() for found, _ in index.search_batch(query[None, :], 5, candidates)] == \
+        [candidates[expected].tolist()]
+    assert len(index.search(query, 5, np.empty(0, dtype=np.int64))[0]) == 0
+
+
+def test_sync_indexes_only_new_rows_and_resets_on_shrink(vectors, rng):
+    index = ExactIndex()
+    index.sync(vectors[:300])
+    index.sync(vectors)
+    assert len(index) == 500
+    query = rng.normal(size=32).astype(np.float32)
+    assert index.search(query, 5)[0].tolist() == baseline_search(vectors, query, 5)[0].tolist()
+
+    index.sync(vectors[:100])
+    assert len(index) == 100
+    assert index.search(query, 5)[0].tolist() == baseline_search(vectors[:100], query, 5)[0].tolist()
+    index.sync(None)
+    assert len(index) == 0 and len(index.search(query, 5)[0]) == 0
+
+
+def test_small_ivf_index_is_exact(vectors, rng):
+    index = IVFIndex(min_train_size=1024)
+    index.sync(vectors)
+    assert recall_at_k(index, rng.normal(size=(20, 32)), top_k=5)["recall"] == 1.0
+
+
+def test_ivf_recall_stays_above_floor(rng, centers):
+    data = clustered(rng, 5000, centers)
+    queries = clustered(rng, 100, centers)
+    index = IVFIndex(nprobe=4, min_train_size=1000)
+    index.sync(data)
+    assert index._centroids is not None
+
+    report = recall_at_k(index, queries, top_k=10)
+    assert report["backend"] == "ivf" and report["queries"] == 100
+    assert report["recall"] >= 0.9
+
+    # Probing every cluster is an exact search
+    index.nprobe = len(index._centroids)
+    assert recall_at_k(index, queries, top_k=10)["recall"] == 1.0
+
+
+def test_ivf_keeps_recall_after_incremental_adds(rng, centers):
+    data = clustered(rng, 6000, centers)
+    index = IVFIndex(nprobe=4, min_train_size=1000, retrain_growth=4.0)
+    index.sync(data[:2000])
+    trained = index._trained_size
+    index.sync(data)                               # new rows join existing clusters
+    assert index._trained_size == trained and len(index._assignments) == 6000
+    assert recall_at_k(index, clustered(rng, 50, centers), top_k=10)["recall"] >= 0.9
+
+
+def test_ivf_with_candidates_is_exact(rng, centers):
+    data = clustered(rng, 2000, centers)
+    index = IVFIndex(nprobe=1, min_train_size=500)
+    index.sync(data)
+    candidates = np.arange(0, 2000, 3)
+    query = data[5]
+    expected, _ = baseline_search(data[candidates], query, 10)
+    assert index.search(query, 10, candidates)[0].tolist() == candidates[expected].tolist()
+
+
+def test_create_index():
+    assert isinstance(create_index("exact"), ExactIndex)
+    index = create_index("ivf", nprobe=4, normalized=True)
+    assert isinstance(index, IVFIndex) and index.nprobe == 4 and index.normalized
+    with pytest.raises(ValueError, match="Unknown index backend"):
+        create_index("hnsw")
+
+
+METHODS = ["visual", "Visual", "interactive", "visual, interactive", "Interactive Discussion", "discussion",
+           "hands-on", ""]
+DIFFICULTIES = ["beginner", "Beginner", "intermediate", "advanced"]
+TYPES = ["video", "article", "Worksheet", "worksheet"]
+
+
+@pytest.fixture
+def resources(rng):
+    resources = []
+    for _ in range(300):
+        resource = {"topic": "t", "difficulty": str(rng.choice(DIFFICULTIES)),
+                    "resource_type": str(rng.choice(TYPES))}
+        method = str(rng.choice(METHODS))
+        if method:                                 # some resources have no teaching_method at all
+            resource["teaching_method"] = method
+        resources.append(resource)
+    return resources
+
+
+FILTERS = [
+    {"teaching_method": "visual"},
+    {"teaching_method": "VISUAL"},
+    {"teaching_method": "interactive"},
+    {"teaching_method": "act"},                    # substring of "interactive"
+    {"teaching_method": "visual, inter"},
+    {"teaching_method": "lecture"},
+    {"difficulty": "beginner"},
+    {"difficulty": "Intermediate", "resource_type": "video"},
+    {"resource_type": "worksheet", "teaching_method": "discussion"},
+    {"difficulty": "advanced", "resource_type": "article", "teaching_method": "visual"},
+    {"difficulty": "begin"},                       # exact fields do not substring-match
+    {"teaching_method": None, "difficulty": ""},
+]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_metadata_filter_matches_linear_filter(resources, filters):
+    index = MetadataIndex()
+    index.add(resources)
+    rows = index.rows(filters)
+    expected = linear_filter(resources, filters)
+    if not any(filters.values()):
+        assert rows is None and expected == list(range(len(resources)))
+    else:
+        assert rows.tolist() == expected
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_incremental_adds_match_linear_filter(resources, filters):
+    index = MetadataIndex()
+    for start in range(0, len(resources), 70):
+        index.add(resources[start:start + 70])
+        index.rows(filters)                        # fill the per-value cache between adds
+    rows = index.rows(filters)
+    assert (rows is None and not any(filters.values())) or rows.tolist() == linear_filter(resources, filters)
+
+
+def test_filtered_search_matches_filter_then_rank(resources, rng):
+    vectors = rng.normal(size=(len(resources), 32)).astype(np.float32)
+    metadata = MetadataIndex()
+    metadata.add(resources)
+    index = ExactIndex()
+    index.sync(vectors)
+    query = rng.normal(size=32).astype(np.float32)
+    for filters in FILTERS[:-1]:
+        keep = np.array(linear_filter(resources, filters), dtype=np.int64)
+        ranked, _ = baseline_search(vectors[keep], query, 5) if len(keep) else (keep, None)
+        candidates = metadata.rows(filters)
+        found = index.search(query, 5, candidates)[0] if len(candidates) else candidates
+        assert found.tolist() == keep[ranked].tolist()
+
+
+def test_metadata_filter_rejects_unknown_field(resources):
+    index = MetadataIndex()
+    index.add(resources)
+    with pytest.raises(ValueError, match="Cannot filter on 'subject'"):
+        index.rows({"subject": "math"})
+    index.reset()
+    assert len(index) == 0 and index.rows({"difficulty": "beginner"}).tolist() == []
@@ -0,0 +1,371 @@
+"""
+Vector index backends for ContentRecommender.find_similar_resources
+ExactIndex scores every embedding (the original behaviour); IVFIndex is a
+pure-NumPy inverted-file index that only scores the clusters closest to the
+query, trading a little recall for much lower latency on large libraries.
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first
+
+    Uses np.argpartition (O(N)) and only sorts the k winners.
+    """
+    k = min(top_k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class VectorIndex:
+    """Common interface: sync() the embeddings matrix, then search() it
+
+    The index never owns the embeddings. sync() is called with the current
+    matrix and indexes any rows it has not seen yet, so incremental adds only
+    cost work proportional to the new rows.
+
+    With normalized=True the rows are assumed to be unit length already, so
+    no per-row norms are computed and a query costs one matrix-vector product.
+    """
+
+    name = "base"
+
+    def __init__(self, normalized: bool = False):
+        self.normalized = normalized
+        self._vectors = None
+        self._norms = np.empty(0, dtype=np.float32)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def reset(self):
+        """Forget everything indexed so far"""
+        self._vectors = None
+        self._norms = np.empty(0, dtype=np.float32)
+        self._count = 0
+
+    def sync(self, vectors: Optional[np.ndarray]):
+        """Index rows of vectors beyond the ones already indexed"""
+        if vectors is None or len(vectors) == 0:
+            self.reset()
+            return
+        if len(vectors) < self._count:
+            self.reset()
+        self._vectors = vectors
+        if len(vectors) > self._count:
+            new_rows = np.asarray(vectors[self._count:], dtype=np.float32)
+            if self.normalized:
+                new_norms = np.ones(len(new_rows), dtype=np.float32)
+            else:
+                new_norms = np.linalg.norm(new_rows, axis=1)
+            self._norms = np.concatenate([self._norms, new_norms])
+            self._add(new_rows, self._count)
+            self._count = len(vectors)
+
+    def _add(self, new_rows: np.ndarray, offset: int):
+        """Hook for backends that maintain extra structures per row"""
+
+    def _score(self, rows: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """Cosine similarity between query and the given rows (all if None)"""
+        query_norm = np.linalg.norm(query)
+        if self.normalized:
+            vectors = self._vectors if rows is None else self._vectors[rows]
+            return np.dot(vectors, query / query_norm)
+        if rows is None:
+            return np.dot(self._vectors, query) / (self._norms * query_norm)
+        return np.dot(self._vectors[rows], query) / (self._norms[rows] * query_norm)
+
+    def _exact_search(self, query: np.ndarray, top_k: int,
+                      rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force top_k over all rows, or only over the given row ids"""
+        if self._count == 0 or (rows is not None and len(rows) == 0):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        similarities = self._score(rows, query)
+        top_indices = top_k_indices(similarities, top_k)
+        if rows is not None:
+            return rows[top_indices], similarities[top_indices]
+        return top_indices, similarities[top_indices]
+
+    def search(self, query: np.ndarray, top_k: int,
+               candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, similarities) of the top_k rows, best first
+
+        When candidates (sorted row ids, e.g. from a MetadataIndex) is given,
+        only those rows are scored.
+        """
+        raise NotImplementedError
+
+    def search_batch(self, queries: np.ndarray, top_k: int,
+                     candidates: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """search() for every row of queries; backends may override to vectorise"""
+        return [self.search(query, top_k, candidates) for query in queries]
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force cosine similarity over every row"""
+
+    name = "exact"
+
+    def search(self, query: np.ndarray, top_k: int,
+               candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self._exact_search(query, top_k, candidates)
+
+    def search_batch(self, queries: np.ndarray, top_k: int,
+                     candidates: Optional[np.ndarray] = None,
+                     chunk_size: int = 64) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Score all queries with one matrix-matrix product per chunk
+
+        Queries are processed chunk_size at a time so the (N x chunk) score
+        matrix stays bounded for large knowledge bases.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if self._count == 0 or (candidates is not None and len(candidates) == 0):
+            empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+            return [empty for _ in range(len(queries))]
+
+        vectors, norms = self._vectors, self._norms
+        if candidates is not None:
+            vectors, norms = vectors[candidates], norms[candidates]
+
+        unit_queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        results = []
+        for start in range(0, len(unit_queries), chunk_size):
+            block = unit_queries[start:start + chunk_size]
+            scores = np.dot(vectors, block.T)
+            if not self.normalized:
+                scores /= norms[:, None]
+            for column in range(scores.shape[1]):
+                similarities = scores[:, column]
+                top_indices = top_k_indices(similarities, top_k)
+                rows = top_indices if candidates is None else candidates[top_indices]
+                results.append((rows, similarities[top_indices]))
+        return results
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index built with spherical k-means
+
+    Knobs:
+    - nlist: number of clusters (default ~sqrt(N))
+    - nprobe: clusters scanned per query; higher means better recall, slower
+    - min_train_size: below this many rows every query is answered exactly
+    - retrain_growth: retrain the clusters once the index has grown by this factor
+    """
+
+    name = "ivf"
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8, train_iters: int = 10,
+                 min_train_size: int = 1024, retrain_growth: float = 4.0,
+                 max_train_samples: int = 50000, seed: int = 0, normalized: bool = False):
+        super().__init__(normalized=normalized)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iters = train_iters
+        self.min_train_size = min_train_size
+        self.retrain_growth = retrain_growth
+        self.max_train_samples = max_train_samples
+        self.seed = seed
+        self._reset_clusters()
+
+    def _reset_clusters(self):
+        self._centroids = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._trained_size = 0
+        self._lists = None
+
+    def reset(self):
+        super().reset()
+        self._reset_clusters()
+
+    def _unit(self, rows: np.ndarray, norms: np.ndarray) -> np.ndarray:
+        return rows / np.maximum(norms, 1e-12)[:, None]
+
+    def _add(self, new_rows: np.ndarray, offset: int):
+        total = offset + len(new_rows)
+        if total < self.min_train_size:
+            return
+        if self._centroids is None or total >= self._trained_size * self.retrain_growth:
+            self._train()
+            return
+        # Assign new rows to their nearest existing cluster
+        unit_rows = self._unit(new_rows, self._norms[offset:total])
+        self._assignments = np.concatenate([
+            self._assignments,
+            np.argmax(unit_rows @ self._centroids.T, axis=1).astype(np.int32)
+        ])
+        self._lists = None
+
+    def _train(self):
+        count = len(self._norms)
+        nlist = self.nlist or max(1, int(np.sqrt(count)))
+        nlist = min(nlist, count)
+        rng = np.random.default_rng(self.seed)
+
+        sample_size = min(count, self.max_train_samples)
+        sample_ids = rng.choice(count, size=sample_size, replace=False)
+        sample = self._unit(np.asarray(self._vectors[sample_ids], dtype=np.float32), self._norms[sample_ids])
+
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)]
+        for _ in range(self.train_iters):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = self._unit(sums, np.linalg.norm(sums, axis=1))
+
+        # Assign every row in chunks to bound peak memory
+        assignments = np.empty(count, dtype=np.int32)
+        chunk = 16384
+        for start in range(0, count, chunk):
+            stop = min(start + chunk, count)
+            rows = self._unit(np.asarray(self._vectors[start:stop], dtype=np.float32), self._norms[start:stop])
+            assignments[start:stop] = np.argmax(rows @ centroids.T, axis=1)
+
+        self._centroids = centroids
+        self._assignments = assignments
+        self._trained_size = count
+        self._lists = None
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._lists is None:
+            order = np.argsort(self._assignments, kind="stable")
+            bounds = np.searchsorted(self._assignments[order], np.arange(len(self._centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+        return self._lists
+
+    def search(self, query: np.ndarray, top_k: int,
+               candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # A metadata filter already narrows the rows, so score them exactly
+        # rather than risk returning fewer than top_k matches from the probes
+        if self._count == 0 or self._centroids is None or candidates is not None:
+            return self._exact_search(query, top_k, candidates)
+
+        unit_query = query / max(np.linalg.norm(query), 1e-12)
+        centroid_scores = self._centroids @ unit_query
+        nprobe = min(self.nprobe, len(centroid_scores))
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        lists = self._inverted_lists()
+        probed = np.concatenate([lists[c] for c in probe])
+        return self._exact_search(query, top_k, probed)
+
+
+class MetadataIndex:
+    """Inverted indexes from resource metadata values to row ids
+
+    Lets the vector search be restricted to matching rows before scoring.
+    Values are matched case-insensitively; fields in substring_fields match
+    any stored value containing the filter value (e.g. "visual" matches
+    "visual, interactive").
+    """
+
+    def __init__(self, fields=("difficulty", "resource_type", "teaching_method"),
+                 substring_fields=("teaching_method",)):
+        self.fields = tuple(fields)
+        self.substring_fields = set(substring_fields)
+        self.reset()
+
+    def reset(self):
+        self._postings = {field: {} for field in self.fields}
+        self._arrays = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, resources: List[Dict]):
+        """Index resources appended after the ones already indexed"""
+        for offset, resource in enumerate(resources, start=self._count):
+            for field in self.fields:
+                value = str(resource.get(field, "")).strip().lower()
+                self._postings[field].setdefault(value, []).append(offset)
+        self._count += len(resources)
+        self._arrays = {}
+
+    def _rows_for(self, field: str, value: str) -> np.ndarray:
+        key = (field, value)
+        if key not in self._arrays:
+            postings = self._postings[field]
+            if field in self.substring_fields:
+                matches = [rows for stored, rows in postings.items() if value in stored]
+                rows = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int64)
+            else:
+                rows = np.asarray(postings.get(value, []), dtype=np.int64)
+            self._arrays[key] = rows.astype(np.int64)
+        return self._arrays[key]
+
+    def rows(self, filters: Optional[Dict[str, str]]) -> Optional[np.ndarray]:
+        """Sorted row ids matching every filter, or None when nothing is filtered"""
+        active = {field: value for field, value in (filters or {}).items() if value}
+        if not active:
+            return None
+
+        result = None
+        for field, value in active.items():
+            if field not in self._postings:
+                raise ValueError(f"Cannot filter on '{field}'. Indexed fields: {', '.join(self.fields)}")
+            rows = self._rows_for(field, str(value).strip().lower())
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result
+
+
+INDEX_BACKENDS = {
+    ExactIndex.name: ExactIndex,
+    IVFIndex.name: IVFIndex,
+}
+
+
+def create_index(backend: str = "exact", **options) -> VectorIndex:
+    """Build an index backend by name ("exact" or "ivf")"""
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend '{backend}'. Choose from: {', '.join(INDEX_BACKENDS)}")
+    return INDEX_BACKENDS[backend](**options)
+
+
+def recall_at_k(index: VectorIndex, queries: np.ndarray, top_k: int = 5,
+                reference: Optional[VectorIndex] = None) -> Dict:
+    """Measure recall@k and per-query latency of index against exact search
+
+    reference defaults to an ExactIndex over the same vectors.
+    """
+    if reference is None:
+        reference = ExactIndex(normalized=index.normalized)
+        reference.sync(index._vectors)
+
+    hits = 0
+    expected = 0
+    index_time = 0.0
+    reference_time = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        found, _ = index.search(query, top_k)
+        index_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        truth, _ = reference.search(query, top_k)
+        reference_time += time.perf_counter() - start
+
+        hits += len(set(found.tolist()) & set(truth.tolist()))
+        expected += len(truth)
+
+    num_queries = max(len(queries), 1)
+    return {
+        "backend": index.name,
+        "top_k": top_k,
+        "queries": len(queries),
+        "recall": round(hits / expected, 4) if expected else 1.0,
+        "avg_query_ms": round(1000 * index_time / num_queries, 4),
+        "exact_avg_query_ms": round(1000 * reference_time / num_queries, 4),
+    }
@@ -4,20 +4,25 @@ Sentiment analysis + AI-powered interventions
 """
 
 import os
-from groq import Groq
+from llm_gateway import LLMGateway, get_gateway
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
 import json
+from structured_output import StructuredOutputError, astructured_chat_completion, structured_chat_completion
 
 class WellbeingMonitor:
-    def __init__(self, api_key: str, model: str):
-        """Initialize wellbeing monitoring system"""
-        self.client = Groq(api_key=api_key)
+    def __init__(self, api_key: str, model: str, client: Optional[LLMGateway] = None):
+        """Initialize wellbeing monitoring system
+        
+        LLM calls go through client, which defaults to the process-wide
+        pooled LLMGateway.
+        """
+        self.client = client or get_gateway(api_key)
         self.model = model
         self.reflections_history = []
         
-    def analyze_sentiment(self, reflection_text: str) -> Dict:
-        """Analyze teacher's reflection using Groq LLM"""
+    def _sentiment_request(self, reflection_text: str) -> Dict:
+        """Arguments for (a)structured_chat_completion when analyzing a reflection"""
         
         prompt = f"""You are a supportive wellbeing coach analyzing a teacher's reflection.
 
@@ -41,59 +46,78 @@ Return as JSON:
     "overall_assessment": "<brief summary>"
 }}
 """
-
+        return {
+            "system_prompt": "You are an empathetic wellbeing analyst trained to detect stress and emotional patterns in teachers.",
+            "user_prompt": prompt,
+            "schema": "sentiment",
+            "temperature": 0.3,
+            "max_tokens": 800,
+            "feature": "wellbeing"
+        }
+    
+    def _record_reflection(self, reflection_text: str, analysis: Dict) -> Dict:
+        self.reflections_history.append({
+            "timestamp": datetime.now().isoformat(),
+            "reflection": reflection_text,
+            "analysis": analysis
+        })
+        return analysis
+    
+    @staticmethod
+    def _unparsed_sentiment(error: StructuredOutputError) -> Dict:
+        return {
+            "sentiment_score": 0.0,
+            "stress_level": "medium",
+            "emotions": [],
+            "concerns": [],
+            "positive_aspects": [],
+            "overall_assessment": error.text
+        }
+    
+    @staticmethod
+    def _sentiment_failure(error: Exception) -> Dict:
+        return {
+            "sentiment_score": 0.0,
+            "stress_level": "unknown",
+            "emotions": [],
+            "concerns": [f"Error: {str(error)}"],
+            "positive_aspects": [],
+            "overall_assessment": f"Error analyzing reflection: {str(error)}"
+        }
+    
+    def analyze_sentiment(self, reflection_text: str) -> Dict:
+        """Analyze teacher's reflection using Groq LLM"""
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an empathetic wellbeing analyst trained to detect stress and emotional patterns in teachers."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=800
-            )
-            
-            result_text = response.choices[0].message.content
-            
             try:
-                start_idx = result_text.find('{')
-                end_idx = result_text.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = result_text[start_idx:end_idx]
-                    analysis = json.loads(json_str)
-                else:
-                    raise ValueError("No JSON found")
-            except:
-                analysis = {
-                    "sentiment_score": 0.0,
-                    "stress_level": "medium",
-                    "emotions": [],
-                    "concerns": [],
-                    "positive_aspects": [],
-                    "overall_assessment": result_text
-                }
+                analysis = structured_chat_completion(self.client, None, self.model,
+                                                      **self._sentiment_request(reflection_text))
+            except StructuredOutputError as e:
+                analysis = self._unparsed_sentiment(e)
             
             # Store reflection
-            self.reflections_history.append({
-                "timestamp": datetime.now().isoformat(),
-                "reflection": reflection_text,
-                "analysis": analysis
-            })
+            return self._record_reflection(reflection_text, analysis)
             
-            return analysis
+        except Exception as e:
+            return self._sentiment_failure(e)
+    
+    async def aanalyze_sentiment(self, reflection_text: str) -> Dict:
+        """Async counterpart of analyze_sentiment"""
+        
+        try:
+            try:
+                analysis = await astructured_chat_completion(self.client, None, self.model,
+                                                             **self._sentiment_request(reflection_text))
+            except StructuredOutputError as e:
+                analysis = self._unparsed_sentiment(e)
+            
+            return self._record_reflection(reflection_text, analysis)
             
         except Exception as e:
-            return {
-                "sentiment_score": 0.0,
-                "stress_level": "unknown",
-                "emotions": [],
-                "concerns": [f"Error: {str(e)}"],
-                "positive_aspects": [],
-                "overall_assessment": f"Error analyzing reflection: {str(e)}"
-            }
+            return self._sentiment_failure(e)
     
-    def provide_micro_intervention(self, sentiment_analysis: Dict) -> Dict:
-        """Suggest personalized micro-interventions based on analysis"""
+    def _intervention_request(self, sentiment_analysis: Dict) -> Dict:
+        """Arguments for (a)structured_chat_completion when suggesting interventions"""
         
         stress_level = sentiment_analysis.get('stress_level', 'medium')
         concerns = sentiment_analysis.get('concerns', [])
@@ -128,49 +152,48 @@ Format as JSON:
     "support_message": "<message about seeking help if needed>"
 }}
 """
-
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a compassionate wellbeing coach specializing in teacher mental health."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.6,
-                max_tokens=1000
-            )
-            
-            result_text = response.choices[0].message.content
-            
-            try:
-                start_idx = result_text.find('{')
-                end_idx = result_text.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = result_text[start_idx:end_idx]
-                    interventions = json.loads(json_str)
-                else:
-                    raise ValueError("No JSON found")
-            except:
-                interventions = {
-                    "priority": "medium",
-                    "interventions": [{"title": "Reflection", "description": result_text, "duration": "5 min", "benefit": "General wellbeing"}],
-                    "seek_support": False,
-                    "support_message": ""
-                }
-            
-            return interventions
-            
-        except Exception as e:
+        return {
+            "system_prompt": "You are a compassionate wellbeing coach specializing in teacher mental health.",
+            "user_prompt": prompt,
+            "schema": "intervention",
+            "temperature": 0.6,
+            "max_tokens": 1000,
+            "feature": "wellbeing"
+        }
+    
+    @staticmethod
+    def _intervention_failure(error: Exception) -> Dict:
+        if isinstance(error, StructuredOutputError):
             return {
                 "priority": "medium",
-                "interventions": [{"title": "Error", "description": str(e), "duration": "N/A", "benefit": "N/A"}],
+                "interventions": [{"title": "Reflection", "description": error.text, "duration": "5 min", "benefit": "General wellbeing"}],
                 "seek_support": False,
                 "support_message": ""
             }
+        return {
+            "priority": "medium",
+            "interventions": [{"title": "Error", "description": str(error), "duration": "N/A", "benefit": "N/A"}],
+            "seek_support": False,
+            "support_message": ""
+        }
     
-    def get_peer_support_suggestions(self, concern_type: str) -> List[Dict]:
-        """Suggest peer support connections based on concerns"""
-        
+    def provide_micro_intervention(self, sentiment_analysis: Dict) -> Dict:
+        """Suggest personalized micro-interventions based on analysis"""
+        try:
+            return structured_chat_completion(self.client, None, self.model,
+                                              **self._intervention_request(sentiment_analysis))
+        except Exception as e:
+            return self._intervention_failure(e)
+    
+    async def aprovide_micro_intervention(self, sentiment_analysis: Dict) -> Dict:
+        """Async counterpart of provide_micro_intervention"""
+        try:
+            return await astructured_chat_completion(self.client, None, self.model,
+                                                     **self._intervention_request(sentiment_analysis))
+        except Exception as e:
+            return self._intervention_failure(e)
+    
+    def _peer_support_request(self, concern_type: str) -> Dict:
         prompt = f"""A teacher is experiencing concerns related to: {concern_type}
 
 Provide 5-6 practical peer support suggestions. For each suggestion, provide:
@@ -181,33 +204,47 @@ Provide 5-6 practical peer support suggestions. For each suggestion, provide:
 Format your response as a numbered list with clear, actionable items.
 Keep it concise and friendly."""
 
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": "You are a supportive colleague helping teachers connect with peers. Provide clear, friendly, actionable advice in a numbered list format. Be specific and practical."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 600,
+            "feature": "wellbeing"
+        }
+    
+    @staticmethod
+    def _peer_support_result(concern_type: str, suggestions_text: str) -> Dict:
+        # Convert newlines to HTML breaks for better display
+        return {
+            "concern_type": concern_type,
+            "suggestions": suggestions_text.replace('\n', '<br>')
+        }
+    
+    @staticmethod
+    def _peer_support_failure(concern_type: str, error: Exception) -> Dict:
+        return {
+            "concern_type": concern_type,
+            "suggestions": f"<strong>Error generating suggestions:</strong><br>{str(error)}"
+        }
+    
+    def get_peer_support_suggestions(self, concern_type: str) -> List[Dict]:
+        """Suggest peer support connections based on concerns"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a supportive colleague helping teachers connect with peers. Provide clear, friendly, actionable advice in a numbered list format. Be specific and practical."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=600
-            )
-            
-            suggestions_text = response.choices[0].message.content
-            
-            # Convert newlines to HTML breaks for better display
-            suggestions_html = suggestions_text.replace('\n', '<br>')
-            
-            # Return as structured data
-            return {
-                "concern_type": concern_type,
-                "suggestions": suggestions_html
-            }
-            
+            response = self.client.chat.completions.create(**self._peer_support_request(concern_type))
         except Exception as e:
-            return {
-                "concern_type": concern_type,
-                "suggestions": f"<strong>Error generating suggestions:</strong><br>{str(e)}"
-            }
+            return self._peer_support_failure(concern_type, e)
+        return self._peer_support_result(concern_type, response.choices[0].message.content)
+    
+    async def aget_peer_support_suggestions(self, concern_type: str) -> List[Dict]:
+        """Async counterpart of get_peer_support_suggestions"""
+        try:
+            response = await self.client.chat.completions.acreate(**self._peer_support_request(concern_type))
+        except Exception as e:
+            return self._peer_support_failure(concern_type, e)
+        return self._peer_support_result(concern_type, response.choices[0].message.content)
     
     def generate_wellbeing_report(self, days: int = 7) -> Dict:
         """Generate wellbeing trend report from recent reflections"""